@@ -0,0 +1,252 @@
+# utils/admission.py
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+from config_file import Config
+from deadline import remaining
+from metrics import MetricsRegistry, metrics as default_metrics
+
+HEALTHY, DEGRADED, CRITICAL = "healthy", "degraded", "critical"
+_LEVELS = (HEALTHY, DEGRADED, CRITICAL)
+
+class Overloaded(Exception):
+    """A request was refused by admission control: no capacity and no room (or time) to wait"""
+
+class AdaptiveLimiter:
+    """Latency-driven concurrency limit in front of one dependency.
+
+    The limit follows AIMD: every call finishing within `target_seconds`
+    raises it by 1/limit (about one per limit's worth of calls), and a slow
+    or failed call multiplies it by `backoff`, at most once per target
+    window so a burst of stragglers does not collapse it. Callers beyond
+    the limit wait in a bounded FIFO queue; a full queue or a wait longer
+    than `queue_timeout` (or the turn's deadline) raises Overloaded.
+
+    Smoothed latency and failure rate give a health level: "degraded" once
+    calls run past the target, "critical" at `critical_factor` times it or
+    when half of them fail. Levels rise at once but fall one step at a
+    time, after `min_mode_seconds` and only once latency is comfortably
+    back under target, so modes don't flap.
+    """
+
+    def __init__(self, name: str, target_seconds: float, initial_limit: int = 10,
+                 min_limit: int = 1, max_limit: int = 100, max_queue: int = 50,
+                 queue_timeout: float = Config.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+                 backoff: float = 0.7, smoothing: float = 0.2, critical_factor: float = 4.0,
+                 recover_factor: float = 0.8,
+                 min_mode_seconds: float = Config.ADMISSION_MIN_MODE_SECONDS,
+                 probe_seconds: float = Config.ADMISSION_PROBE_SECONDS,
+                 clock: Callable[[], float] = time.monotonic,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.name = name
+        self.target_seconds = target_seconds
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.critical_factor = critical_factor
+        self.recover_factor = recover_factor
+        self.min_mode_seconds = min_mode_seconds
+        self.probe_seconds = probe_seconds
+        self.clock = clock
+        self.metrics = metrics or default_metrics
+
+        self.in_flight = 0
+        self.waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self.latency: Optional[float] = None
+        self.failure_rate = 0.0
+        self.level = HEALTHY
+        self.level_since = clock()
+        self.last_decrease = float("-inf")
+        self.last_probe = float("-inf")
+        self.lock = threading.Lock()
+
+    @asynccontextmanager
+    async def slot(self, max_wait: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold one unit of concurrency for the block, recording how long it took.
+
+        Waiting for it is bounded by the queue timeout, the turn's deadline
+        and `max_wait`.
+        """
+        await self._acquire(max_wait)
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self._record(time.perf_counter() - start, ok)
+            self._release()
+
+    async def _acquire(self, max_wait: Optional[float] = None):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if self.in_flight < int(self.limit) and not self.waiters:
+                self.in_flight += 1
+                return
+            if len(self.waiters) >= self.max_queue:
+                self._reject()
+                raise Overloaded(f"{self.name}: wait queue is full")
+            future = loop.create_future()
+            self.waiters.append((loop, future))
+            self.metrics.increment(f"admission.{self.name}.queued")
+        try:
+            timeout = self.queue_timeout if max_wait is None else min(self.queue_timeout, max_wait)
+            await asyncio.wait_for(future, remaining(timeout))
+        except BaseException as e:
+            with self.lock:
+                try:
+                    self.waiters.remove((loop, future))
+                    granted = False
+                except ValueError:
+                    granted = True
+                if not granted and isinstance(e, asyncio.TimeoutError):
+                    self._reject()
+            # A slot handed over just as the wait ended goes back; one still
+            # in transit is returned by _deliver when it finds the wait cancelled
+            if granted and future.done() and not future.cancelled():
+                self._release()
+            if isinstance(e, asyncio.TimeoutError):
+                raise Overloaded(f"{self.name}: timed out waiting for capacity") from e
+            raise
+
+    def _release(self):
+        with self.lock:
+            self.in_flight -= 1
+            while self.waiters and self.in_flight < int(self.limit):
+                loop, future = self.waiters.popleft()
+                if loop.is_closed():
+                    continue
+                self.in_flight += 1
+                loop.call_soon_threadsafe(self._deliver, future)
+
+    def _deliver(self, future: asyncio.Future):
+        """Hand a freed slot to a waiter (on the waiter's loop)"""
+        if future.done():
+            self._release()
+        else:
+            future.set_result(None)
+
+    def _reject(self):
+        """Count a refused request as a failure (lock held)"""
+        self.metrics.increment(f"admission.{self.name}.rejected")
+        self.failure_rate += self.smoothing * (1.0 - self.failure_rate)
+        self._update_level(self.clock())
+
+    def _record(self, seconds: float, ok: bool):
+        self.metrics.observe(f"admission.{self.name}.latency", seconds)
+        with self.lock:
+            now = self.clock()
+            self.latency = seconds if self.latency is None else (
+                self.latency + self.smoothing * (seconds - self.latency)
+            )
+            self.failure_rate += self.smoothing * ((0.0 if ok else 1.0) - self.failure_rate)
+            if ok and seconds <= self.target_seconds:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            elif now - self.last_decrease >= self.target_seconds:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.last_decrease = now
+            self._update_level(now)
+
+    def _measured_level(self) -> str:
+        latency = self.latency or 0.0
+        if latency >= self.target_seconds * self.critical_factor or self.failure_rate >= 0.5:
+            return CRITICAL
+        if latency >= self.target_seconds or self.failure_rate >= 0.2:
+            return DEGRADED
+        return HEALTHY
+
+    def _update_level(self, now: float):
+        """Move the health level towards the measured one (lock held)"""
+        measured = _LEVELS.index(self._measured_level())
+        current = _LEVELS.index(self.level)
+        if measured > current:
+            self._set_level(_LEVELS[measured], now)
+        elif measured < current and now - self.level_since >= self.min_mode_seconds:
+            # Leaving "degraded" needs latency well under target, not just under it
+            if current == 1 and ((self.latency or 0.0) > self.target_seconds * self.recover_factor
+                                 or self.failure_rate >= 0.1):
+                return
+            self._set_level(_LEVELS[current - 1], now)
+
+    def _set_level(self, level: str, now: float):
+        print(f"Admission {self.name}: {self.level} -> {level}")
+        self.metrics.increment(f"admission.{self.name}.{level}")
+        self.level = level
+        self.level_since = now
+
+    def at_least(self, level: str) -> bool:
+        """Whether the dependency is at least as unhealthy as `level`"""
+        with self.lock:
+            self._update_level(self.clock())
+            return _LEVELS.index(self.level) >= _LEVELS.index(level)
+
+    def bypass(self) -> bool:
+        """Whether callers should route around the dependency: critical, except for a periodic probe"""
+        with self.lock:
+            now = self.clock()
+            self._update_level(now)
+            if self.level != CRITICAL:
+                return False
+            if now - self.last_probe >= self.probe_seconds:
+                # Let one call through so recovery can be measured
+                self.last_probe = now
+                return False
+            return True
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "level": self.level,
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": len(self.waiters),
+                "latency": self.latency or 0.0,
+                "failure_rate": self.failure_rate,
+            }
+
+class AdmissionController:
+    """Limiters for conversation turns and external clients, and the degradation modes they imply.
+
+    Modes:
+        skip_enrichment: search results are not looked up one by one (OMDB degraded)
+        local_search: searches skip OMDB for the local catalog (OMDB critical)
+        cached_recommendations: only cached or local recommendations are served
+            (OMDB degraded, or turns themselves degraded)
+    """
+
+    MODES = ("skip_enrichment", "local_search", "cached_recommendations")
+
+    def __init__(self, limits: Optional[Dict[str, Dict]] = None,
+                 metrics: Optional[MetricsRegistry] = None, **limiter_options):
+        limits = limits or Config.ADMISSION_LIMITS
+        self.limiters: Dict[str, AdaptiveLimiter] = {
+            name: AdaptiveLimiter(name, metrics=metrics, **dict(limiter_options, **options))
+            for name, options in limits.items()
+        }
+        self.turns = self.limiters["turns"]
+        self.omdb = self.limiters["omdb"]
+        self.llm = self.limiters["llm"]
+
+    def mode(self, name: str) -> bool:
+        """Whether a degradation mode is in effect right now"""
+        if name == "skip_enrichment":
+            return self.omdb.at_least(DEGRADED)
+        if name == "local_search":
+            return self.omdb.bypass()
+        if name == "cached_recommendations":
+            return self.omdb.at_least(DEGRADED) or self.turns.at_least(DEGRADED)
+        raise KeyError(f"Unknown degradation mode {name!r}")
+
+    def stats(self) -> Dict[str, Dict]:
+        """Health, limit and queue of every limiter"""
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+# Process-wide admission control; OMDB and the LLM are shared by every session
+admission = AdmissionController()
@@ -0,0 +1,61 @@
+# agents/agent_registry.py
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Type
+from llama_index.core import Settings
+from llama_index.core.agent.react import ReActAgent
+from llama_index.core.tools import FunctionTool
+from mockdb import MockDatabase
+from config_file import Config
+
+class AgentRegistry:
+    """Process-wide cache of objects that can be shared between sessions.
+
+    Specialist agents only hold a database reference and their tools, so
+    one instance per database serves every coordinator. Lookups after the
+    first are a single dict probe; construction happens once under a lock.
+    """
+
+    def __init__(self):
+        self.instances: Dict[Hashable, Any] = {}
+        self.lock = threading.RLock()
+        self.builds = 0
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Return the shared instance for a key, building it on first use"""
+        instance = self.instances.get(key)
+        if instance is None:
+            with self.lock:
+                instance = self.instances.get(key)
+                if instance is None:
+                    instance = factory()
+                    self.instances[key] = instance
+                    self.builds += 1
+        return instance
+
+    def clear(self):
+        """Drop every shared instance (e.g. after reconfiguring the models)"""
+        with self.lock:
+            self.instances.clear()
+
+registry = AgentRegistry()
+
+def get_shared_database() -> MockDatabase:
+    """The process-wide database"""
+    return registry.get("database", MockDatabase)
+
+def get_shared_agent(agent_cls: Type, db: MockDatabase) -> Any:
+    """The process-wide specialist agent of a class bound to a database"""
+    return registry.get((agent_cls.__name__, id(db)), lambda: agent_cls(db))
+
+def build_react_agent(tools: List[FunctionTool],
+                      system_message_key: Optional[str] = None) -> ReActAgent:
+    """ReAct agent over the given tools with its own copy of the global LLM"""
+    llm = Settings.llm
+    if llm and system_message_key:
+        llm = llm.copy()
+        llm.system_prompt = Config.SYSTEM_MESSAGES.get(system_message_key, "")
+    return ReActAgent.from_tools(
+        tools=tools,
+        llm=llm,
+        verbose=True
+    )
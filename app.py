@@ -5,8 +5,13 @@ from llama_index.core import Settings
 from llama_index.llms.openai import OpenAI
 from llama_index.embeddings.openai import OpenAIEmbedding
 from coordinator import CoordinatorAgent
-import asyncio
+from llm_cache import CachingLLM
+from llm_gateway import GatewayEmbedding, GatewayLLM
+import concurrent.futures
+from typing import Dict, Iterator
 from config_file import Config
+from event_loop import get_background_loop
+from session_state import SessionState
 
 # Load environment variables
 load_dotenv()
@@ -20,42 +25,80 @@ st.set_page_config(
 
 class MovieBookingSystem:
     def __init__(self):
-        # Configure global settings for LlamaIndex with OpenAI
-        Settings.llm = OpenAI(
+        # Configure global settings for LlamaIndex with OpenAI; repeated
+        # requests from any agent are answered from the shared response cache,
+        # and the rest go through the process-wide gateway
+        Settings.llm = CachingLLM(GatewayLLM(OpenAI(
             model="gpt-3.5-turbo-0125",  # Latest GPT-3.5-Turbo model
             temperature=0.7,
             api_key=os.getenv("OPENAI_API_KEY"),
             system_prompt=Config.SYSTEM_MESSAGES["coordinator"]
-        )
+        )))
         
-        # Configure OpenAI embeddings
-        Settings.embed_model = OpenAIEmbedding(
+        # Configure OpenAI embeddings, micro-batched through the same gateway
+        Settings.embed_model = GatewayEmbedding(OpenAIEmbedding(
             api_key=os.getenv("OPENAI_API_KEY")
-        )
+        ))
         
         # Initialize coordinator agent
         self.coordinator = CoordinatorAgent()
+        
+        # Every turn runs on one long-lived loop, so pooled connections and
+        # background tasks survive between messages
+        self.loop = get_background_loop()
+        self.loop.add_shutdown_hook(self.coordinator.movie_agent.omdb_client.close)
 
-    async def process_message(self, user_input: str, context: dict) -> str:
+    async def process_message(self, user_input: str, context: SessionState) -> str:
         """Process a single message"""
         return await self.coordinator.process_input(user_input, context)
 
+    def stream_message(self, user_input: str, context: SessionState,
+                       timeout: float = Config.CHAT_TURN_TIMEOUT_SECONDS) -> Iterator[str]:
+        """Process a single message, yielding response chunks as they are produced.
+
+        Chunks are produced on the shared background loop; `timeout` bounds
+        the wait for each one.
+        """
+        stream = self.coordinator.process_input_stream(user_input, context)
+        try:
+            while True:
+                try:
+                    yield self.loop.run(stream.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                except concurrent.futures.TimeoutError:
+                    yield "\n\nSorry, this is taking longer than expected. Please try again."
+                    break
+        finally:
+            self.loop.run(stream.aclose(), timeout)
+
+    def describe_booking(self, context: SessionState) -> Dict[str, str]:
+        """Names and times of the booking in progress, for display"""
+        return self.loop.run(self.coordinator.describe_booking(context), Config.CHAT_TURN_TIMEOUT_SECONDS)
+
+    def seat_map(self, context: SessionState) -> str:
+        """The live seat map of the chosen showtime"""
+        seating_agent = self.coordinator.seating_agent
+        seats = self.loop.run(
+            seating_agent.get_available_seats(context["showtime_id"]), Config.CHAT_TURN_TIMEOUT_SECONDS
+        )
+        return seating_agent.format_seat_map(seats)
+
+@st.cache_resource
+def get_booking_system() -> MovieBookingSystem:
+    """One booking engine per process, shared by every browser session.
+
+    Models, agents, the catalog and search indexes are built once; each
+    session only keeps its own conversation context and messages.
+    """
+    return MovieBookingSystem()
+
 def initialize_session_state():
     """Initialize session state variables"""
     if 'context' not in st.session_state:
-        st.session_state.context = {
-            "current_state": "greeting",
-            "selected_movie": None,
-            "selected_theater": None,
-            "selected_showtime": None,
-            "selected_seats": None,
-            "customer_name": None,
-            "customer_email": None
-        }
+        st.session_state.context = SessionState()
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'booking_system' not in st.session_state:
-        st.session_state.booking_system = MovieBookingSystem()
 
 def main():
     st.title("🎬 Movie Booking Assistant")
@@ -77,6 +120,7 @@ def main():
     
     # Initialize session state
     initialize_session_state()
+    booking_system = get_booking_system()
     
     # Create columns for layout
     col1, col2 = st.columns([2, 1])
@@ -103,12 +147,13 @@ def main():
             st.sidebar.write(f"Customer: {st.session_state.context['customer_name']}")
             if st.session_state.context.get("customer_email"):
                 st.sidebar.write(f"Email: {st.session_state.context['customer_email']}")
-            if st.session_state.context.get("selected_movie"):
-                st.sidebar.write(f"Movie: {st.session_state.context['selected_movie'].get('Title', '')}")
-            if st.session_state.context.get("selected_theater"):
-                st.sidebar.write(f"Theater: {st.session_state.context['selected_theater'].get('name', '')}")
-            if st.session_state.context.get("selected_showtime"):
-                st.sidebar.write(f"Time: {st.session_state.context['selected_showtime'].get('time', '')}")
+            booking = booking_system.describe_booking(st.session_state.context)
+            if booking.get("movie_title"):
+                st.sidebar.write(f"Movie: {booking['movie_title']}")
+            if booking.get("theater_name"):
+                st.sidebar.write(f"Theater: {booking['theater_name']}")
+            if booking.get("time"):
+                st.sidebar.write(f"Time: {booking['time']}")
             if st.session_state.context.get("selected_seats"):
                 st.sidebar.write(f"Seats: {', '.join(st.session_state.context['selected_seats'])}")
     
@@ -119,30 +164,26 @@ def main():
             st.write(user_input)
         st.session_state.messages.append({"role": "user", "content": user_input})
         
-        # Get assistant response
+        # Get assistant response, rendering chunks (e.g. search results)
+        # as soon as they arrive instead of after the slowest lookup
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = asyncio.run(
-                    st.session_state.booking_system.process_message(
-                        user_input, 
-                        st.session_state.context
-                    )
+            response = st.write_stream(
+                booking_system.stream_message(
+                    user_input,
+                    st.session_state.context
                 )
-                st.write(response)
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response
-                })
+            )
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": response
+            })
 
-        # Special handling for seat selection
-        if st.session_state.context.get("current_state") == "seat_selection":
-            if "available_seats" in st.session_state.context:
+        # Special handling for seat selection: always the live map
+        if st.session_state.context.get("current_state") == "booking_confirmation":
+            if st.session_state.context.get("selecting_seats", True) and "showtime_id" in st.session_state.context:
                 with col2:
                     st.subheader("Seating Map")
-                    seat_map = st.session_state.booking_system.coordinator.seating_agent.format_seat_map(
-                        st.session_state.context["available_seats"]
-                    )
-                    st.text(seat_map)
+                    st.text(booking_system.seat_map(st.session_state.context))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,1410 @@
+# benchmarks.py
+"""Performance benchmarks for the booking assistant.
+
+Usage:
+    python benchmarks.py <benchmark> [args...]
+    python benchmarks.py list
+"""
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+def _percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+class FakeOMDBClient:
+    """Stand-in for OMDBClient with injected, heavy-tailed latency.
+
+    Like the real client, a request times out after
+    Config.OMDB_REQUEST_TIMEOUT_SECONDS or at the turn's deadline, and goes
+    through `admission` if one is given. With a `capacity`, only that many
+    requests are served at once and the rest queue, like a saturated API.
+    """
+
+    def __init__(self, median_seconds: float = 0.08, tail_probability: float = 0.05,
+                 tail_seconds: float = 1.5, seed: int = 7, capacity: Optional[int] = None,
+                 admission=None):
+        self.median_seconds = median_seconds
+        self.tail_probability = tail_probability
+        self.tail_seconds = tail_seconds
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.capacity = asyncio.Semaphore(capacity) if capacity else None
+        self.admission = admission
+
+    async def _delay(self):
+        if self.admission is None:
+            return await self._serve()
+        async with self.admission.omdb.slot():
+            return await self._serve()
+
+    async def _serve(self):
+        from config_file import Config
+        from deadline import remaining
+
+        self.calls += 1
+        if self.capacity is not None:
+            timeout = remaining(Config.OMDB_REQUEST_TIMEOUT_SECONDS)
+            start = time.perf_counter()
+            await asyncio.wait_for(self.capacity.acquire(), timeout)
+            try:
+                return await self._respond(timeout - (time.perf_counter() - start))
+            finally:
+                self.capacity.release()
+        return await self._respond(remaining(Config.OMDB_REQUEST_TIMEOUT_SECONDS))
+
+    async def _respond(self, timeout: float):
+        if self.rng.random() < self.tail_probability:
+            delay = self.tail_seconds
+        else:
+            delay = self.median_seconds * self.rng.lognormvariate(0, 0.4)
+        if delay > timeout:
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(delay)
+
+    async def search(self, query: str) -> List[Dict]:
+        await self._delay()
+        key = abs(hash(query)) % 100_000
+        return [{"imdbID": f"tt{key:05d}{i:02d}", "Title": f"{query} #{i}"} for i in range(8)]
+
+    async def get_details(self, movie_id: str) -> Optional[Dict]:
+        await self._delay()
+        return {
+            "imdbID": movie_id, "Title": f"Movie {movie_id}", "Year": "2020",
+            "Genre": "Action, Drama", "Director": "Jane Doe", "Actors": "A. Actor, B. Actor",
+            "Plot": "A synthetic plot.", "imdbRating": "7.1", "Runtime": "101 min"
+        }
+
+def _no_admission():
+    """Admission control that never limits or degrades, to measure other mechanisms alone"""
+    from admission import AdmissionController
+
+    class NoAdmission(AdmissionController):
+        def mode(self, name: str) -> bool:
+            return False
+
+    unlimited = {"target_seconds": 1e9, "initial_limit": 10**6, "max_limit": 10**6, "max_queue": 10**6}
+    return NoAdmission(limits={name: unlimited for name in ("turns", "omdb", "llm")})
+
+def _use_mock_models():
+    """Point LlamaIndex at local mock models so agents can be built offline"""
+    from llama_index.core import Settings
+    from llama_index.core.llms import MockLLM
+    from llama_index.core.embeddings import MockEmbedding
+
+    Settings.llm = MockLLM()
+    Settings.embed_model = MockEmbedding(embed_dim=64)
+
+def _legacy_movie_index(db):
+    """The vector store over the catalog every PreferencesAgent used to build"""
+    from llama_index.core import Document, VectorStoreIndex
+
+    return VectorStoreIndex.from_documents([
+        Document(text=(
+            f"Title: {movie['title']}\nGenre: {movie['genre']}\nDirector: {movie['director']}\n"
+            f"Actors: {movie['actors']}\nPlot: {movie['plot']}"
+        ), metadata=movie)
+        for movie in db.movies.values()
+    ])
+
+def bench_suggestions(turns: str = "200"):
+    """p50/p99 latency of MovieAgent.get_movie_suggestions against a slow fake OMDB"""
+    from movie_agent import MovieAgent
+
+    _use_mock_models()
+    agent = MovieAgent()
+    agent.omdb_client = FakeOMDBClient()
+    preferences = {
+        "favorite_genres": ["action", "drama"],
+        "favorite_actors": ["Christian Bale", "Morgan Freeman"]
+    }
+
+    async def sequential_baseline() -> None:
+        # The pre-fan-out behaviour: four searches, each with serial details
+        for query in ["action movies", "drama movies", "Christian Bale", "Morgan Freeman"]:
+            movies = await agent.omdb_client.search(query)
+            for movie in movies[:5]:
+                await agent.omdb_client.get_details(movie["imdbID"])
+
+    async def run() -> Dict[str, List[float]]:
+        samples = {"sequential": [], "concurrent": []}
+        for i in range(int(turns)):
+            if i < 20:
+                t0 = time.perf_counter()
+                await sequential_baseline()
+                samples["sequential"].append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            await agent.get_movie_suggestions(preferences)
+            samples["concurrent"].append(time.perf_counter() - t0)
+        return samples
+
+    samples = asyncio.run(run())
+    for name, values in samples.items():
+        print(
+            f"{name:>10}: n={len(values):4d}  p50={_percentile(values, 50) * 1000:7.1f}ms  "
+            f"p99={_percentile(values, 99) * 1000:7.1f}ms"
+        )
+
+def _omdb_payload(i: int) -> Dict:
+    """A full OMDB detail payload, as returned with plot=full"""
+    genres = ["Action, Adventure, Sci-Fi", "Drama", "Comedy, Romance", "Crime, Drama, Thriller"]
+    return {
+        "Title": f"Synthetic Movie {i}", "Year": str(1990 + i % 35), "Rated": "PG-13",
+        "Released": "16 Jul 2010", "Runtime": f"{90 + i % 60} min", "Genre": genres[i % len(genres)],
+        "Director": f"Director {i % 50}", "Writer": f"Writer {i % 80}, Writer {i % 81}",
+        "Actors": f"Actor {i % 200}, Actor {i % 201}, Actor {i % 202}",
+        "Plot": "A long synthetic plot description that goes on for a while. " * 8,
+        "Language": "English, Japanese, French", "Country": "United States, United Kingdom",
+        "Awards": "Won 4 Oscars. 159 wins & 220 nominations total",
+        "Poster": f"https://m.media-amazon.com/images/M/{i}.jpg",
+        "Ratings": [
+            {"Source": "Internet Movie Database", "Value": "8.8/10"},
+            {"Source": "Rotten Tomatoes", "Value": "87%"},
+            {"Source": "Metacritic", "Value": "74/100"}
+        ],
+        "Metascore": "74", "imdbRating": f"{5 + i % 50 / 10:.1f}", "imdbVotes": "2,400,000",
+        "imdbID": f"tt{i:07d}", "Type": "movie", "DVD": "07 Dec 2010", "BoxOffice": "$292,587,330",
+        "Production": "N/A", "Website": "N/A", "Response": "True"
+    }
+
+def bench_movie_memory(sessions: str = "2000"):
+    """Per-session memory of raw OMDB payloads vs Movie records (tracemalloc)"""
+    from movie import Movie
+
+    sessions = int(sessions)
+    # Each session receives its own HTTP response bodies, so decode per session
+    bodies = [json.dumps(_omdb_payload(i)) for i in range(500)]
+    rng = random.Random(3)
+
+    def measure(convert: Callable) -> int:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        contexts = [
+            {"available_movies": [convert(json.loads(rng.choice(bodies))) for _ in range(5)]}
+            for _ in range(sessions)
+        ]
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del contexts
+        return used
+
+    raw = measure(lambda payload: payload)
+    compact = measure(Movie.from_dict)
+    print(f"sessions:                {sessions:,} (5 movies each)")
+    print(f"raw OMDB payloads:       {raw / sessions:,.0f} bytes/session")
+    print(f"Movie records:           {compact / sessions:,.0f} bytes/session")
+    print(f"saved:                   {(raw - compact) / sessions:,.0f} bytes/session "
+          f"({(1 - compact / raw) * 100:.0f}%)")
+
+def bench_trending(n_events: str = "10000000"):
+    """Replay a synthetic stream of booking events through TrendingEngine"""
+    from trending import TrendingEngine
+
+    n_events = int(n_events)
+    n_movies = 50_000
+    theaters = [f"th{i}" for i in range(1, 21)]
+    slots = ["morning", "afternoon", "evening", "night"]
+    rng = random.Random(42)
+
+    # Zipf-like popularity so a handful of titles dominate, as in real traffic
+    weights = [1.0 / (rank + 1) ** 1.1 for rank in range(n_movies)]
+    movie_ids = [f"tt{rank:07d}" for rank in range(n_movies)]
+    batch = 100_000
+
+    clock = [0.0]
+    engine = TrendingEngine(
+        half_life_seconds=6 * 3600,
+        clock=lambda: clock[0]
+    )
+
+    start = time.perf_counter()
+    done = 0
+    while done < n_events:
+        size = min(batch, n_events - done)
+        movies = rng.choices(movie_ids, weights=weights, k=size)
+        for movie_id in movies:
+            clock[0] += 0.05  # ~20 bookings per second of simulated time
+            engine.record(
+                movie_id,
+                theaters[rng.randrange(len(theaters))],
+                slots[rng.randrange(len(slots))],
+                timestamp=clock[0]
+            )
+        done += size
+    elapsed = time.perf_counter() - start
+
+    read_samples = []
+    for _ in range(10_000):
+        theater = theaters[rng.randrange(len(theaters))]
+        t0 = time.perf_counter()
+        engine.top(10, theater_id=theater)
+        read_samples.append(time.perf_counter() - t0)
+
+    tracked = sum(len(scores) for scores in engine.scores.values())
+    print(f"events replayed:      {n_events:,}")
+    print(f"ingest throughput:    {n_events / elapsed:,.0f} events/s")
+    print(f"ingest time:          {elapsed:.1f}s")
+    print(f"scopes:               {len(engine.scores)}")
+    print(f"tracked (scope,movie): {tracked:,}")
+    print(f"top-10 read p50:      {_percentile(read_samples, 50) * 1e6:.1f}us")
+    print(f"top-10 read p99:      {_percentile(read_samples, 99) * 1e6:.1f}us")
+
+def _synthetic_movie(i: int, rng: random.Random) -> Dict:
+    """A generated catalog entry with realistic-looking text fields"""
+    words = ["dark", "night", "return", "last", "star", "city", "dream", "shadow",
+             "king", "river", "storm", "lost", "empire", "silent", "golden", "winter",
+             "ghost", "iron", "secret", "blood", "love", "war", "machine", "ocean"]
+    first = ["James", "Maria", "Chen", "Olu", "Anna", "Ravi", "Lucas", "Sofia", "Ken", "Ines"]
+    last = ["Stone", "Garcia", "Nolan", "Okafor", "Ivanova", "Patel", "Moreau", "Kim", "Silva", "Berg"]
+    genres = ["Action", "Drama", "Comedy", "Sci-Fi", "Thriller", "Horror", "Romance", "Crime"]
+    person = lambda: f"{rng.choice(first)} {rng.choice(last)}"
+    return {
+        "id": f"tt{i:07d}",
+        "title": " ".join(rng.sample(words, rng.randint(1, 4))).title() + f" {i}",
+        "genre": ", ".join(rng.sample(genres, 2)),
+        "director": person(),
+        "actors": ", ".join(person() for _ in range(3)),
+    }
+
+def _typo(text: str, rng: random.Random) -> str:
+    """Drop, swap or replace one character"""
+    i = rng.randrange(1, len(text) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return text[:i] + text[i + 1:]
+    if kind == 1:
+        return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+    return text[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + text[i + 1:]
+
+def bench_search_index(n_movies: str = "100000", n_queries: str = "5000"):
+    """Build time and query latency of the trigram index on a synthetic catalog"""
+    from search_index import TrigramIndex
+
+    n_movies, n_queries = int(n_movies), int(n_queries)
+    rng = random.Random(11)
+    movies = [_synthetic_movie(i, rng) for i in range(n_movies)]
+
+    index = TrigramIndex()
+    start = time.perf_counter()
+    for movie in movies:
+        index.add_movie(movie)
+    build_seconds = time.perf_counter() - start
+
+    samples = []
+    hits = 0
+    for _ in range(n_queries):
+        movie = movies[rng.randrange(n_movies)]
+        query = _typo(movie["title"], rng)
+        t0 = time.perf_counter()
+        results = index.search(query, limit=5)
+        samples.append(time.perf_counter() - t0)
+        hits += any(movie_id == movie["id"] for movie_id, _ in results)
+
+    print(f"catalog size:         {n_movies:,}")
+    print(f"build time:           {build_seconds:.1f}s ({n_movies / build_seconds:,.0f} movies/s)")
+    print(f"typo queries:         {n_queries:,}")
+    print(f"target in top-5:      {hits / n_queries:.1%}")
+    print(f"query p50:            {_percentile(samples, 50) * 1e3:.3f}ms")
+    print(f"query p99:            {_percentile(samples, 99) * 1e3:.3f}ms")
+
+def _write_catalog_tsv(n_movies: int, seed: int = 5) -> str:
+    """Write a synthetic IMDb-style TSV dump to a temp file and return its path"""
+    rng = random.Random(seed)
+    path = os.path.join(tempfile.mkdtemp(), "title.basics.tsv")
+    with open(path, "w") as f:
+        f.write("tconst\tprimaryTitle\tstartYear\truntimeMinutes\tgenres\tdirectors\tactors\taverageRating\n")
+        for i in range(n_movies):
+            movie = _synthetic_movie(i, rng)
+            genres = movie["genre"].replace(", ", ",")
+            f.write(f"{movie['id']}\t{movie['title']}\t{rng.randint(1920, 2024)}\t"
+                    f"{rng.randint(70, 180)}\t{genres}\t{movie['director']}\t{movie['actors']}\t"
+                    f"{rng.uniform(1, 10):.1f}\n")
+    return path
+
+def bench_catalog(n_movies: str = "1000000"):
+    """Bulk TSV import, memory footprint and query latency of ColumnarCatalog"""
+    from catalog import ColumnarCatalog
+
+    n_movies = int(n_movies)
+    rng = random.Random(5)
+    path = _write_catalog_tsv(n_movies)
+
+    # Baseline: the same rows held as one dict per movie (sampled, then scaled)
+    sample_size = min(n_movies, 100_000)
+    tracemalloc.start()
+    with open(path) as f:
+        header = f.readline().rstrip("\n").split("\t")
+        as_dicts = {}
+        for _, line in zip(range(sample_size), f):
+            row = dict(zip(header, line.rstrip("\n").split("\t")))
+            as_dicts[row["tconst"]] = row
+    dict_bytes = tracemalloc.get_traced_memory()[0] / sample_size * n_movies
+    tracemalloc.stop()
+    del as_dicts
+
+    catalog = ColumnarCatalog()
+    start = time.perf_counter()
+    catalog.import_file(path)
+    import_seconds = time.perf_counter() - start
+
+    # Import again under tracemalloc to measure what the catalog retains
+    del catalog
+    catalog = ColumnarCatalog()
+    tracemalloc.start()
+    catalog.import_file(path)
+    columnar_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    os.remove(path)
+
+    lookups = []
+    for _ in range(10_000):
+        movie_id = f"tt{rng.randrange(n_movies):07d}"
+        t0 = time.perf_counter()
+        catalog.get(movie_id)
+        lookups.append(time.perf_counter() - t0)
+
+    filters = []
+    for _ in range(50):
+        t0 = time.perf_counter()
+        catalog.filter(genres=["sci-fi"], year_from=1990, year_to=2010, min_rating=7.5, limit=20)
+        filters.append(time.perf_counter() - t0)
+
+    print(f"movies imported:      {n_movies:,}")
+    print(f"import time:          {import_seconds:.1f}s ({n_movies / import_seconds:,.0f} rows/s)")
+    print(f"columnar memory:      {columnar_bytes / 1e6:,.0f}MB")
+    print(f"as dicts (estimated): {dict_bytes / 1e6:,.0f}MB")
+    print(f"id lookup p50:        {_percentile(lookups, 50) * 1e6:.1f}us")
+    print(f"id lookup p99:        {_percentile(lookups, 99) * 1e6:.1f}us")
+    print(f"filter p50:           {_percentile(filters, 50) * 1e3:.1f}ms")
+    print(f"filter p99:           {_percentile(filters, 99) * 1e3:.1f}ms")
+
+def _memory_mb() -> Dict[str, float]:
+    """Resident (RSS) and proportional (PSS) set size of this process, Linux only"""
+    stats = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss"):
+                stats[key.lower()] = int(value.split()[0]) / 1024
+    return stats
+
+def bench_snapshot_worker(mode: str, path: str, n_movies: str):
+    """(internal) One worker process loading the catalog and serving lookups"""
+    from catalog import ColumnarCatalog
+    from catalog_snapshot import CatalogSnapshot
+    from search_index import TrigramIndex
+
+    start = time.perf_counter()
+    if mode == "snapshot":
+        catalog = CatalogSnapshot(path)
+        index = catalog.search_index()
+    else:
+        catalog = ColumnarCatalog()
+        catalog.import_file(path)
+        index = TrigramIndex()
+        for movie in catalog.values():
+            index.add_movie(movie)
+    startup = time.perf_counter() - start
+    startup_rss = _memory_mb()["rss"]
+
+    # Serve some traffic so the working set is realistic
+    rng = random.Random(os.getpid())
+    for _ in range(2000):
+        movie = catalog[f"tt{rng.randrange(int(n_movies)):07d}"]
+    for _ in range(200):
+        index.search(_typo(movie["title"], rng))
+        movie = catalog[f"tt{rng.randrange(int(n_movies)):07d}"]
+    catalog.filter(genres=["drama"], min_rating=8.0, limit=20)
+
+    print(json.dumps({"startup": startup, "startup_rss": startup_rss}), flush=True)
+    # Wait until every worker is up so PSS reflects the pages they share
+    sys.stdin.readline()
+    print(json.dumps(_memory_mb()), flush=True)
+
+def bench_snapshot(n_movies: str = "1000000", workers: str = "4"):
+    """Startup time and per-worker memory: TSV import vs memory-mapped snapshot"""
+    from catalog import ColumnarCatalog
+    from catalog_snapshot import write_snapshot
+
+    n_movies, workers = int(n_movies), int(workers)
+    tsv_path = _write_catalog_tsv(n_movies)
+    snapshot_path = os.path.join(os.path.dirname(tsv_path), "catalog.snapshot")
+
+    start = time.perf_counter()
+    catalog = ColumnarCatalog()
+    catalog.import_file(tsv_path)
+    write_snapshot(catalog, snapshot_path)
+    del catalog
+    print(f"movies:               {n_movies:,}")
+    print(f"snapshot build:       {time.perf_counter() - start:.1f}s "
+          f"({os.path.getsize(snapshot_path) / 1e6:,.0f}MB on disk)")
+
+    for mode, path in (("import", tsv_path), ("snapshot", snapshot_path)):
+        # Workers start one after another (so startup times don't contend for
+        # CPU) and stay alive, so the memory readings see all of them at once
+        procs = []
+        startups = []
+        for _ in range(workers):
+            proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "snapshot_worker", mode, path, str(n_movies)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+            )
+            procs.append(proc)
+            startups.append(json.loads(proc.stdout.readline()))
+        memory = []
+        for proc in procs:
+            proc.stdin.write("\n")
+            proc.stdin.flush()
+            memory.append(json.loads(proc.stdout.readline()))
+            proc.wait()
+        rss = sum(m["rss"] for m in memory) / workers
+        pss = sum(m["pss"] for m in memory) / workers
+        startup = sum(m["startup"] for m in startups) / workers
+        startup_rss = sum(m["startup_rss"] for m in startups) / workers
+        print(f"{mode + ':':<22}startup {startup:.2f}s (RSS {startup_rss:,.0f}MB); after traffic "
+              f"RSS {rss:,.0f}MB, PSS {pss:,.0f}MB per worker ({workers} workers)")
+
+    os.remove(tsv_path)
+    os.remove(snapshot_path)
+
+def bench_session_store_worker(backend: str, chat_ids: str, path: str):
+    """(internal) One soak run of a session store in a fresh process"""
+    from session_state import SessionState
+    from session_store import MemorySessionStore, SQLiteSessionStore
+
+    n_chats = int(chat_ids)
+    clock = [0.0]
+    dt, gap_steps, turns, ttl = 0.01, 2000, 4, 600.0  # 100 new chats/s, 20s to read each reply
+    rng = random.Random(7)
+    if backend == "dict":
+        # The previous bot: a dict that only forgets chats that finish or /cancel
+        stores = [{}]
+    elif backend == "memory":
+        stores = [MemorySessionStore(ttl_seconds=ttl, clock=lambda: clock[0])]
+    else:
+        # Two workers sharing one file, each turn of a chat served by either
+        stores = [SQLiteSessionStore(path, ttl_seconds=ttl, clock=lambda: 1e9 + clock[0])
+                  for _ in range(2)]
+    abandoned = {chat for chat in range(n_chats) if rng.random() < 0.3}
+
+    lost = 0
+    rss = [_memory_mb()["rss"]]
+    start = time.perf_counter()
+    for step in range(n_chats + (turns - 1) * gap_steps):
+        clock[0] = step * dt
+        for turn in range(turns):
+            chat = step - turn * gap_steps
+            if not 0 <= chat < n_chats or (turn and chat in abandoned):
+                continue
+            store = stores[rng.randrange(len(stores))]
+            if turn == 0:
+                store[chat] = SessionState(
+                    current_state="initial", user_id=str(chat), customer_name="Bench",
+                    customer_email="bench@example.com", movie_ids=["tt1375666", "tt0468569"],
+                )
+            state = store.get(chat)
+            if state is None or (state.get("seat_version") or 0) != turn:
+                lost += 1
+                continue
+            state["seat_version"] = turn + 1
+            if turn == turns - 1:
+                del store[chat]
+            elif backend != "dict":
+                store.save(chat)
+        if step and step % (n_chats // 5) == 0:
+            rss.append(_memory_mb()["rss"])
+    elapsed = time.perf_counter() - start
+    rss.append(_memory_mb()["rss"])
+
+    live = len(stores[0]) if backend == "dict" else stores[0].stats()["size"]
+    result = {"elapsed": elapsed, "rss": rss, "lost": lost, "live": live}
+    if backend == "sqlite":
+        for store in stores:
+            store.close()
+        import sqlite3
+        result["rows"] = sqlite3.connect(path).execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+    print(json.dumps(result), flush=True)
+
+def bench_session_store(chat_ids: str = "1000000"):
+    """Soak of distinct chat IDs: memory and lost turns of a plain dict, the LRU+TTL store and SQLite"""
+    path = os.path.join(tempfile.mkdtemp(), "sessions.db")
+    print(f"chats:      {int(chat_ids):,} (30% abandoned after one message, the rest finish in 4)")
+    for backend in ("dict", "memory", "sqlite"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "session_store_worker", backend, chat_ids, path],
+            stdout=subprocess.PIPE, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        rss = " -> ".join(f"{mb:,.0f}" for mb in result["rss"])
+        rows = f", {result['rows']:,} rows on disk" if "rows" in result else ""
+        print(f"{backend + ':':<12}{result['elapsed']:.1f}s, RSS {rss}MB, {result['live']:,} sessions "
+              f"held{rows}, {result['lost']:,} turns lost")
+    for name in os.listdir(os.path.dirname(path)):
+        os.remove(os.path.join(os.path.dirname(path), name))
+
+def bench_sessions(n_sessions: str = "1000"):
+    """Per-session cost: eager agent construction vs lazy agents from the shared registry"""
+    from agent_registry import registry
+    from booking_agent import BookingAgent
+    from coordinator import CoordinatorAgent
+    from mockdb import MockDatabase
+    from movie_agent import MovieAgent
+    from preferences_agent import PreferencesAgent
+    from seating_agent import SeatingAgent
+    from session_state import SessionState
+
+    _use_mock_models()
+    # Similarity and embedding files built on first use land in a scratch directory
+    os.chdir(tempfile.mkdtemp())
+    n_sessions = int(n_sessions)
+
+    def first_turn(coordinator: CoordinatorAgent) -> str:
+        context = SessionState(current_state="initial", customer_name="Bench",
+                               customer_email="bench@example.com")
+        return asyncio.run(coordinator.process_input("incepton", context))
+
+    # The previous behaviour: every session built its own database, every
+    # specialist agent, their ReAct agents and the preferences vector index
+    eager = []
+    for _ in range(min(n_sessions, 5)):
+        t0 = time.perf_counter()
+        db = MockDatabase()
+        agents = [cls(db) for cls in (MovieAgent, SeatingAgent, BookingAgent, PreferencesAgent)]
+        agents.append(MovieAgent(db))
+        for agent in agents:
+            agent.agent
+        _legacy_movie_index(db)
+        CoordinatorAgent(db).agent
+        eager.append(time.perf_counter() - t0)
+
+    registry.clear()
+    t0 = time.perf_counter()
+    first_turn(CoordinatorAgent())
+    cold = time.perf_counter() - t0
+
+    create, turns = [], []
+    for _ in range(n_sessions):
+        t0 = time.perf_counter()
+        coordinator = CoordinatorAgent()
+        t1 = time.perf_counter()
+        first_turn(coordinator)
+        create.append(t1 - t0)
+        turns.append(time.perf_counter() - t1)
+
+    print(f"eager session setup:  p50 {_percentile(eager, 50) * 1e3:.1f}ms (previous behaviour)")
+    print(f"cold session + turn:  {cold * 1e3:.1f}ms (builds the shared database and agents)")
+    print(f"warm session create:  p50 {_percentile(create, 50) * 1e6:.1f}us  "
+          f"p99 {_percentile(create, 99) * 1e6:.1f}us")
+    print(f"warm first turn:      p50 {_percentile(turns, 50) * 1e3:.2f}ms  "
+          f"p99 {_percentile(turns, 99) * 1e3:.2f}ms")
+    print(f"registry builds:      {registry.builds}")
+
+def bench_concurrent_sessions(users: str = "1,10,50"):
+    """Memory and first-response latency as concurrent users grow: per-session vs shared engine"""
+    from concurrent.futures import ThreadPoolExecutor
+    from agent_registry import registry
+    from coordinator import CoordinatorAgent
+    from mockdb import MockDatabase
+    from session_state import SessionState
+
+    _use_mock_models()
+    os.chdir(tempfile.mkdtemp())
+
+    def new_context() -> SessionState:
+        return SessionState(current_state="initial", customer_name="Bench",
+                            customer_email="bench@example.com")
+
+    def per_session_engine() -> CoordinatorAgent:
+        # The previous app: every browser session built its own engine
+        coordinator = CoordinatorAgent(MockDatabase())
+        _legacy_movie_index(coordinator.db)
+        return coordinator
+
+    shared = CoordinatorAgent()
+
+    def shared_engine() -> CoordinatorAgent:
+        return shared
+
+    def session(engine) -> Tuple[CoordinatorAgent, Dict, float]:
+        t0 = time.perf_counter()
+        coordinator, context = engine(), new_context()
+        asyncio.run(coordinator.process_input("incepton", context))
+        return coordinator, context, time.perf_counter() - t0
+
+    for n_users in (int(n) for n in users.split(",")):
+        for name, engine in (("per-session", per_session_engine), ("shared", shared_engine)):
+            with ThreadPoolExecutor(max_workers=n_users) as pool:
+                latencies = [latency for _, _, latency in pool.map(lambda _: session(engine), range(n_users))]
+
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            with ThreadPoolExecutor(max_workers=n_users) as pool:
+                sessions = list(pool.map(lambda _: session(engine), range(n_users)))
+            grown = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+            # Per-session engines are also pinned by the registry; drop them
+            del sessions
+            registry.clear()
+
+            print(f"{n_users:4d} users  {name:12s} memory/session {grown / n_users / 1e6:7.2f}MB  "
+                  f"first response p50 {_percentile(latencies, 50) * 1e3:7.1f}ms  "
+                  f"p99 {_percentile(latencies, 99) * 1e3:7.1f}ms")
+
+def bench_streaming(turns: str = "100"):
+    """Time to first chunk vs full reply for streamed searches and recommendations (fake OMDB)"""
+    from coordinator import CoordinatorAgent
+    from session_state import SessionState
+
+    _use_mock_models()
+    os.chdir(tempfile.mkdtemp())
+    coordinator = CoordinatorAgent()
+    coordinator.movie_agent.omdb_client = FakeOMDBClient()
+    preferences = {"favorite_genres": ["action", "drama"], "favorite_actors": ["Christian Bale"]}
+
+    def new_context(i: int) -> SessionState:
+        # A fresh user per turn keeps the recommendation cache cold
+        return SessionState(current_state="initial", user_id=f"bench{i}",
+                            customer_name="Bench", customer_email="bench@example.com")
+
+    async def run() -> Dict[str, List[float]]:
+        samples = {name: [] for name in (
+            "search first chunk", "search full reply", "search templated",
+            "recommend first chunk", "recommend full reply", "recommend templated")}
+        for i in range(int(turns)):
+            await coordinator.db.update_user_preferences(f"bench{i}", preferences)
+            for kind, user_input in (("search", f"zqx {i}"), ("recommend", "recommend")):
+                t0 = time.perf_counter()
+                first = None
+                async for _ in coordinator.process_input_stream(user_input, new_context(i)):
+                    if first is None:
+                        first = time.perf_counter() - t0
+                samples[f"{kind} first chunk"].append(first)
+                samples[f"{kind} full reply"].append(time.perf_counter() - t0)
+
+                coordinator.preferences_agent.recommendation_cache.invalidate_user(f"bench{i}")
+                t0 = time.perf_counter()
+                await coordinator.process_input(user_input, new_context(i))
+                samples[f"{kind} templated"].append(time.perf_counter() - t0)
+        return samples
+
+    for name, values in asyncio.run(run()).items():
+        print(f"{name:>22}: p50={_percentile(values, 50) * 1000:7.1f}ms  "
+              f"p99={_percentile(values, 99) * 1000:7.1f}ms")
+
+def bench_prefetch(turns: str = "30", backend_ms: str = "80", read_ms: str = "300"):
+    """Funnel step latency with and without speculative prefetch (slow fake backend)"""
+    from coordinator import CoordinatorAgent
+    from prefetch import Prefetcher
+    from session_state import SessionState
+
+    _use_mock_models()
+    os.chdir(tempfile.mkdtemp())
+    delay = float(backend_ms) / 1000
+
+    def slow(fn: Callable) -> Callable:
+        async def call(*args, **kwargs):
+            await asyncio.sleep(delay)
+            return await fn(*args, **kwargs)
+        return call
+
+    async def run(prefetcher: Prefetcher) -> Dict[str, List[float]]:
+        coordinator = CoordinatorAgent()
+        coordinator.__dict__["prefetcher"] = prefetcher
+        coordinator.movie_agent.omdb_client = FakeOMDBClient()
+        for agent, names in ((coordinator.booking_agent, ("get_theaters", "get_showtimes")),
+                             (coordinator.seating_agent, ("get_available_seats", "suggest_seats"))):
+            for name in names:
+                setattr(agent, name, slow(getattr(type(agent), name).__get__(agent)))
+        samples = {"movie -> theaters": [], "theater -> showtimes": [], "showtime -> seats": []}
+        for i in range(int(turns)):
+            context = SessionState(current_state="initial", customer_name="Bench",
+                                   customer_email="bench@example.com")
+            await coordinator.process_input("incepton", context)
+            for step, choice in zip(samples, ("1", "1", str(i % 3 + 1))):
+                await asyncio.sleep(float(read_ms) / 1000)  # the user reads the reply
+                t0 = time.perf_counter()
+                await coordinator.process_input(choice, context)
+                samples[step].append(time.perf_counter() - t0)
+            coordinator.prefetcher.retain(context["prefetch_owner"])
+        return samples
+
+    for name, prefetcher in (("no prefetch", Prefetcher(max_concurrent=0)), ("prefetch", Prefetcher())):
+        for step, values in asyncio.run(run(prefetcher)).items():
+            print(f"{name:>11} {step:>21}: p50={_percentile(values, 50) * 1000:6.1f}ms  "
+                  f"p99={_percentile(values, 99) * 1000:6.1f}ms")
+        stats = prefetcher.stats()
+        print(f"{'':>11} scheduled={stats['scheduled']} skipped={stats['skipped']} "
+              f"hit_rate={stats['hit_rate']:.0%} cancelled={stats['cancelled']} wasted={stats['wasted']}")
+
+def bench_conversation(conversations: str = "50"):
+    """Scripted booking conversations; prints per-state handler and transition latency histograms"""
+    from coordinator import CoordinatorAgent
+    from session_state import SessionState
+
+    _use_mock_models()
+    os.chdir(tempfile.mkdtemp())
+    coordinator = CoordinatorAgent()
+    coordinator.movie_agent.omdb_client = FakeOMDBClient()
+    script = ["I am Bench", "bench@example.com", "hi", "action, drama", "Christian Bale",
+              "evening", "incepton", "1", "1", "1", "A1 A2", "no", "recommend", "1", "1", "2"]
+
+    async def run():
+        for i in range(int(conversations)):
+            context = SessionState(user_id=f"bench{i}")
+            for message in script:
+                async for _ in coordinator.process_input_stream(message, context):
+                    pass
+
+    asyncio.run(run())
+    stats = coordinator.get_state_metrics()
+    for name, summary in stats["histograms"].items():
+        print(f"{name[len('coordinator.'):]:>52}: n={summary['count']:5d}  "
+              f"p50={summary['p50'] * 1000:7.2f}ms  p99={summary['p99'] * 1000:7.2f}ms")
+    for name, count in stats["counters"].items():
+        print(f"{name[len('coordinator.'):]:>52}: {count}")
+
+def bench_session_state(sessions: str = "10000"):
+    """Per-session memory and serialized size: full-object contexts vs ID-based SessionState"""
+    from mockdb import MockDatabase
+    from movie import Movie
+    from session_state import SessionState
+
+    sessions = int(sessions)
+    db = MockDatabase()
+    theaters = asyncio.run(db.get_theaters())
+    showtime_ids = list(db.seats)
+    rng = random.Random(11)
+
+    def legacy(i: int) -> Dict:
+        # What a session used to hold mid-booking: the listed movies, the
+        # chosen one, theaters, showtimes and its own copy of the seat map
+        movies = [Movie.from_dict(_omdb_payload(rng.randrange(500))) for _ in range(5)]
+        showtime_id = rng.choice(showtime_ids)
+        return {
+            "current_state": "booking_confirmation", "user_id": f"user{i}",
+            "customer_name": "Bench", "customer_email": "bench@example.com",
+            "available_movies": movies, "selected_movie": movies[0],
+            "available_theaters": [dict(theater) for theater in theaters],
+            "selected_theater": dict(theaters[0]),
+            "available_showtimes": [{"id": showtime_id, "date": "2024-03-20", "time": "19:00"}] * 3,
+            "selected_showtime": {"id": showtime_id, "date": "2024-03-20", "time": "19:00"},
+            "available_seats": {seat: dict(info) for seat, info in db.seats[showtime_id].items()},
+            "selected_seats": ["A1", "A2"], "total_price": 25.98,
+        }
+
+    def compact(i: int) -> SessionState:
+        showtime_id = rng.choice(showtime_ids)
+        return SessionState(
+            current_state="booking_confirmation", user_id=f"user{i}",
+            customer_name="Bench", customer_email="bench@example.com",
+            movie_ids=[f"tt{rng.randrange(500):07d}" for _ in range(5)],
+            movie_id=f"tt{rng.randrange(500):07d}", theater_ids=[t["id"] for t in theaters],
+            theater_id=theaters[0]["id"], showtime_ids=[showtime_id] * 3, showtime_id=showtime_id,
+            seat_version=db.get_seat_version(showtime_id), selected_seats=["A1", "A2"],
+            total_price=25.98,
+        )
+
+    def measure(build: Callable) -> Tuple[int, List]:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        contexts = [build(i) for i in range(sessions)]
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        return used, contexts
+
+    legacy_bytes, legacy_contexts = measure(legacy)
+    legacy_json = sum(len(json.dumps(context, default=Movie.to_dict)) for context in legacy_contexts[:1000])
+    del legacy_contexts
+    compact_bytes, compact_contexts = measure(compact)
+    compact_json = sum(len(context.dumps()) for context in compact_contexts[:1000])
+    assert all(SessionState.loads(c.dumps()) == c for c in compact_contexts[:1000])
+
+    print(f"sessions:                {sessions:,} (mid-booking)")
+    print(f"full-object contexts:    {legacy_bytes / sessions:,.0f} bytes/session, "
+          f"{legacy_json / 1000:,.0f} bytes serialized")
+    print(f"SessionState:            {compact_bytes / sessions:,.0f} bytes/session, "
+          f"{compact_json / 1000:,.0f} bytes serialized")
+    print(f"saved:                   {(1 - compact_bytes / legacy_bytes) * 100:.0f}% memory, "
+          f"{(1 - compact_json / legacy_json) * 100:.0f}% serialized")
+
+def _legacy_extract_name(input_text: str) -> str:
+    """The name extraction the front ends used to copy, for comparison"""
+    import re
+    patterns = [
+        r"(?i)i am ([a-zA-Z]+)", r"(?i)my name is ([a-zA-Z]+)", r"(?i)i'm ([a-zA-Z]+)",
+        r"(?i)call me ([a-zA-Z]+)", r"(?i)this is ([a-zA-Z]+)", r"(?i)^([a-zA-Z]+)$",
+        r"(?i)^hi[,\s]+([a-zA-Z]+)$", r"(?i)^hello[,\s]+([a-zA-Z]+)$", r"(?i)^hey[,\s]+([a-zA-Z]+)$"
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, input_text)
+        if match:
+            return match.group(1).strip().title()
+    cleaned = input_text.lower()
+    for word in ['hi', 'hello', 'hey', 'i am', "i'm", 'my name is', 'this is', 'call me']:
+        cleaned = cleaned.replace(word, '').strip()
+    cleaned = re.sub(r'[^\w\s]', '', cleaned).strip()
+    return cleaned.split()[0].title() if cleaned else ""
+
+def _legacy_extract_email(input_text: str) -> str:
+    """The email extraction the front ends used to copy, for comparison"""
+    import re
+    address = r"([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"
+    patterns = [
+        rf"(?i)my email is[:\s]+{address}", rf"(?i)email[:\s]+{address}",
+        rf"(?i)email address[:\s]+{address}", rf"(?i)here'?s my email[:\s]+{address}",
+        rf"(?i)you can reach me at[:\s]+{address}", address
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, input_text)
+        if match:
+            return match.group(1).strip().lower()
+    for word in input_text.strip().split():
+        if re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', word.strip().lower()):
+            return word.lower()
+    return ""
+
+def _legacy_parse_seats(user_input: str) -> Optional[List[str]]:
+    """handle_booking's old seat parsing and validation, for comparison"""
+    seats = user_input.upper().replace("'", "").strip().split()
+    valid = all(
+        len(seat) in [2, 3] and seat[0] in "ABCDEFGH" and seat[1:].isdigit() and 1 <= int(seat[1:]) <= 10
+        for seat in seats
+    )
+    return seats if valid else None
+
+def bench_input_parser(iterations: str = "20000"):
+    """Per-call latency of input_parser against the old per-front-end helpers"""
+    from config_file import Config
+    from input_parser import INTENT_PHRASES, extract_email, extract_name, match_intent, parse_seats, seat_label
+
+    rng = random.Random(13)
+    n = int(iterations)
+    seat_count = len(Config.VALID_SEAT_ROWS) * Config.MAX_SEAT_NUMBER
+    names = ["john", "Chris", "THIAGO", "ava", "Shey", "Mohammed", "li", "Hiroshi"]
+    name_forms = ["I am {}", "my name is {}", "I'm {}", "call me {}", "This is {}", "{}",
+                  "hi {}", "Hello, {}", "hey {}", "Hi, I am {}"]
+    email_forms = ["{}", "my email is {}", "Email: {}", "email address: {}", "here's my email {}",
+                   "you can reach me at {}", "sure, it's {} thanks", "{} ."]
+
+    def random_email() -> str:
+        user = "".join(rng.choice("abcxyz019._%+-") for _ in range(rng.randint(1, 10)))
+        return f"{user}@{rng.choice(['example', 'mail.co', 'x-y'])}.{rng.choice(['com', 'io', 'CO'])}"
+
+    name_inputs = [rng.choice(name_forms).format(rng.choice(names)) for _ in range(1000)]
+    email_inputs = [rng.choice(email_forms).format(random_email()) for _ in range(1000)]
+    seat_inputs = [" ".join(seat_label(rng.randrange(seat_count)) for _ in range(rng.randint(1, 6)))
+                   for _ in range(1000)]
+    phrases = [phrase for values in INTENT_PHRASES.values() for phrase in values]
+    intent_inputs = [rng.choice(phrases + ["incepton", "the dark knight"]) for _ in range(1000)]
+    legacy_intent = lambda text: next(
+        (intent for intent, values in INTENT_PHRASES.items() if text.lower() in values), None
+    )
+    for label, inputs, old, new in (
+        ("extract_name", name_inputs, _legacy_extract_name, extract_name),
+        ("extract_email", email_inputs, _legacy_extract_email, extract_email),
+        ("parse_seats", seat_inputs, _legacy_parse_seats, parse_seats),
+        ("match_intent", intent_inputs, legacy_intent, match_intent),
+    ):
+        timings = []
+        for fn in (old, new):
+            start = time.perf_counter()
+            for _ in range(max(1, n // 1000)):
+                for text in inputs:
+                    fn(text)
+            timings.append((time.perf_counter() - start) / (max(1, n // 1000) * len(inputs)) * 1e6)
+        print(f"{label:<18} before {timings[0]:6.2f}us  after {timings[1]:6.2f}us  "
+              f"({timings[0] / timings[1]:.1f}x)")
+
+def bench_deadline(turns: str = "200", tail_seconds: str = "3", deadline_seconds: str = "1"):
+    """Search turn tail latency with and without the per-turn deadline (injected OMDB stalls)"""
+    from config_file import Config
+    from coordinator import CoordinatorAgent
+    from session_state import SessionState
+
+    _use_mock_models()
+    os.chdir(tempfile.mkdtemp())
+    preferences = {"favorite_genres": ["action", "drama"], "favorite_actors": ["Christian Bale"]}
+
+    async def run() -> Dict[str, List[float]]:
+        coordinator = CoordinatorAgent()
+        coordinator.movie_agent.omdb_client = FakeOMDBClient(
+            tail_probability=0.05, tail_seconds=float(tail_seconds)
+        )
+        # Every turn starts at once; admission control would queue them
+        admission = _no_admission()
+        for agent in (coordinator, coordinator.movie_agent, coordinator.preferences_agent):
+            agent.admission = admission
+        await coordinator.db.update_user_preferences("bench", preferences)
+
+        async def turn(i: int, streamed: bool) -> float:
+            context = SessionState(current_state="initial", user_id="bench",
+                                   customer_name="Bench", customer_email="bench@example.com")
+            t0 = time.perf_counter()
+            if streamed:
+                async for _ in coordinator.process_input_stream(f"zqx {i}", context):
+                    pass
+            else:
+                await coordinator.process_input(f"zqx {i}", context)
+            return time.perf_counter() - t0
+
+        samples = {}
+        for streamed in (False, True):
+            # Every turn runs at once; the fake backend has no shared capacity
+            samples["streamed" if streamed else "templated"] = await asyncio.gather(*[
+                turn(i, streamed) for i in range(int(turns))
+            ])
+        degraded = coordinator.get_state_metrics()["counters"].get(
+            "coordinator.deadline_exceeded.initial", 0
+        )
+        return samples, degraded
+
+    saved = (Config.TURN_DEADLINE_SECONDS, Config.OMDB_REQUEST_TIMEOUT_SECONDS)
+    try:
+        for name, deadline, request_timeout in (
+            ("no deadline", 1e9, 1e9),
+            ("deadline", float(deadline_seconds), saved[1]),
+        ):
+            Config.TURN_DEADLINE_SECONDS, Config.OMDB_REQUEST_TIMEOUT_SECONDS = deadline, request_timeout
+            samples, degraded = asyncio.run(run())
+            for path, values in samples.items():
+                within = sum(1 for value in values if value <= float(deadline_seconds) + 0.05)
+                print(f"{name:>11} {path:>9}: p50={_percentile(values, 50) * 1000:7.1f}ms  "
+                      f"p99={_percentile(values, 99) * 1000:7.1f}ms  max={max(values) * 1000:7.1f}ms  "
+                      f"within {deadline_seconds}s: {within}/{len(values)}")
+            print(f"{'':>11} degraded turns={degraded}")
+    finally:
+        Config.TURN_DEADLINE_SECONDS, Config.OMDB_REQUEST_TIMEOUT_SECONDS = saved
+
+def bench_admission(users: str = "15", phase_seconds: str = "10", capacity: str = "20"):
+    """Search turns through an OMDB slowdown and back, with and without admission control"""
+    from admission import AdmissionController
+    from coordinator import CoordinatorAgent
+    from session_state import SessionState
+
+    _use_mock_models()
+    os.chdir(tempfile.mkdtemp())
+    phases = (("healthy", 0.08), ("slow", 0.8), ("recovered", 0.08))
+
+    async def run(admission: AdmissionController) -> Dict[str, Dict[str, List[float]]]:
+        coordinator = CoordinatorAgent()
+        omdb = FakeOMDBClient(tail_probability=0.0, capacity=int(capacity), admission=admission)
+        coordinator.movie_agent.omdb_client = omdb
+        for agent in (coordinator, coordinator.movie_agent, coordinator.preferences_agent):
+            agent.admission = admission
+        samples = {name: {"turns": [], "refused": []} for name, _ in phases}
+        phase = {"name": phases[0][0]}
+        # Build the agents' lazy state before anything is timed
+        await coordinator.process_input("warm up", SessionState(current_state="initial", user_id="bench"))
+
+        async def user(u: int, stop: float):
+            i = 0
+            while time.perf_counter() < stop:
+                context = SessionState(current_state="initial", user_id=f"bench{u}",
+                                       customer_name="Bench", customer_email="bench@example.com")
+                name = phase["name"]
+                t0 = time.perf_counter()
+                response = await coordinator.process_input(f"zqx {u} {i}", context)
+                kind = "refused" if response.startswith("We're helping") else "turns"
+                samples[name][kind].append(time.perf_counter() - t0)
+                i += 1
+                await asyncio.sleep(0.2)  # the user reads the reply
+
+        stop = time.perf_counter() + len(phases) * float(phase_seconds)
+        tasks = [asyncio.create_task(user(u, stop)) for u in range(int(users))]
+        for name, median_seconds in phases:
+            phase["name"], omdb.median_seconds = name, median_seconds
+            await asyncio.sleep(float(phase_seconds))
+        await asyncio.gather(*tasks)
+        print(f"{'':>9} omdb calls={omdb.calls}  final limiters: " + ", ".join(
+            f"{name}={stats['level']}/{stats['limit']}" for name, stats in admission.stats().items()
+        ))
+        return samples
+
+    for label, admission in (
+        ("off", _no_admission()),
+        ("on", AdmissionController()),
+    ):
+        print(f"admission {label}:")
+        for name, kinds in asyncio.run(run(admission)).items():
+            values = kinds["turns"]
+            print(f"{name:>11}: turns={len(values):5d}  p50={_percentile(values, 50) * 1000:7.1f}ms  "
+                  f"p99={_percentile(values, 99) * 1000:7.1f}ms  refused={len(kinds['refused'])}")
+
+def bench_llm_cache(turns: str = "3000", llm_ms: str = "20", threshold: str = "0.9"):
+    """Repeated agent questions through CachingLLM: LLM calls, hit rate per tier and tokens saved"""
+    import hashlib
+    import numpy as np
+    from llama_index.core.base.llms.types import ChatMessage
+    from llama_index.core.embeddings import BaseEmbedding
+    from llama_index.core.llms import CompletionResponse, CustomLLM, LLMMetadata
+    from llama_index.core.llms.callbacks import llm_completion_callback
+    from llm_cache import CachingLLM, LLMResponseCache
+
+    class SlowLLM(CustomLLM):
+        """Answers after a fixed delay, reporting usage like the OpenAI client"""
+        delay: float = 0.02
+        calls: int = 0
+
+        @property
+        def metadata(self) -> LLMMetadata:
+            return LLMMetadata(model_name="slow")
+
+        @llm_completion_callback()
+        def complete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+            time.sleep(self.delay)
+            self.calls += 1
+            question = prompt.splitlines()[-2][len("user: "):]
+            text = f"Thought: I can answer without using any more tools.\nAnswer: {question}"
+            return CompletionResponse(text=text, raw={"usage": {"total_tokens": (len(prompt) + len(text)) // 4}})
+
+        @llm_completion_callback()
+        def stream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+            yield self.complete(prompt, formatted, **kwargs)
+
+    class WordHashEmbedding(BaseEmbedding):
+        """Bag of hashed words: paraphrases sharing most words land close together"""
+
+        def _embed(self, text: str) -> List[float]:
+            vector = np.zeros(256)
+            for word in text.split():
+                vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 256] += 1
+            return vector.tolist()
+
+        def _get_query_embedding(self, query: str) -> List[float]:
+            return self._embed(query)
+
+        def _get_text_embedding(self, text: str) -> List[float]:
+            return self._embed(text)
+
+        async def _aget_query_embedding(self, query: str) -> List[float]:
+            return self._embed(query)
+
+    rng = random.Random(19)
+    theaters = ["Cinema City", "Movieplex", "Star Cinema"]
+    titles = [f"Movie {i}" for i in range(100)]
+    questions = (
+        [f"what's playing tonight at {theater}" for theater in theaters]
+        + [f"tell me about {title}" for title in titles]
+        + [f"showtimes for {title} at {theater}" for title in titles for theater in theaters]
+    )
+    header = "You are designed to help with a variety of tasks. " * 30  # ReAct header with tool specs
+
+    def ask() -> str:
+        # Popular questions come up far more often (Zipf-like), worded a few ways
+        question = questions[min(int(rng.paretovariate(1.2)) - 1, len(questions) - 1)
+                             if rng.random() < 0.7 else rng.randrange(len(questions))]
+        text = rng.choice([question, question.upper() + "?", f"please, {question}", f"{question} please"])
+        origin[text] = question
+        return text
+
+    origin: Dict[str, str] = {}
+    messages = [ask() for _ in range(int(turns))]
+    path = os.path.join(tempfile.mkdtemp(), "llm_cache.db")
+    for label, cache in (
+        ("exact", LLMResponseCache(path=path, similarity_threshold=None)),
+        ("exact + semantic", LLMResponseCache(path=None, similarity_threshold=float(threshold))),
+    ):
+        llm = SlowLLM(delay=float(llm_ms) / 1000)
+        cached = CachingLLM(llm, cache, embed_model=WordHashEmbedding(embed_batch_size=1))
+        samples = []
+        wrong = 0
+        start = time.perf_counter()
+        for text in messages:
+            t0 = time.perf_counter()
+            response = cached.chat([ChatMessage(role="system", content=header),
+                                    ChatMessage(role="user", content=text)])
+            samples.append(time.perf_counter() - t0)
+            # An answer reused for a different question is a wrong answer
+            wrong += origin[response.message.content.split("Answer: ", 1)[1]] != origin[text]
+        elapsed = time.perf_counter() - start
+        stats = cache.stats()
+        print(f"{label}:")
+        print(f"  LLM calls:      {llm.calls:,} of {len(messages):,} requests ({elapsed:.1f}s; "
+              f"every request called it before)")
+        print(f"  hit rate:       {stats['hit_rate']:.1%} (exact {stats['exact_hits']:,}, "
+              f"semantic {stats['semantic_hits']:,})")
+        print(f"  tokens saved:   {stats['tokens_saved']:,}")
+        print(f"  wrong answers:  {wrong:,}")
+        print(f"  latency:        p50={_percentile(samples, 50) * 1000:.2f}ms  p99={_percentile(samples, 99) * 1000:.2f}ms")
+        cache.close()
+
+    # A restart loads the persisted answers back
+    reopened = LLMResponseCache(path=path, similarity_threshold=None)
+    llm = SlowLLM(delay=float(llm_ms) / 1000)
+    cached = CachingLLM(llm, reopened)
+    for text in messages[:500]:
+        cached.chat([ChatMessage(role="system", content=header), ChatMessage(role="user", content=text)])
+    print(f"after restart:    {reopened.stats()['size']:,} entries loaded, "
+          f"hit rate {reopened.stats()['hit_rate']:.1%} on the first 500 requests")
+    reopened.close()
+
+def bench_llm_gateway(users: str = "15", seconds: str = "10", background_calls: str = "100",
+                      embeddings: str = "400"):
+    """A burst of turns plus background work against a rate-limited provider, with and without the gateway"""
+    import hashlib
+    from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+    from llama_index.core.embeddings import BaseEmbedding
+    from llama_index.core.llms import CompletionResponse, CustomLLM, LLMMetadata
+    from admission import Overloaded
+    from llm_gateway import GatewayEmbedding, GatewayLLM, LLMGateway, background
+
+    class RateLimited(Exception):
+        """The provider's 429"""
+
+    class FakeProvider:
+        """Serves `max_concurrent` calls at once within a tokens-per-minute bucket, else answers 429"""
+
+        def __init__(self, max_concurrent: int = 8, tokens_per_minute: int = 120000):
+            self.max_concurrent = max_concurrent
+            self.tokens_per_minute = tokens_per_minute
+            self.tokens = float(tokens_per_minute)
+            self.refilled_at = time.monotonic()
+            self.in_flight = 0
+            self.rng = random.Random(23)
+            self.calls = {"llm": 0, "embedding": 0}
+            self.rejected = 0
+
+        async def call(self, kind: str, tokens: int, seconds: float):
+            now = time.monotonic()
+            self.tokens = min(self.tokens_per_minute,
+                              self.tokens + (now - self.refilled_at) * self.tokens_per_minute / 60.0)
+            self.refilled_at = now
+            if self.in_flight >= self.max_concurrent or self.tokens < tokens:
+                self.rejected += 1
+                raise RateLimited()
+            self.tokens -= tokens
+            self.calls[kind] += 1
+            self.in_flight += 1
+            try:
+                await asyncio.sleep(seconds * self.rng.lognormvariate(0, 0.3))
+            finally:
+                self.in_flight -= 1
+
+    class ProviderLLM(CustomLLM):
+        """Chat completions from the fake provider, reporting usage"""
+
+        @property
+        def metadata(self) -> LLMMetadata:
+            return LLMMetadata(model_name="provider", num_output=300)
+
+        def complete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+            raise NotImplementedError()
+
+        def stream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+            raise NotImplementedError()
+
+        async def achat(self, messages, **kwargs) -> ChatResponse:
+            tokens = sum(len(message.content) for message in messages) // 4 + 200
+            await provider.call("llm", tokens, 0.4)
+            return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content="Answer."),
+                                raw={"usage": {"total_tokens": tokens}})
+
+    class ProviderEmbedding(BaseEmbedding):
+        """Embeddings from the fake provider: one request per call, whatever its size"""
+
+        @staticmethod
+        def _vector(text: str) -> List[float]:
+            digest = hashlib.md5(text.encode()).digest()
+            return [b / 255 for b in digest[:8]]
+
+        def _get_query_embedding(self, query: str) -> List[float]:
+            return self._vector(query)
+
+        def _get_text_embedding(self, text: str) -> List[float]:
+            return self._vector(text)
+
+        async def _aget_query_embedding(self, query: str) -> List[float]:
+            return self._vector(query)
+
+        async def _aget_text_embedding(self, text: str) -> List[float]:
+            await provider.call("embedding", len(text) // 4 + 1, 0.1)
+            return self._vector(text)
+
+        async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+            await provider.call("embedding", sum(len(text) // 4 + 1 for text in texts), 0.1)
+            return [self._vector(text) for text in texts]
+
+    prompt = [ChatMessage(role="system", content="You are a movie booking assistant. " * 80),
+              ChatMessage(role="user", content="What's playing tonight?")]
+
+    async def run(llm, embed_model) -> Dict[str, Any]:
+        results = {"turns": [], "turn_errors": 0, "overloaded": 0, "background": 0,
+                   "background_errors": 0, "embeddings": 0, "embedding_errors": 0, "mismatched": 0}
+        stop = time.perf_counter() + float(seconds)
+
+        async def user():
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                try:
+                    await llm.achat(prompt)
+                    results["turns"].append(time.perf_counter() - t0)
+                except RateLimited:
+                    results["turn_errors"] += 1
+                except Overloaded:
+                    results["overloaded"] += 1
+                await asyncio.sleep(0.5)  # the user reads the reply
+
+        async def background_call():
+            try:
+                await llm.achat(prompt)
+                results["background"] += 1
+            except (RateLimited, Overloaded):
+                results["background_errors"] += 1
+
+        async def embed(i: int):
+            await asyncio.sleep(rng.uniform(0, float(seconds) / 2))
+            text = f"Genre: Drama\nActors: Actor {i}"
+            try:
+                vector = await embed_model.aget_text_embedding(text)
+                results["embeddings"] += 1
+                results["mismatched"] += vector != ProviderEmbedding._vector(text)
+            except (RateLimited, Overloaded):
+                results["embedding_errors"] += 1
+
+        with background():
+            jobs = [asyncio.create_task(background_call()) for _ in range(int(background_calls))]
+        jobs += [asyncio.create_task(embed(i)) for i in range(int(embeddings))]
+        await asyncio.gather(*[user() for _ in range(int(users))], *jobs)
+        return results
+
+    for label in ("direct", "gateway"):
+        rng = random.Random(29)
+        provider = FakeProvider()
+        llm, embed_model = ProviderLLM(), ProviderEmbedding()
+        if label == "gateway":
+            llm_gateway = LLMGateway(max_concurrent=provider.max_concurrent, interactive_reserve=2,
+                                     tokens_per_minute=provider.tokens_per_minute)
+            llm = GatewayLLM(llm, llm_gateway)
+            embed_model = GatewayEmbedding(embed_model, llm_gateway)
+        results = asyncio.run(run(llm, embed_model))
+        turns = results["turns"]
+        print(f"{label}:")
+        print(f"  turns:         {len(turns):,} answered, {results['turn_errors']:,} failed with 429, "
+              f"{results['overloaded']:,} refused by the gateway")
+        print(f"  turn latency:  p50={_percentile(turns, 50) * 1000:.0f}ms  p99={_percentile(turns, 99) * 1000:.0f}ms")
+        print(f"  background:    {results['background']:,} done, {results['background_errors']:,} failed or refused")
+        print(f"  embeddings:    {results['embeddings']:,} done in {provider.calls['embedding']:,} requests, "
+              f"{results['embedding_errors']:,} failed, {results['mismatched']} wrong vectors")
+        print(f"  provider 429s: {provider.rejected:,}")
+
+def bench_intent_router(turns: str = "5000", n_movies: str = "20000", llm_ms: str = "1500"):
+    """Share of new-search turns routed without the LLM, routing accuracy and latency per tier"""
+    from intent_router import IntentRouter, Route
+    from mockdb import MockDatabase
+
+    rng = random.Random(17)
+    db = MockDatabase()
+    path = _write_catalog_tsv(int(n_movies))
+    db.import_movies(path)
+    os.remove(path)
+    titles = [movie["title"] for movie in db.catalog.filter(limit=2000)]
+    actors = [movie["actors"].split(", ")[0] for movie in db.catalog.filter(limit=200)]
+    genres = ["comedies", "sci fi", "a horror movie", "something romantic", "thrillers", "action"]
+
+    # What users type at the start of a search, labelled with what they meant
+    kinds = [
+        (0.15, "list_movies", lambda: rng.choice(["show movies", "list movies", "what's on tonight?",
+                                                   "what's playing", "which movies are showing"])),
+        (0.15, "recommend", lambda: rng.choice(["recommend", "recomend", "any suggestions?",
+                                                 "surprise me", "what should i watch"])),
+        (0.30, "search", lambda: rng.choice([rng.choice(titles).lower(), _typo(rng.choice(titles), rng)])),
+        (0.20, "browse", lambda: rng.choice(["any good {}?", "show me {}", "i feel like {}"]).format(
+            rng.choice(genres))),
+        (0.10, "browse", lambda: f"something with {rng.choice(actors).lower()} tonight"),
+        (0.10, None, lambda: rng.choice([
+            "what's playing tonight that you would suggest for a date",
+            "my kids liked the last one, is there anything similar showing this weekend or not",
+            "honestly no idea, it has been a long week and i just want to switch off for two hours",
+        ])),
+    ]
+    messages = []
+    for _ in range(int(turns)):
+        roll = rng.random()
+        for weight, label, make in kinds:
+            roll -= weight
+            if roll <= 0:
+                break
+        messages.append((label, make()))
+
+    async def escalate(text: str) -> Route:
+        await asyncio.sleep(float(llm_ms) / 1000)
+        return Route("search", text, "llm")
+
+    async def run() -> Tuple[IntentRouter, Dict[str, List[float]], int, int]:
+        router = IntentRouter(db, escalate)
+        latency: Dict[str, List[float]] = {}
+        correct = labelled = 0
+
+        async def turn(label: Optional[str], text: str):
+            nonlocal correct, labelled
+            t0 = time.perf_counter()
+            route = await router.route(text)
+            latency.setdefault(route.tier, []).append(time.perf_counter() - t0)
+            if label is not None and route.tier != "llm":
+                labelled += 1
+                correct += route.intent == label
+
+        # Users arrive 200 at a time, so escalations compete for the per-minute budget
+        for i in range(0, len(messages), 200):
+            await asyncio.gather(*[turn(label, text) for label, text in messages[i:i + 200]])
+        return router, latency, correct, labelled
+
+    start = time.perf_counter()
+    router, latency, correct, labelled = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    stats = router.stats()
+    print(f"turns:               {stats['turns']:,} over a {int(n_movies):,}-movie catalog ({elapsed:.1f}s)")
+    print(f"routed without LLM:  {stats['local_share']:.1%} (every turn went to the ReAct agent before)")
+    print(f"escalations:         {stats['tiers'].get('llm', 0):,} sent, "
+          f"{stats['rate_limited']:,} rate limited to a title search")
+    print(f"local accuracy:      {correct / labelled:.1%} of {labelled:,} unambiguous turns")
+    for tier, values in sorted(latency.items(), key=lambda item: -len(item[1])):
+        print(f"{tier:>10}: {len(values) / stats['turns']:6.1%}  p50={_percentile(values, 50) * 1000:8.2f}ms  "
+              f"p99={_percentile(values, 99) * 1000:8.2f}ms")
+
+BENCHMARKS: Dict[str, Callable] = {
+    "admission": bench_admission,
+    "catalog": bench_catalog,
+    "concurrent_sessions": bench_concurrent_sessions,
+    "conversation": bench_conversation,
+    "deadline": bench_deadline,
+    "input_parser": bench_input_parser,
+    "intent_router": bench_intent_router,
+    "llm_cache": bench_llm_cache,
+    "llm_gateway": bench_llm_gateway,
+    "movie_memory": bench_movie_memory,
+    "prefetch": bench_prefetch,
+    "search_index": bench_search_index,
+    "session_state": bench_session_state,
+    "session_store": bench_session_store,
+    "session_store_worker": bench_session_store_worker,
+    "sessions": bench_sessions,
+    "snapshot": bench_snapshot,
+    "snapshot_worker": bench_snapshot_worker,
+    "streaming": bench_streaming,
+    "suggestions": bench_suggestions,
+    "trending": bench_trending,
+}
+
+def main(argv: List[str]):
+    if len(argv) < 2 or argv[1] not in BENCHMARKS:
+        print(__doc__)
+        print("Available benchmarks: " + ", ".join(sorted(BENCHMARKS)))
+        return
+    BENCHMARKS[argv[1]](*argv[2:])
+
+if __name__ == "__main__":
+    main(sys.argv)
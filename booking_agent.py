@@ -1,15 +1,18 @@
 from llama_index.core.agent.react import ReActAgent
 from llama_index.core.tools import FunctionTool
+from functools import cached_property
 from typing import List, Dict, Optional
 from mockdb import MockDatabase
-from llama_index.core import Settings
-from config_file import Config
+from agent_registry import build_react_agent
 
 class BookingAgent:
-    def __init__(self):
-        self.db = MockDatabase()
-        
-        self.tools = [
+    def __init__(self, db: Optional[MockDatabase] = None):
+        self.db = db or MockDatabase()
+
+    @cached_property
+    def tools(self) -> List[FunctionTool]:
+        """Tool wrappers, built on first use"""
+        return [
             FunctionTool.from_defaults(
                 fn=self.get_theaters,
                 name="get_theaters",
@@ -31,18 +34,11 @@ class BookingAgent:
                 description="Format the booking confirmation message"
             )
         ]
-        
-        # Initialize ReAct agent with global settings
-        llm = Settings.llm
-        if llm:
-            llm = llm.copy()
-            llm.system_prompt = Config.SYSTEM_MESSAGES["booking_agent"]
-            
-        self.agent = ReActAgent.from_tools(
-            tools=self.tools,
-            llm=llm,
-            verbose=True
-        )
+
+    @cached_property
+    def agent(self) -> ReActAgent:
+        """ReAct agent over the tools, built on first use"""
+        return build_react_agent(self.tools, "booking_agent")
 
     async def get_theaters(self) -> List[Dict]:
         """Get list of theaters"""
@@ -0,0 +1,118 @@
+# database/booking_stats.py
+import heapq
+from typing import Dict, Iterable, Optional
+from helpers import get_time_slot
+
+class UserBookingStats:
+    """Running booking-history aggregates for a single user"""
+
+    __slots__ = (
+        "genre_counts", "actor_counts", "time_slot_counts",
+        "theater_counts", "movie_counts", "booking_count", "total_spent"
+    )
+
+    def __init__(self):
+        self.genre_counts: Dict[str, int] = {}
+        self.actor_counts: Dict[str, int] = {}
+        self.time_slot_counts: Dict[str, int] = {}
+        self.theater_counts: Dict[str, int] = {}
+        self.movie_counts: Dict[str, int] = {}
+        self.booking_count = 0
+        self.total_spent = 0.0
+
+    @staticmethod
+    def _bump(counts: Dict[str, int], key: str, delta: int):
+        """Add delta to a histogram bucket, dropping buckets that reach zero"""
+        if not key:
+            return
+        value = counts.get(key, 0) + delta
+        if value > 0:
+            counts[key] = value
+        else:
+            counts.pop(key, None)
+
+    def apply(self, movie: Optional[Dict], theater_name: str, time: str,
+              total_price: float, delta: int = 1):
+        """Apply one booking (delta=1) or its cancellation (delta=-1)"""
+        if movie:
+            for genre in movie.get('genre', '').split(','):
+                self._bump(self.genre_counts, genre.strip(), delta)
+            for actor in movie.get('actors', '').split(','):
+                self._bump(self.actor_counts, actor.strip(), delta)
+            self._bump(self.movie_counts, movie.get('id', ''), delta)
+
+        if time:
+            self._bump(self.time_slot_counts, get_time_slot(time), delta)
+        self._bump(self.theater_counts, theater_name, delta)
+
+        self.booking_count += delta
+        self.total_spent += delta * total_price
+
+    @staticmethod
+    def _top(counts: Dict[str, int], limit: int) -> Dict[str, int]:
+        """Return the `limit` largest histogram buckets"""
+        return dict(heapq.nlargest(limit, counts.items(), key=lambda x: x[1]))
+
+    def to_analysis(self, top_n: int = 3) -> Dict:
+        """Render the aggregates in the analyze_booking_history format"""
+        if self.booking_count <= 0:
+            return {}
+
+        return {
+            'favorite_genres': self._top(self.genre_counts, top_n),
+            'favorite_actors': self._top(self.actor_counts, top_n),
+            'preferred_times': dict(self.time_slot_counts),
+            'preferred_theaters': dict(self.theater_counts),
+            'average_spending': self.total_spent / self.booking_count
+        }
+
+class BookingStatsStore:
+    """Per-user booking aggregates maintained incrementally on booking events"""
+
+    def __init__(self):
+        self.users: Dict[str, UserBookingStats] = {}
+
+    def record_booking(self, user_id: str, movie: Optional[Dict], theater_name: str,
+                       time: str, total_price: float):
+        """Fold a newly created booking into the user's aggregates"""
+        stats = self.users.get(user_id)
+        if stats is None:
+            stats = self.users[user_id] = UserBookingStats()
+        stats.apply(movie, theater_name, time, total_price, 1)
+
+    def remove_booking(self, user_id: str, movie: Optional[Dict], theater_name: str,
+                       time: str, total_price: float):
+        """Subtract a cancelled booking from the user's aggregates"""
+        stats = self.users.get(user_id)
+        if stats is None:
+            return
+        stats.apply(movie, theater_name, time, total_price, -1)
+        if stats.booking_count <= 0:
+            del self.users[user_id]
+
+    def get(self, user_id: str) -> Optional[UserBookingStats]:
+        """Get the raw aggregates for a user"""
+        return self.users.get(user_id)
+
+    def get_analysis(self, user_id: str, top_n: int = 3) -> Dict:
+        """Get the booking-history analysis for a user"""
+        stats = self.users.get(user_id)
+        return stats.to_analysis(top_n) if stats else {}
+
+    def backfill(self, bookings: Iterable[Dict], movies: Dict, theaters: Dict) -> int:
+        """Rebuild all aggregates from existing booking records (one-off job)"""
+        self.users.clear()
+        count = 0
+        for booking in bookings:
+            if booking.get("status") != "confirmed":
+                continue
+            theater = theaters.get(booking.get("theater_id"), {})
+            self.record_booking(
+                booking["user_id"],
+                movies.get(booking.get("movie_id")),
+                theater.get("name", ""),
+                booking.get("time", ""),
+                booking.get("total_price", 0.0)
+            )
+            count += 1
+        return count
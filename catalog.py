@@ -0,0 +1,218 @@
+# utils/catalog.py
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+
+FIELDS = ["id", "title", "year", "genre", "director", "actors", "plot", "rating", "runtime", "poster"]
+
+# Source column names accepted for each field: local records, OMDB payloads
+# and the IMDb dataset dumps (title.basics / title.ratings)
+COLUMN_ALIASES = {
+    "id": ["id", "imdbID", "imdb_id", "tconst"],
+    "title": ["title", "Title", "primaryTitle"],
+    "year": ["year", "Year", "startYear"],
+    "genre": ["genre", "Genre", "genres"],
+    "director": ["director", "Director", "directors"],
+    "actors": ["actors", "Actors"],
+    "plot": ["plot", "Plot"],
+    "rating": ["rating", "imdbRating", "averageRating"],
+    "runtime": ["runtime", "Runtime", "runtimeMinutes"],
+    "poster": ["poster", "Poster"],
+}
+_SOURCE_COLUMNS = {alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases}
+
+# Low-cardinality text columns stored as pandas categoricals
+CATEGORICAL_FIELDS = ("genre", "director", "runtime")
+
+NA_VALUES = ["\\N", "N/A", "NA", ""]
+
+def _normalize_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Map source columns onto catalog fields and convert them to compact dtypes"""
+    frame = frame.rename(columns=_SOURCE_COLUMNS)
+    frame = frame.loc[:, ~frame.columns.duplicated()]
+    normalized = pd.DataFrame(index=range(len(frame)))
+    for field in FIELDS:
+        column = frame[field] if field in frame else pd.Series([""] * len(frame))
+        column = column.reset_index(drop=True)
+        if field == "year":
+            normalized[field] = (
+                pd.to_numeric(column.astype(str).str[:4], errors="coerce").fillna(0).astype(np.int16)
+            )
+        elif field == "rating":
+            normalized[field] = pd.to_numeric(column, errors="coerce").astype(np.float32)
+        else:
+            column = column.fillna("").astype(str).str.strip()
+            if field == "genre":
+                column = column.str.replace(r"\s*,\s*", ", ", regex=True)
+            elif field == "runtime":
+                column = column.where(~column.str.fullmatch(r"\d+"), column + " min")
+            normalized[field] = column
+    return normalized[normalized["id"] != ""]
+
+def _categorize(frame: pd.DataFrame) -> pd.DataFrame:
+    """Store low-cardinality text columns as categoricals"""
+    for field in CATEGORICAL_FIELDS:
+        frame[field] = frame[field].astype("category")
+    return frame
+
+class ColumnarCatalog(Mapping):
+    """Movie metadata stored column-wise, readable as a movie_id -> record mapping.
+
+    Genres, directors and runtimes are categoricals, year is int16 (0 when unknown)
+    and rating float32 (NaN when unknown), so a large dump costs a fraction
+    of the equivalent dicts. Filters are vectorized over the columns; ID
+    lookups go through a position dict and rebuild the record on demand.
+    Single movies added with `add` are buffered and merged on the next scan.
+    Writes and reads share a re-entrant lock so one catalog can serve every session.
+    """
+
+    def __init__(self, frame: Optional[pd.DataFrame] = None):
+        self.frame = _categorize(_normalize_frame(pd.DataFrame(columns=FIELDS))) if frame is None else frame
+        self.pending: Dict[str, Dict] = {}
+        self.lock = threading.RLock()
+        self._reindex()
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "ColumnarCatalog":
+        """Build a catalog from local or OMDB-style movie dicts"""
+        frame = _normalize_frame(pd.DataFrame.from_records(list(records)))
+        return cls(_categorize(frame.drop_duplicates("id", keep="last").reset_index(drop=True)))
+
+    def _reindex(self):
+        """Cache per-column arrays and the ID -> row position map"""
+        self.columns = {}
+        for field in FIELDS:
+            column = self.frame[field]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                self.columns[field] = (column.cat.codes.to_numpy(), column.cat.categories.to_numpy())
+            else:
+                self.columns[field] = (column.to_numpy(), None)
+        self.ids = self.columns["id"][0]
+        self.positions = {movie_id: i for i, movie_id in enumerate(self.ids)}
+
+    def _merge(self, frame: pd.DataFrame):
+        """Append normalized rows, letting later rows replace earlier ones with the same ID"""
+        merged = pd.concat(
+            [self.frame.astype({field: str for field in CATEGORICAL_FIELDS}), frame],
+            ignore_index=True
+        )
+        merged = merged.drop_duplicates("id", keep="last").reset_index(drop=True)
+        self.frame = _categorize(merged)
+        self._reindex()
+
+    def _flush(self):
+        """Merge movies buffered by `add` into the columns"""
+        with self.lock:
+            if self.pending:
+                pending = list(self.pending.values())
+                self.pending = {}
+                self._merge(_normalize_frame(pd.DataFrame.from_records(pending)))
+
+    def add(self, movie: Dict):
+        """Add or replace a single movie"""
+        with self.lock:
+            self.pending[movie["id"]] = movie
+
+    def import_file(self, path: str, sep: Optional[str] = None,
+                    chunksize: int = 200_000) -> List[str]:
+        """Bulk import a CSV/TSV metadata dump, returning the imported IDs"""
+        if sep is None:
+            sep = "\t" if path.endswith((".tsv", ".tab", ".tsv.gz")) else ","
+        chunks = []
+        reader = pd.read_csv(
+            path, sep=sep, dtype=str, usecols=lambda column: column in _SOURCE_COLUMNS,
+            keep_default_na=False, na_values=NA_VALUES, quoting=3 if sep == "\t" else 0,
+            chunksize=chunksize
+        )
+        for chunk in reader:
+            chunks.append(_normalize_frame(chunk))
+        if not chunks:
+            return []
+        imported = pd.concat(chunks, ignore_index=True)
+        # Parsing runs unlocked; only the swap of the columns is serialized
+        with self.lock:
+            self._flush()
+            self._merge(imported)
+        return imported["id"].drop_duplicates().tolist()
+
+    def _record(self, position: int) -> Dict:
+        """Rebuild the dict representation of one row"""
+        record = {}
+        for field, (values, categories) in self.columns.items():
+            value = values[position]
+            if categories is not None:
+                value = categories[value] if value >= 0 else ""
+            elif field == "year":
+                value = str(value) if value else ""
+            elif field == "rating":
+                value = "" if np.isnan(value) else f"{value:.1f}"
+            record[field] = value
+        return record
+
+    def __getitem__(self, movie_id: str) -> Dict:
+        with self.lock:
+            movie = self.pending.get(movie_id)
+            if movie is not None:
+                return movie
+            position = self.positions.get(movie_id)
+            if position is None:
+                raise KeyError(movie_id)
+            return self._record(position)
+
+    def __contains__(self, movie_id) -> bool:
+        return movie_id in self.pending or movie_id in self.positions
+
+    def __iter__(self) -> Iterator[str]:
+        self._flush()
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        self._flush()
+        return len(self.ids)
+
+    def _contains_any(self, field: str, terms: List[str]) -> np.ndarray:
+        """Rows whose field contains any of the terms (case-insensitive)"""
+        values, categories = self.columns[field]
+        terms = [term.strip().lower() for term in terms if term.strip()]
+        # Categorical columns are matched once per distinct value, then by code
+        source = pd.Series(categories if categories is not None else values, dtype=object).str.lower()
+        matched = np.zeros(len(source), dtype=bool)
+        if not len(source):
+            return np.zeros(len(values), dtype=bool)
+        for term in terms:
+            matched |= source.str.contains(term, regex=False).to_numpy()
+        return matched[values] & (values >= 0) if categories is not None else matched
+
+    def filter(self, genres: Optional[List[str]] = None, actors: Optional[List[str]] = None,
+               year_from: Optional[int] = None, year_to: Optional[int] = None,
+               min_rating: Optional[float] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Movies matching every given criterion, best rated first.
+
+        `genres` and `actors` match if any of the listed terms appears.
+        """
+        with self.lock:
+            self._flush()
+            mask = np.ones(len(self.ids), dtype=bool)
+            if genres:
+                mask &= self._contains_any("genre", genres)
+            if actors:
+                mask &= self._contains_any("actors", actors)
+            years = self.columns["year"][0]
+            if year_from is not None:
+                mask &= years >= year_from
+            if year_to is not None:
+                mask &= (years <= year_to) & (years > 0)
+            ratings = self.columns["rating"][0]
+            if min_rating is not None:
+                mask &= ratings >= min_rating
+
+            positions = np.flatnonzero(mask)
+            order = np.argsort(-np.nan_to_num(ratings[positions], nan=-1.0), kind="stable")
+            positions = positions[order][:limit]
+            return [self._record(position) for position in positions]
+
+    def memory_usage(self) -> int:
+        """Bytes held by the columns"""
+        return int(self.frame.memory_usage(deep=True).sum())
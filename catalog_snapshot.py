@@ -0,0 +1,279 @@
+# utils/catalog_snapshot.py
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from catalog import CATEGORICAL_FIELDS, FIELDS, ColumnarCatalog
+from config_file import Config
+from search_index import FrozenTrigramIndex, TrigramIndex
+
+MAGIC = b"MVSNAP\x00\x00"
+FORMAT_VERSION = 1
+_ALIGNMENT = 64
+
+def _encode_strings(values: List[str]) -> Dict[str, np.ndarray]:
+    """UTF-8 blob plus row offsets for a string column"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {"offsets": offsets, "blob": np.frombuffer(b"".join(encoded), dtype=np.uint8)}
+
+def write_snapshot(catalog: Mapping, path: str, version: Optional[str] = None) -> str:
+    """Write a catalog and its trigram index as a memory-mappable snapshot.
+
+    Layout: magic, header length (u32), JSON header describing every array
+    (dtype, shape, offset), then the raw arrays aligned to 64 bytes.
+    Returns the catalog version stored in the header.
+    """
+    if not isinstance(catalog, ColumnarCatalog):
+        catalog = ColumnarCatalog.from_records(catalog.values())
+    ids = list(catalog)
+    arrays: Dict[str, np.ndarray] = {}
+    index = TrigramIndex()
+    for movie_id in ids:
+        index.add_movie(catalog[movie_id])
+    for name, array in index.export().items():
+        arrays[f"index.{name}"] = array
+
+    for field in FIELDS:
+        values, categories = catalog.columns[field]
+        if categories is not None:
+            arrays[f"{field}.codes"] = values.astype(np.int32)
+            for name, array in _encode_strings(list(categories)).items():
+                arrays[f"{field}.categories.{name}"] = array
+        elif field == "year":
+            arrays[field] = values.astype(np.int16)
+        elif field == "rating":
+            arrays[field] = values.astype(np.float32)
+        else:
+            for name, array in _encode_strings(list(values)).items():
+                arrays[f"{field}.{name}"] = array
+
+    # Sorted fixed-width IDs give O(log n) lookups without a per-process dict
+    encoded_ids = np.array([movie_id.encode("utf-8") for movie_id in ids], dtype=bytes)
+    order = np.argsort(encoded_ids, kind="stable").astype(np.uint32)
+    arrays["id.sorted"] = encoded_ids[order]
+    arrays["id.order"] = order
+
+    if version is None:
+        digest = hashlib.sha1()
+        for name in sorted(arrays):
+            digest.update(name.encode())
+            digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+        version = digest.hexdigest()[:16]
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+    header = json.dumps({
+        "format": FORMAT_VERSION,
+        "version": version,
+        "created_at": datetime.now().isoformat(),
+        "rows": len(ids),
+        "arrays": layout,
+    }).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 4 + len(header)) // _ALIGNMENT) * _ALIGNMENT
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    return version
+
+class CatalogSnapshot(Mapping):
+    """Read-only, memory-mapped catalog snapshot with lazy record decoding.
+
+    Every column is a numpy view over one shared read-only mapping, so
+    several worker processes opening the same file share its pages through
+    the OS page cache and startup does no parsing beyond the header.
+    Records are decoded only when accessed. Movies added or imported later
+    go to a private ColumnarCatalog overlay that shadows the snapshot.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        (header_length,) = struct.unpack_from("<I", self.mmap, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        header = json.loads(self.mmap[header_start:header_start + header_length])
+        if header["format"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {header['format']}")
+
+        self.path = path
+        self.version = header["version"]
+        self.created_at = header["created_at"]
+        self.rows = header["rows"]
+        data_start = -(-(header_start + header_length) // _ALIGNMENT) * _ALIGNMENT
+        self.arrays: Dict[str, np.ndarray] = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            self.arrays[name] = np.frombuffer(
+                self.mmap, dtype=dtype, count=count, offset=data_start + spec["offset"]
+            ).reshape(spec["shape"])
+
+        # Category labels are tiny, so they are decoded once up front
+        self.categories = {
+            field: [self._string(f"{field}.categories", i)
+                    for i in range(len(self.arrays[f"{field}.categories.offsets"]) - 1)]
+            for field in CATEGORICAL_FIELDS
+        }
+        self.overlay = ColumnarCatalog()
+
+    def _string(self, column: str, position: int) -> str:
+        offsets = self.arrays[f"{column}.offsets"]
+        start, end = int(offsets[position]), int(offsets[position + 1])
+        return self.arrays[f"{column}.blob"][start:end].tobytes().decode("utf-8")
+
+    def id_at(self, position: int) -> str:
+        """Movie ID stored at a snapshot row"""
+        return self._string("id", position)
+
+    def position(self, movie_id: str) -> Optional[int]:
+        """Snapshot row of a movie ID, by binary search over the sorted IDs"""
+        key = movie_id.encode("utf-8")
+        sorted_ids = self.arrays["id.sorted"]
+        i = int(np.searchsorted(sorted_ids, key))
+        if i < len(sorted_ids) and sorted_ids[i] == key:
+            return int(self.arrays["id.order"][i])
+        return None
+
+    def _record(self, position: int) -> Dict:
+        record = {}
+        for field in FIELDS:
+            if field in CATEGORICAL_FIELDS:
+                code = int(self.arrays[f"{field}.codes"][position])
+                record[field] = self.categories[field][code] if code >= 0 else ""
+            elif field == "year":
+                year = int(self.arrays["year"][position])
+                record[field] = str(year) if year else ""
+            elif field == "rating":
+                rating = float(self.arrays["rating"][position])
+                record[field] = "" if np.isnan(rating) else f"{rating:.1f}"
+            else:
+                record[field] = self._string(field, position)
+        return record
+
+    def __getitem__(self, movie_id: str) -> Dict:
+        if movie_id in self.overlay:
+            return self.overlay[movie_id]
+        position = self.position(movie_id)
+        if position is None:
+            raise KeyError(movie_id)
+        return self._record(position)
+
+    def __contains__(self, movie_id) -> bool:
+        return movie_id in self.overlay or self.position(movie_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for position in range(self.rows):
+            movie_id = self.id_at(position)
+            if movie_id not in self.overlay:
+                yield movie_id
+        yield from self.overlay
+
+    def __len__(self) -> int:
+        shadowed = sum(1 for movie_id in self.overlay if self.position(movie_id) is not None)
+        return self.rows + len(self.overlay) - shadowed
+
+    def add(self, movie: Dict):
+        """Add or replace a movie in the private overlay"""
+        self.overlay.add(movie)
+
+    def import_file(self, path: str, sep: Optional[str] = None) -> List[str]:
+        """Bulk import a CSV/TSV dump into the private overlay"""
+        return self.overlay.import_file(path, sep)
+
+    def search_index(self) -> FrozenTrigramIndex:
+        """Trigram index over the snapshot postings, extensible in memory"""
+        arrays = {
+            name[len("index."):]: array for name, array in self.arrays.items()
+            if name.startswith("index.")
+        }
+        return FrozenTrigramIndex(arrays, self.id_at, self.position)
+
+    def _matches_text(self, column: str, terms: List[str]) -> np.ndarray:
+        """Rows whose string column contains any term, scanning the mapped blob"""
+        offsets = self.arrays[f"{column}.offsets"]
+        blob = memoryview(self.arrays[f"{column}.blob"])
+        matched = np.zeros(len(offsets) - 1, dtype=bool)
+        for term in terms:
+            pattern = re.compile(re.escape(term.strip().encode("utf-8")), re.IGNORECASE)
+            starts = np.fromiter((m.start() for m in pattern.finditer(blob)), dtype=np.uint64)
+            rows = np.searchsorted(offsets, starts, side="right") - 1
+            # Rows are stored back to back; drop matches that run into the next row
+            inside = starts + len(pattern.pattern) <= offsets[rows + 1]
+            matched[rows[inside]] = True
+        return matched
+
+    def _matches_category(self, field: str, terms: List[str]) -> np.ndarray:
+        terms = [term.strip().lower() for term in terms if term.strip()]
+        labels = np.array(
+            [any(term in label.lower() for term in terms) for label in self.categories[field]] + [False]
+        )
+        # Code -1 (missing) indexes the trailing False
+        return labels[self.arrays[f"{field}.codes"]]
+
+    def filter(self, genres: Optional[List[str]] = None, actors: Optional[List[str]] = None,
+               year_from: Optional[int] = None, year_to: Optional[int] = None,
+               min_rating: Optional[float] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Movies matching every given criterion, best rated first (see ColumnarCatalog.filter)"""
+        mask = np.ones(self.rows, dtype=bool)
+        if genres:
+            mask &= self._matches_category("genre", genres)
+        if actors:
+            mask &= self._matches_text("actors", [actor for actor in actors if actor.strip()])
+        years = self.arrays["year"]
+        if year_from is not None:
+            mask &= years >= year_from
+        if year_to is not None:
+            mask &= (years <= year_to) & (years > 0)
+        ratings = self.arrays["rating"]
+        if min_rating is not None:
+            mask &= ratings >= min_rating
+
+        positions = np.flatnonzero(mask)
+        order = np.argsort(-np.nan_to_num(ratings[positions], nan=-1.0), kind="stable")
+        movies = [
+            movie for movie in (self._record(p) for p in positions[order][:limit])
+            if movie["id"] not in self.overlay
+        ]
+        if len(self.overlay):
+            movies.extend(self.overlay.filter(genres, actors, year_from, year_to, min_rating, limit))
+            movies.sort(key=lambda movie: float(movie["rating"] or -1.0), reverse=True)
+        return movies[:limit]
+
+def open_snapshot(path: str = Config.CATALOG_SNAPSHOT_PATH) -> Optional[CatalogSnapshot]:
+    """Open a catalog snapshot, or None if it is missing or unreadable"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return CatalogSnapshot(path)
+    except Exception as e:
+        print(f"Error opening catalog snapshot: {str(e)}")
+        return None
+
+if __name__ == "__main__":
+    from mockdb import MockDatabase
+
+    db = MockDatabase()
+    output = sys.argv[1] if len(sys.argv) > 1 else Config.CATALOG_SNAPSHOT_PATH
+    version = write_snapshot(db.catalog, output)
+    print(f"Wrote catalog snapshot {version} with {len(db.catalog)} movies to {output}")
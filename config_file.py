@@ -12,6 +12,8 @@ class Config:
     
     # API Endpoints
     OMDB_BASE_URL = "http://www.omdbapi.com/"
+    OMDB_MAX_CONNECTIONS = 20  # Pooled connections per event loop
+    OMDB_REQUEST_TIMEOUT_SECONDS = 4
     
     # LLM Settings
     MODEL_NAME = "gpt-3.5-turbo"
@@ -21,12 +23,92 @@ class Config:
     # Application Settings
     DEBUG_MODE = os.getenv("DEBUG_MODE", "False").lower() == "true"
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    CHAT_TURN_TIMEOUT_SECONDS = 30  # Longest wait for the next chunk of a reply
+    TURN_DEADLINE_SECONDS = 8  # Budget of one turn before a degraded local answer
     
     # Booking Settings
     MAX_SEATS_PER_BOOKING = 10
     BOOKING_EXPIRY_MINUTES = 15
     CANCELLATION_WINDOW_HOURS = 24
     
+    # Movie Catalog Settings
+    MOVIE_CATALOG_PATH = os.getenv("MOVIE_CATALOG_PATH", "")
+    CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH", "catalog.snapshot")
+    
+    # Movie Search Settings
+    SUGGESTION_DEADLINE_SECONDS = 2.0
+    LOCAL_SEARCH_MIN_SCORE = 0.6
+    DEGRADED_SEARCH_MIN_SCORE = 0.3  # Looser local matching when OMDB is too slow
+    SEARCH_INDEX_FIELD_WEIGHTS = {"title": 1.0, "director": 0.7, "actors": 0.7, "genre": 0.5}
+    SEARCH_INDEX_SCAN_BUDGET = 10000
+    MOVIE_CACHE_MAX_ENTRIES = 20000  # Listed movies kept for sessions to resolve by ID
+    
+    # Trending Settings
+    TRENDING_HALF_LIFE_HOURS = 6
+    TRENDING_TOP_K = 20
+    TRENDING_MAX_MOVIES_PER_SCOPE = 5000
+    
+    # Recommendation Cache Settings
+    RECOMMENDATION_CACHE_TTL_SECONDS = 600
+    RECOMMENDATION_CACHE_MAX_ENTRIES = 10000
+    
+    # Prefetch Settings
+    PREFETCH_MAX_CONCURRENT = 8  # Speculative loads in flight across all sessions
+    PREFETCH_TTL_SECONDS = 60
+    PREFETCH_TOP_MOVIES = 3  # Listed movies whose theaters and showtimes are preloaded
+    
+    # Session Store Settings
+    SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # "memory" or "sqlite"
+    SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "sessions.db")
+    SESSION_TTL_SECONDS = 6 * 3600  # Idle time before an abandoned conversation is dropped
+    SESSION_MAX_ENTRIES = 50000  # Sessions held in memory per process
+    
+    # LLM Gateway Settings (every agent's LLM and embedding calls, process-wide)
+    LLM_MAX_CONCURRENT = 16
+    LLM_INTERACTIVE_RESERVE = 4  # Slots background work (prefetch, catalog embedding) never takes
+    LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "90000"))  # The provider's TPM limit
+    LLM_QUEUE_TIMEOUT_SECONDS = 10
+    EMBED_BATCH_SIZE = 64  # Concurrent text embeddings sent as one request
+    EMBED_BATCH_WINDOW_SECONDS = 0.005
+    
+    # LLM Cache Settings
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")  # "" keeps responses in memory only
+    LLM_CACHE_MAX_ENTRIES = 20000
+    LLM_CACHE_TTL_SECONDS = 3600  # Listings and showtimes change, so answers age out
+    LLM_CACHE_FLUSH_SECONDS = 0.5  # Write-behind interval of the SQLite copy
+    # Cosine similarity at which a paraphrased question reuses an answer; 0 turns the semantic tier off
+    LLM_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("LLM_CACHE_SIMILARITY_THRESHOLD", "0"))
+    
+    # Intent Router Settings
+    ROUTER_TITLE_MIN_SCORE = 0.75  # Local title match strong enough to search without asking the LLM
+    ROUTER_FUZZY_CUTOFF = 0.8  # Similarity at which a misspelt keyword still counts ("recomend")
+    ROUTER_MAX_TITLE_WORDS = 6  # Unrecognized messages up to this long are searched as titles
+    ROUTER_LLM_PER_MINUTE = 30  # Escalations to the ReAct agent, process-wide
+    ROUTER_LLM_BURST = 5
+    ROUTER_LLM_TIMEOUT_SECONDS = 3
+    
+    # Admission Control Settings (per dependency: latency target, concurrency bounds, wait queue)
+    ADMISSION_LIMITS = {
+        "turns": {"target_seconds": 2.0, "initial_limit": 32, "max_limit": 128, "max_queue": 256},
+        "omdb": {"target_seconds": 1.0, "initial_limit": 10, "max_limit": OMDB_MAX_CONNECTIONS, "max_queue": 64},
+        "llm": {"target_seconds": 2.0, "initial_limit": 8, "max_limit": 16, "max_queue": 32},
+    }
+    ADMISSION_QUEUE_TIMEOUT_SECONDS = 2.0
+    ADMISSION_MIN_MODE_SECONDS = 5.0  # Least time spent degraded before stepping back
+    ADMISSION_PROBE_SECONDS = 2.0  # How often a bypassed dependency is tried again
+    
+    # Similar Movies Settings
+    SIMILARITY_INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", "similar_movies.npz")
+    SIMILAR_MOVIES_TOP_N = 20
+    SIMILARITY_WEIGHTS = {"embedding": 1.0, "genre": 0.5, "actor": 0.3, "director": 0.2}
+    SIMILARITY_BLOCK_ROWS = 1024
+    
+    # Taste Vector Settings
+    CATALOG_EMBEDDINGS_PATH = os.getenv("CATALOG_EMBEDDINGS_PATH", "catalog_embeddings.npz")
+    ANN_BRUTE_FORCE_MAX_MOVIES = 50000
+    ANN_NPROBE = 8
+    TASTE_PREFERENCE_WEIGHT = 1.0
+    
     # Theater Settings
     MOCK_THEATERS = [
         {"id": "th1", "name": "Cinema City", "location": "Downtown"},
@@ -1,51 +1,159 @@
 from llama_index.core import Settings
 from llama_index.core.agent.react import ReActAgent
+from llama_index.core.memory import ChatMemoryBuffer
 from llama_index.core.tools import FunctionTool
-from typing import Tuple, Dict, List
+from typing import AsyncIterator, Awaitable, Callable, Tuple, Dict, List, Optional
+from contextvars import ContextVar
+from functools import cached_property
 from movie_agent import MovieAgent
 from seating_agent import SeatingAgent
 from booking_agent import BookingAgent
 from preferences_agent import PreferencesAgent
+from mockdb import MockDatabase
+from agent_registry import build_react_agent, get_shared_agent, get_shared_database, registry
+from config_file import Config
+from movie import Movie
+from prefetch import Prefetcher
+from state_machine import StateMachine
+from deadline import DeadlineExceeded, deadline_at, deadline_scope, with_deadline
+from admission import Overloaded, admission
+from session_state import SessionState
+from input_parser import extract_email, extract_name, match_intent, parse_seat_labels, validate_email
+from intent_router import IntentRouter, Route
+from llm_gateway import gateway
+import asyncio
 import re
 import random
+import time
+import uuid
+
+# The message the shared routing agent is working on in this task, and the routes its tools picked
+_routing_turn: ContextVar[Tuple[str, List[Route]]] = ContextVar("routing_turn")
+
+async def search_movies(title: str) -> str:
+    """Search for a movie by its title"""
+    _routing_turn.get()[1].append(Route("search", title, "llm"))
+    return "Searching."
+
+async def browse_movies(genres: List[str], actors: List[str]) -> str:
+    """List movies in any of the genres or with any of the actors"""
+    user_input, routes = _routing_turn.get()
+    routes.append(Route("browse", user_input, "llm", tuple(genres), tuple(actors)))
+    return "Browsing."
+
+async def list_movies() -> str:
+    """List the movies currently showing"""
+    user_input, routes = _routing_turn.get()
+    routes.append(Route("list_movies", user_input, "llm"))
+    return "Listing."
+
+async def recommend_movies() -> str:
+    """Recommend movies for the user's tastes"""
+    user_input, routes = _routing_turn.get()
+    routes.append(Route("recommend", user_input, "llm"))
+    return "Recommending."
+
+def _build_routing_agent() -> ReActAgent:
+    return build_react_agent(
+        [FunctionTool.from_defaults(async_fn=fn) for fn in (search_movies, browse_movies, list_movies, recommend_movies)],
+        "coordinator"
+    )
 
 class CoordinatorAgent:
-    def __init__(self):
-        # Initialize specialist agents
-        self.movie_agent = MovieAgent()
-        self.seating_agent = SeatingAgent()
-        self.booking_agent = BookingAgent()
-        self.preferences_agent = PreferencesAgent()
-        
-        # Define tools for the coordinator
-        self.tools = [
-            FunctionTool.from_defaults(
-                fn=self.handle_greeting,
-                name="handle_greeting",
-                description="Handle initial greeting and customer details"
-            ),
-            FunctionTool.from_defaults(
-                fn=self.handle_preferences,
-                name="handle_preferences",
-                description="Handle user preferences collection"
-            ),
-            FunctionTool.from_defaults(
-                fn=self.handle_initial_state,
-                name="handle_initial_state",
-                description="Handle movie search and selection"
-            ),
-            FunctionTool.from_defaults(
-                fn=self.handle_booking,
-                name="handle_booking",
-                description="Handle final booking process"
-            )
+    # Greetings in replies, rewritten to address the user by name
+    GREETING_PATTERN = re.compile(r'(?i)(thank you|thanks|hi|hello|hey),?\s*(.*?)!')
+
+    # Conversation states: the handler method of each and the states it may move to
+    STATES = {
+        "greeting": ("handle_greeting", ["greeting", "get_email", "preferences"]),
+        "get_email": ("handle_email", ["get_email", "preferences"]),
+        "preferences": ("handle_preferences", ["preferences", "initial"]),
+        "initial": ("handle_initial_state", ["initial", "movie_selection"]),
+        "movie_selection": ("handle_movie_selection", ["movie_selection", "theater_selection"]),
+        "theater_selection": ("handle_theater_selection", ["theater_selection", "seat_selection"]),
+        "seat_selection": ("handle_seat_selection", ["seat_selection", "booking_confirmation"]),
+        "booking_confirmation": ("handle_booking", ["booking_confirmation", "finished", "initial"]),
+        "finished": ("handle_finished", ["finished", "initial"]),
+    }
+
+    def __init__(self, db: Optional[MockDatabase] = None):
+        # Specialist agents share one database so bookings made by the
+        # booking agent are visible to preferences and seating. They hold
+        # no per-session state, so they come from the process-wide registry
+        # and are only built when first used.
+        self.db = db or get_shared_database()
+        self.admission = admission
+
+    @cached_property
+    def movie_agent(self) -> MovieAgent:
+        return get_shared_agent(MovieAgent, self.db)
+
+    @cached_property
+    def seating_agent(self) -> SeatingAgent:
+        return get_shared_agent(SeatingAgent, self.db)
+
+    @cached_property
+    def booking_agent(self) -> BookingAgent:
+        return get_shared_agent(BookingAgent, self.db)
+
+    @cached_property
+    def preferences_agent(self) -> PreferencesAgent:
+        return get_shared_agent(PreferencesAgent, self.db)
+
+    @cached_property
+    def prefetcher(self) -> Prefetcher:
+        """Speculative loads of the next funnel step, shared like the agents"""
+        return registry.get(("Prefetcher", id(self.db)), Prefetcher)
+
+    @cached_property
+    def router(self) -> IntentRouter:
+        """Local intent routing for new searches, shared like the agents"""
+        return registry.get(("IntentRouter", id(self.db)), lambda: IntentRouter(self.db, self._route_with_agent))
+
+    @cached_property
+    def routing_agent(self) -> ReActAgent:
+        """ReAct agent for messages the router can't place locally, shared like the agents"""
+        return registry.get(("RoutingAgent", id(self.db)), _build_routing_agent)
+
+    @cached_property
+    def state_machine(self) -> StateMachine:
+        """Dispatch table built from STATES, with per-state latency metrics"""
+        machine = StateMachine("coordinator", fallback=self.handle_unknown_state)
+        for state, (handler, transitions) in self.STATES.items():
+            machine.add_state(state, getattr(self, handler), transitions)
+        return machine
+
+    def _handler_tool(self, handler: Callable[[str, SessionState], Awaitable[Tuple[str, str]]],
+                      name: str, description: str) -> FunctionTool:
+        """Expose a state handler as a tool.
+
+        Tool schemas are generated from the function signature and tool
+        arguments arrive as plain JSON, so the tool takes the context as a
+        Dict and hands the handler a SessionState built from it.
+        """
+        async def call(user_input: str, context: Dict) -> Tuple[str, str]:
+            return await handler(user_input, SessionState.from_dict(context or {}))
+
+        return FunctionTool.from_defaults(async_fn=call, name=name, description=description)
+
+    @cached_property
+    def tools(self) -> List[FunctionTool]:
+        """Tool wrappers, built on first use"""
+        return [
+            self._handler_tool(self.handle_greeting, "handle_greeting",
+                               "Handle initial greeting and customer details"),
+            self._handler_tool(self.handle_preferences, "handle_preferences",
+                               "Handle user preferences collection"),
+            self._handler_tool(self.handle_initial_state, "handle_initial_state",
+                               "Handle movie search and selection"),
+            self._handler_tool(self.handle_booking, "handle_booking",
+                               "Handle final booking process"),
         ]
-        
-        # Initialize ReAct agent with global settings
-        self.agent = ReActAgent.from_tools(
-            self.tools,
-            verbose=True
-        )
+
+    @cached_property
+    def agent(self) -> ReActAgent:
+        """ReAct agent over the tools, built on first use"""
+        return build_react_agent(self.tools)
 
     def _format_name_response(self, name: str) -> str:
         """Format name-related responses with variety"""
@@ -65,85 +173,362 @@ class CoordinatorAgent:
         ]
         return random.choice(responses)
 
-    def _validate_state_transition(self, current_state: str, next_state: str) -> bool:
-        """Validate if state transition is allowed"""
-        valid_transitions = {
-            "greeting": ["get_email"],
-            "get_email": ["preferences"],
-            "preferences": ["initial"],
-            "initial": ["movie_selection", "initial"],
-            "movie_selection": ["theater_selection", "movie_selection"],
-            "theater_selection": ["seat_selection", "theater_selection"],
-            "seat_selection": ["booking_confirmation", "seat_selection"],
-            "booking_confirmation": ["finished", "initial", "booking_confirmation"],
-            "finished": ["initial"]
-        }
-        return next_state in valid_transitions.get(current_state, [])
-
-    def _reset_booking_context(self, context: Dict) -> Dict:
+    def _reset_booking_context(self, context: SessionState) -> SessionState:
         """Reset booking-related context while preserving user info"""
-        preserved_keys = ["customer_name", "customer_email", "user_id", "favorite_genres", 
-                         "favorite_actors", "preferred_times"]
-        preserved_data = {k: context[k] for k in preserved_keys if k in context}
-        
-        context.clear()
-        context.update(preserved_data)
+        context.reset([
+            "movie_ids", "movie_id", "theater_ids", "theater_id", "showtime_ids", "showtime_id",
+            "seat_version", "selected_seats", "selecting_seats", "total_price", "booking_completed"
+        ])
         context["current_state"] = "initial"
         return context
 
-    def _get_movie_title(self, movie_data: Dict) -> str:
+    def _list_movies(self, context: SessionState, movies: List[Movie]):
+        """Record the movies listed to the user; the session keeps their IDs, the movie agent the movies"""
+        self.movie_agent.remember(movies)
+        context["movie_ids"] = [movie.id for movie in movies]
+
+    async def _get_theater(self, theater_id: str) -> Optional[Dict]:
+        theaters = await self.booking_agent.get_theaters()
+        return next((theater for theater in theaters if theater["id"] == theater_id), None)
+
+    async def describe_booking(self, context: SessionState) -> Dict[str, str]:
+        """Movie, theater and showtime chosen so far, resolved from their IDs"""
+        details = {}
+        if "movie_id" in context:
+            movie = await self.movie_agent.resolve_movie(context["movie_id"])
+            details["movie_title"] = movie.title if movie else context["movie_id"]
+        if "theater_id" in context:
+            theater = await self._get_theater(context["theater_id"])
+            details["theater_name"] = theater["name"] if theater else context["theater_id"]
+        if "showtime_id" in context:
+            showtime = await self.db.get_showtime(context["showtime_id"])
+            details["date"] = showtime["date"] if showtime else ""
+            details["time"] = showtime["time"] if showtime else ""
+        return details
+
+    def _get_movie_title(self, movie_data: Movie) -> str:
         """Safely extract movie title from movie data"""
-        return movie_data.get('Title', movie_data.get('title', 'Unknown Movie'))
+        return movie_data.title
 
     def _validate_preferences(self, preferences: Dict) -> bool:
         """Validate user preferences format"""
         required_keys = ['favorite_genres', 'favorite_actors', 'preferred_times']
         return all(key in preferences for key in required_keys) and \
                all(isinstance(preferences[key], list) for key in required_keys)
-    async def process_input(self, user_input: str, context: Dict) -> str:
-        """Process user input based on current state"""
+    async def process_input(self, user_input: str, context: SessionState) -> str:
+        """Process user input based on current state, within the turn deadline"""
+        start = time.perf_counter()
         try:
-            current_state = context["current_state"]
-            response = ""
-            new_state = current_state
-
-            if current_state == "greeting":
-                response, new_state = await self.handle_greeting(user_input, context)
-            elif current_state == "preferences":
-                response, new_state = await self.handle_preferences(user_input, context)
-            elif current_state == "get_email":
-                response, new_state = await self.handle_email(user_input, context)
-            elif current_state == "initial":
-                response, new_state = await self.handle_initial_state(user_input, context)
-            elif current_state == "movie_selection":
-                response, new_state = await self.handle_movie_selection(user_input, context)
-            elif current_state == "theater_selection":
-                response, new_state = await self.handle_theater_selection(user_input, context)
-            elif current_state == "seat_selection":
-                response, new_state = await self.handle_seat_selection(user_input, context)
-            elif current_state == "booking_confirmation":
-                response, new_state = await self.handle_booking(user_input, context)
-            elif current_state == "finished":
-                response = "Thank you for using our service! Have a great day!"
-                new_state = "finished"
-            else:
-                response = "I'm not sure how to handle this state. Let's start over."
-                new_state = "greeting"
-
-            context["current_state"] = new_state
+            try:
+                with deadline_scope(deadline_at(Config.TURN_DEADLINE_SECONDS)):
+                    async with self.admission.turns.slot():
+                        response = await with_deadline(self.state_machine.dispatch(user_input, context))
+            except DeadlineExceeded:
+                return await self._degraded_response(user_input, context, time.perf_counter() - start)
+            except Overloaded:
+                return self._overloaded_response(context)
+            self._prefetch_next_step(context)
             return self._format_response_with_name(response, context)
 
         except Exception as e:
             print(f"Error in process_input: {str(e)}")
             return f"An error occurred: {str(e)}. Let's try again."
 
-    
+    async def _degraded_response(self, user_input: str, context: SessionState, seconds: float) -> str:
+        """Reply when a turn ran out of time, from the local catalog where that helps.
+
+        The expired handler has already been cancelled (with everything it
+        started), so nothing here may wait on OMDB or the LLM.
+        """
+        current_state = context.get("current_state")
+        label = current_state if current_state in self.STATES else "unknown"
+        self.state_machine.metrics.increment(f"coordinator.deadline_exceeded.{label}")
+        next_state = current_state
+        response = "Sorry, that took longer than expected. Please try again."
+        try:
+            if current_state == "initial":
+                preferences = await self.preferences_agent.get_user_preferences(
+                    context.get("user_id", "user123")
+                )
+                movies = await self.movie_agent.search_local_catalog(user_input, preferences)
+                if movies:
+                    self._list_movies(context, movies)
+                    next_state = "movie_selection"
+                    movie_list = "\n".join([
+                        f"{i+1}. {m.title} "
+                        f"({m.year}) - "
+                        f"{m.genre}"
+                        for i, m in enumerate(movies)
+                    ])
+                    response = (
+                        "Our movie database is responding slowly, so here are matches "
+                        f"from our local catalog:\n{movie_list}\n\n"
+                        "Which one would you like to watch? (Enter the number or search for another movie)"
+                    )
+        except Exception as e:
+            print(f"Error building degraded response: {str(e)}")
+        self.state_machine.complete(current_state, next_state, context, seconds)
+        return self._format_response_with_name(response, context)
+
+    def _overloaded_response(self, context: SessionState) -> str:
+        """Reply to a turn refused by admission control; the conversation stays where it was"""
+        current_state = context.get("current_state")
+        label = current_state if current_state in self.STATES else "unknown"
+        self.state_machine.metrics.increment(f"coordinator.overloaded.{label}")
+        return "We're helping a lot of people right now. Please send that again in a moment."
+
+    def get_admission_stats(self) -> Dict[str, Dict]:
+        """Health, concurrency limit and queue of each admission limiter"""
+        return self.admission.stats()
+
+    def get_llm_gateway_stats(self) -> Dict:
+        """LLM calls per priority, slots in use and the token budget left"""
+        return gateway.stats()
+
+    async def handle_finished(self, user_input: str, context: SessionState) -> Tuple[str, str]:
+        """Handle input after the conversation has ended"""
+        return "Thank you for using our service! Have a great day!", "finished"
+
+    async def handle_unknown_state(self, user_input: str, context: SessionState) -> Tuple[str, str]:
+        """Recover from a state with no registered handler"""
+        return "I'm not sure how to handle this state. Let's start over.", "greeting"
+
+    async def _route_with_agent(self, user_input: str) -> Optional[Route]:
+        """Ask the routing agent what an ambiguous message wants; its tool call is the route.
+
+        The agent is shared, so each turn runs as its own task with an empty
+        memory, and the task is dropped afterwards.
+        """
+        agent = self.routing_agent
+        routes: List[Route] = []
+        token = _routing_turn.set((user_input, routes))
+        task = agent.create_task(f"Pick the one tool that does what this user asks: {user_input}")
+        try:
+            task.memory = ChatMemoryBuffer.from_defaults()
+            async with self.admission.llm.slot():
+                step = await agent.arun_step(task.task_id)
+                while not step.is_last:
+                    step = await agent.arun_step(task.task_id)
+        finally:
+            agent.delete_task(task.task_id)
+            _routing_turn.reset(token)
+        return routes[0] if routes else None
+
+    def get_router_stats(self) -> Dict:
+        """Get turns per routing tier and the share routed without the LLM"""
+        return self.router.stats()
+
+    def get_state_metrics(self) -> Dict:
+        """Get per-state handler and transition latency histograms"""
+        return self.state_machine.stats()
+
+    async def process_input_stream(self, user_input: str, context: SessionState) -> AsyncIterator[str]:
+        """Process user input, yielding the response in chunks as it becomes available.
+
+        Replies that wait on searches stream one line per result; every other
+        reply is templated and flushed as a single chunk as soon as it is ready.
+        """
+        try:
+            stream_handler = self._get_stream_handler(user_input, context)
+            if stream_handler is not None:
+                current_state = context["current_state"]
+                start = time.perf_counter()
+                # Each step of this generator may run in a different task (see
+                # app.py), so the deadline is fixed once and re-entered per step
+                deadline = deadline_at(Config.TURN_DEADLINE_SECONDS)
+                stream = stream_handler(user_input, context)
+                first_chunk = True
+                try:
+                    # The deadline can't be scoped across yields, so it bounds the wait directly
+                    async with self.admission.turns.slot(deadline - time.monotonic()):
+                        while True:
+                            try:
+                                with deadline_scope(deadline):
+                                    chunk = await with_deadline(stream.__anext__())
+                            except StopAsyncIteration:
+                                break
+                            except DeadlineExceeded:
+                                yield await self._degraded_response(
+                                    user_input, context, time.perf_counter() - start
+                                )
+                                return
+                            if first_chunk:
+                                first_chunk = False
+                                self.state_machine.metrics.observe(
+                                    f"coordinator.first_chunk.{current_state}", time.perf_counter() - start
+                                )
+                            # Chunks hold whole lines, so each is formatted like a whole reply
+                            yield self._format_response_with_name(chunk, context)
+                except Overloaded:
+                    yield self._overloaded_response(context)
+                    return
+                finally:
+                    await stream.aclose()
+                self.state_machine.complete(
+                    current_state, context.get("current_state"), context, time.perf_counter() - start
+                )
+                self._prefetch_next_step(context)
+                return
+        except Exception as e:
+            print(f"Error in process_input_stream: {str(e)}")
+            yield f"An error occurred: {str(e)}. Let's try again."
+            return
+
+        yield await self.process_input(user_input, context)
+
+    def _get_stream_handler(self, user_input: str, context: SessionState):
+        """The streaming handler for this input, or None for a templated reply"""
+        state = context.get("current_state")
+        if state == "initial":
+            return self.stream_initial
+        if state == "movie_selection":
+            return self.stream_movie_selection
+        if state == "preferences" and context.get("preferences_state") == "times":
+            return self.stream_preferences_recommendations
+        return None
+
+    async def stream_initial(self, user_input: str, context: SessionState) -> AsyncIterator[str]:
+        """Route a new search, streaming searches and recommendations as they arrive"""
+        route = await self.router.route(user_input)
+        if route.intent == "recommend":
+            stream = self.stream_recommendations(user_input, context)
+        elif route.intent == "search":
+            stream = self.stream_movie_search(route.query, context)
+        else:
+            response, next_state = await self._reply_to_route(route, user_input, context)
+            context["current_state"] = next_state
+            yield response
+            return
+        async for chunk in stream:
+            yield chunk
+
+    async def stream_recommendations(self, user_input: str, context: SessionState) -> AsyncIterator[str]:
+        """Stream personalized recommendations, one line per movie as each is found"""
+        recommendations = []
+        async for movie in self.preferences_agent.stream_personalized_recommendations(
+            context.get("user_id", "user123")
+        ):
+            if not recommendations:
+                yield "Based on your preferences, here are some recommendations:\n"
+            recommendations.append(movie)
+            yield f"{len(recommendations)}. {movie.title} - {movie.genre}\n"
+        
+        if not recommendations:
+            # Like handle_initial_state, fall back to a regular search
+            async for chunk in self.stream_movie_search(user_input, context):
+                yield chunk
+            return
+        
+        self._list_movies(context, recommendations)
+        context["current_state"] = "movie_selection"
+        yield "\nWhich movie would you like to watch? (Enter the number or type a movie name to search)"
 
-    async def handle_greeting(self, user_input: str, context: Dict) -> Tuple[str, str]:
+    async def stream_movie_search(self, user_input: str, context: SessionState) -> AsyncIterator[str]:
+        """Stream a regular movie search, one line per movie as details arrive"""
+        preferences = await self.preferences_agent.get_user_preferences(
+            context.get("user_id", "user123")
+        )
+        
+        movies = []
+        async for movie in self.movie_agent.stream_movies(user_input):
+            if not movies:
+                yield "I found these movies:\n"
+            movies.append(movie)
+            yield (
+                f"{len(movies)}. {movie.title} "
+                f"({movie.year}) - "
+                f"{movie.genre}\n"
+            )
+        
+        if not movies:
+            context["current_state"] = "initial"
+            yield (
+                "I couldn't find any movies matching your search. You can:\n"
+                "1. Try searching with a different movie name\n"
+                "2. Type 'show movies' to see what's available\n"
+                "3. Type 'recommend' for personalized suggestions\n"
+                "What would you like to do?"
+            )
+            return
+        
+        self._list_movies(context, movies)
+        context["current_state"] = "movie_selection"
+        
+        # Add preference-based suggestion if available
+        suggestion = ""
+        if preferences and preferences.get('favorite_genres'):
+            for movie in movies:
+                movie_genre = movie.genre.lower()
+                if any(genre.strip().lower() in movie_genre 
+                    for genre in preferences['favorite_genres']):
+                    suggestion = f"💡 Based on your preferences, you might especially enjoy '{movie.title}'!\n"
+                    break
+        
+        yield f"{suggestion}\nWhich one would you like to watch? (Enter the number or search for another movie)"
+
+    def _prefetch_next_step(self, context: SessionState):
+        """Start loading what the user is likely to pick next, dropping what they passed on.
+
+        Movie lists preload theaters, similar titles and showtimes for the
+        top movies; showtime lists preload seat maps and seat suggestions,
+        keyed by the map's version so a booking makes them miss.
+        """
+        owner = context.setdefault("prefetch_owner", uuid.uuid4().hex)
+        state = context.get("current_state")
+        keys = []
+        # Speculative loads only add to the pile-up when backends are slow;
+        # what is already loaded is still kept
+        speculate = not self.admission.mode("skip_enrichment")
+        try:
+            if state == "movie_selection":
+                for movie_id in context.get("movie_ids", ())[:Config.PREFETCH_TOP_MOVIES]:
+                    keys.append(("movie", movie_id))
+                    if speculate:
+                        self.prefetcher.prefetch(owner, keys[-1], lambda m=movie_id: self._load_movie_step(m))
+            elif state == "theater_selection":
+                keys.append(("movie", context["movie_id"]))
+            elif state == "seat_selection":
+                for showtime_id in context.get("showtime_ids", ()):
+                    keys.append(("seats", showtime_id, self.db.get_seat_version(showtime_id)))
+                    if speculate:
+                        self.prefetcher.prefetch(owner, keys[-1], lambda s=showtime_id: self._load_seat_step(s))
+        except Exception as e:
+            print(f"Error scheduling prefetch: {str(e)}")
+        self.prefetcher.retain(owner, keys)
+
+    async def _load_movie_step(self, movie_id: str, with_showtimes: bool = True) -> Dict:
+        """Theaters, similar movies and (optionally) per-theater showtimes for a movie"""
+        theaters, similar = await asyncio.gather(
+            self.booking_agent.get_theaters(),
+            self.movie_agent.find_similar_movies(movie_id, 3)
+        )
+        showtimes = []
+        if with_showtimes:
+            showtimes = await asyncio.gather(*[
+                self.booking_agent.get_showtimes(theater["id"], movie_id, None)
+                for theater in theaters
+            ])
+        return {
+            "theaters": theaters,
+            "similar": similar,
+            "showtimes": {theater["id"]: times for theater, times in zip(theaters, showtimes)},
+        }
+
+    async def _load_seat_step(self, showtime_id: str) -> Dict:
+        """Seat map (and its version) and the best pair of adjacent seats for a showtime"""
+        version = self.db.get_seat_version(showtime_id)
+        seats = await self.seating_agent.get_available_seats(showtime_id)
+        return {"seats": seats, "version": version, "suggested": self.seating_agent.best_seats(seats, 2)}
+
+    def get_prefetch_stats(self) -> Dict:
+        """Get speculative prefetch counters and hit rate"""
+        return self.prefetcher.stats()
+
+    async def handle_greeting(self, user_input: str, context: SessionState) -> Tuple[str, str]:
         """Handle initial greeting and get customer name"""
         try:
             if "customer_name" not in context or not context["customer_name"]:
-                name = self._extract_name(user_input)
+                name = extract_name(user_input)
                 
                 if not name or len(name) < 2:
                     return "Please tell me your name:", "greeting"
@@ -161,236 +546,12 @@ class CoordinatorAgent:
             print(f"Error in handle_greeting: {str(e)}")
             return "Please tell me your name:", "greeting"
 
-    def _format_email_response(self, name: str) -> str:
-        """Format email-related responses with variety"""
-        responses = [
-            f"Thank you, {name}!",
-            f"Perfect, {name}!",
-            f"Great, {name}!"
-        ]
-        return random.choice(responses)
-
-    async def handle_email(self, user_input: str, context: Dict) -> Tuple[str, str]:
-        """Handle email collection"""
-        email = self._extract_email(user_input)
-        
-        if not email or not self._validate_email(email):
-            return (
-                "Please provide a valid email address "
-                "(e.g., username@domain.com):", 
-                "get_email"
-            )
-        
-        context["customer_email"] = email
-        name = context['customer_name']
-        response = self._format_email_response(name)
-        
-        return (
-            f"{response} Now, I'd love to learn about your movie preferences "
-            "so I can make better recommendations.",
-            "preferences"
-        )
-    
-
-    async def handle_preferences(self, user_input: str, context: Dict) -> Tuple[str, str]:
-        """Handle user preferences collection"""
-        if "preferences_state" not in context:
-            context["preferences_state"] = "genres"
-            return (
-                "What kinds of movies do you enjoy? (You can list multiple genres, "
-                "separated by commas, e.g., 'action, comedy, drama')",
-                "preferences"
-            )
-            
-        if context["preferences_state"] == "genres":
-            genres = [g.strip() for g in user_input.split(",")]
-            context["favorite_genres"] = genres
-            context["preferences_state"] = "actors"
-            return (
-                "Great choices! Who are some of your favorite actors? "
-                "(Separate names with commas)",
-                "preferences"
-            )
-            
-        if context["preferences_state"] == "actors":
-            actors = [a.strip() for a in user_input.split(",")]
-            context["favorite_actors"] = actors
-            context["preferences_state"] = "times"
-            return (
-                "What times do you usually prefer to watch movies? "
-                "(morning, afternoon, evening, or night - select multiple if applicable)",
-                "preferences"
-            )
-            
-        if context["preferences_state"] == "times":
-            preferred_times = [t.strip() for t in user_input.split(",")]
-            
-            # Save all preferences
-            preferences = {
-                "favorite_genres": context.get("favorite_genres", []),
-                "favorite_actors": context.get("favorite_actors", []),
-                "preferred_times": preferred_times,
-                "user_id": context.get("user_id", "user123")
-            }
-            
-            try:
-                # Get movie recommendations using the new method
-                recommendations = await self.get_movie_recommendations(preferences)
-                
-                # Format recommendations
-                if recommendations:
-                    rec_text = "\nBased on your preferences, you might enjoy these movies:\n"
-                    for i, movie in enumerate(recommendations, 1):
-                        title = movie.get('Title', movie.get('title', 'Unknown Title'))
-                        genre = movie.get('Genre', movie.get('genre', 'N/A'))
-                        year = movie.get('Year', movie.get('year', 'N/A'))
-                        rec_text += f"{i}. {title} ({year}) - {genre}\n"
-                else:
-                    rec_text = "\nI'll help you find a great movie based on your preferences."
-                
-                # Save preferences to database
-                await self.preferences_agent.update_preferences(
-                    context.get("user_id", "user123"),
-                    preferences
-                )
-                
-                return (
-                    f"Thanks for sharing your preferences!{rec_text}\n\n"
-                    "What movie would you like to watch today?",
-                    "initial"
-                )
-                
-            except Exception as e:
-                print(f"Error in handle_preferences: {str(e)}")
-                return (
-                    "Thanks for sharing your preferences! What movie would you like to watch today?",
-                    "initial"
-                )
-
-    async def handle_initial_state(self, user_input: str, context: Dict) -> Tuple[str, str]:
-        """Handle initial movie search with recommendations"""
-        try:
-            if user_input.lower() in ["what movies do you have", "show movies", "available movies", "list movies"]:
-                # Get trending movies
-                movies = await self.preferences_agent.get_trending_movies(10)
-                if not movies:  # Fall back to movie agent if no trending movies
-                    movies = await self.movie_agent.search_movies("popular movies 2024")
-                
-                if movies:
-                    context["available_movies"] = movies
-                    movie_list = "\n".join([
-                        f"{i+1}. {m.get('Title', m.get('title', ''))} "
-                        f"({m.get('Year', m.get('year', 'N/A'))}) - "
-                        f"{m.get('Genre', m.get('genre', 'N/A'))}"
-                        for i, m in enumerate(movies)
-                    ])
-                    return (
-                        f"Here are some popular movies currently showing:\n{movie_list}\n\n"
-                        "Which one would you like to watch? (Enter the number or search for another movie)",
-                        "movie_selection"
-                    )
-            
-            # Handle recommendation requests
-            if user_input.lower() in ["recommend", "suggestions", "what's good"]:
-                preferences = {
-                    "favorite_genres": context.get("favorite_genres", []),
-                    "favorite_actors": context.get("favorite_actors", []),
-                    "user_id": context.get("user_id", "user123")
-                }
-                recommendations = await self.get_movie_recommendations(preferences)
-                
-                if recommendations:
-                    context["available_movies"] = recommendations
-                    movie_list = "\n".join([
-                        f"{i+1}. {m.get('Title', m.get('title', ''))} "
-                        f"({m.get('Year', m.get('year', 'N/A'))}) - "
-                        f"{m.get('Genre', m.get('genre', 'N/A'))}"
-                        for i, m in enumerate(recommendations)
-                    ])
-                    return (
-                        f"Based on your preferences, here are some recommendations:\n{movie_list}\n\n"
-                        "Which movie would you like to watch? (Enter the number or type a movie name to search)",
-                        "movie_selection"
-                    )
-            
-            # Regular movie search
-            movies = await self.movie_agent.search_movies(user_input)
-            if movies:
-                context["available_movies"] = movies
-                movie_list = "\n".join([
-                    f"{i+1}. {m.get('Title', m.get('title', ''))} "
-                    f"({m.get('Year', m.get('year', 'N/A'))}) - "
-                    f"{m.get('Genre', m.get('genre', 'N/A'))}"
-                    for i, m in enumerate(movies)
-                ])
-                return (
-                    f"I found these movies:\n{movie_list}\n\n"
-                    "Which one would you like to watch? (Enter the number or search for another movie)",
-                    "movie_selection"
-                )
-            
-            return (
-                "I couldn't find any movies matching your search. You can:\n"
-                "1. Try searching with a different movie name\n"
-                "2. Type 'show movies' to see what's available\n"
-                "3. Type 'recommend' for personalized suggestions\n"
-                "What would you like to do?",
-                "initial"
-            )
-            
-        except Exception as e:
-            print(f"Error in handle_initial_state: {str(e)}")
-            return (
-                "I encountered an error while searching for movies. Please try again or type 'show movies' to see available options.",
-                "initial"
-            )
-        return "Let's get to know your movie preferences!", "preferences"
-
-    def _extract_name(self, input_text: str) -> str:
-        """Extract name from various greeting formats"""
-        import re
-        
-        # Common patterns for name extraction
-        patterns = [
-            r"(?i)i am ([a-zA-Z]+)",           # "I am John"
-            r"(?i)my name is ([a-zA-Z]+)",     # "My name is John"
-            r"(?i)i'm ([a-zA-Z]+)",            # "I'm John"
-            r"(?i)call me ([a-zA-Z]+)",        # "Call me John"
-            r"(?i)this is ([a-zA-Z]+)",        # "This is John"
-            r"(?i)^([a-zA-Z]+)$",              # Just "John"
-            r"(?i)^hi[,\s]+([a-zA-Z]+)$",      # "Hi John"
-            r"(?i)^hello[,\s]+([a-zA-Z]+)$",   # "Hello John"
-            r"(?i)^hey[,\s]+([a-zA-Z]+)$"      # "Hey John"
-        ]
-
-        # Try each pattern
-        for pattern in patterns:
-            match = re.search(pattern, input_text)
-            if match:
-                name = match.group(1)
-                return name.strip().title()  # Capitalize first letter
-
-        # If no patterns match, clean and return the entire input as fallback
-        # Remove common greetings and filler words
-        cleaned = input_text.lower()
-        for word in ['hi', 'hello', 'hey', 'i am', "i'm", 'my name is', 'this is', 'call me']:
-            cleaned = cleaned.replace(word, '').strip()
-        
-        # Remove punctuation and extra whitespace
-        cleaned = re.sub(r'[^\w\s]', '', cleaned).strip()
-        
-        # Return first word if multiple words exist
-        if cleaned:
-            return cleaned.split()[0].title()
-        
-        return ""
-
-    async def handle_email(self, user_input: str, context: Dict) -> Tuple[str, str]:
+    async def handle_email(self, user_input: str, context: SessionState) -> Tuple[str, str]:
         """Handle email collection"""
         # Extract email from input
-        email = self._extract_email(user_input)
+        email = extract_email(user_input)
         
-        if not email or not self._validate_email(email):
+        if not email or not validate_email(email):
             return (
                 "Please provide a valid email address "
                 "(e.g., username@domain.com):", 
@@ -405,56 +566,17 @@ class CoordinatorAgent:
             "preferences"
         )
 
-    def _extract_email(self, input_text: str) -> str:
-        """Extract email from various input formats"""
-        import re
-        
-        # Common patterns for email extraction
-        patterns = [
-            r"(?i)my email is[:\s]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",  # "my email is user@domain.com"
-            r"(?i)email[:\s]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",        # "email: user@domain.com"
-            r"(?i)email address[:\s]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})", # "email address: user@domain.com"
-            r"(?i)here'?s my email[:\s]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})", # "here's my email: user@domain.com"
-            r"(?i)you can reach me at[:\s]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})", # "you can reach me at user@domain.com"
-            r"([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"  # Just the email
-        ]
-
-        # Try each pattern
-        for pattern in patterns:
-            match = re.search(pattern, input_text)
-            if match:
-                return match.group(1).strip().lower()
-
-        # If no patterns match, clean and look for email-like string
-        words = input_text.strip().split()
-        for word in words:
-            if self._validate_email(word):
-                return word.lower()
-        
-        return ""
-
-    def _validate_email(self, email: str) -> bool:
-        """Validate email format"""
-        import re
-        # More comprehensive email validation pattern
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return bool(re.match(pattern, email.strip().lower()))
-
-    def _format_response_with_name(self, response: str, context: Dict) -> str:
+    def _format_response_with_name(self, response: str, context: SessionState) -> str:
         """Format response using user's name consistently"""
         if 'customer_name' in context:
             # Replace various greeting formats with consistent name usage
             name = context['customer_name']
-            response = re.sub(
-                r'(?i)(thank you|thanks|hi|hello|hey),?\s*(.*?)!',
-                f"\\1, {name}!",
-                response
-            )
+            response = self.GREETING_PATTERN.sub(f"\\1, {name}!", response)
         return response
 
 
 
-    async def handle_preferences(self, user_input: str, context: Dict) -> Tuple[str, str]:
+    async def handle_preferences(self, user_input: str, context: SessionState) -> Tuple[str, str]:
         """Handle user preferences collection"""
         if "preferences_state" not in context:
             context["preferences_state"] = "genres"
@@ -485,57 +607,72 @@ class CoordinatorAgent:
             )
             
         if context["preferences_state"] == "times":
-            preferred_times = [t.strip() for t in user_input.split(",")]
-            
-            # Save all preferences
-            preferences = {
-                "favorite_genres": context["favorite_genres"],
-                "favorite_actors": context["favorite_actors"],
-                "preferred_times": preferred_times,
-                "price_sensitivity": "medium"  # default value
-            }
-            
-            # Save preferences to database
-            await self.preferences_agent.update_preferences(
-                context.get("user_id", "user123"),
-                preferences
-            )
-            
-            # Get personalized recommendations
-            recommendations = await self.preferences_agent.get_personalized_recommendations(
-                context.get("user_id", "user123")
-            )
+            chunks = [chunk async for chunk in self.stream_preferences_recommendations(user_input, context)]
+            return "".join(chunks), "initial"
         
-        # Format recommendations with proper key handling
-        if recommendations:
-            rec_text = "\nBased on your preferences, you might enjoy these movies:\n"
-            for i, movie in enumerate(recommendations, 1):
-                # Handle both OMDB and local database formats
-                title = movie.get('Title', movie.get('title', 'Unknown Title'))
-                genre = movie.get('Genre', movie.get('genre', 'N/A'))
-                rec_text += f"{i}. {title} - {genre}\n"
-        else:
-            rec_text = ""
+        return "Let's start looking for movies!", "initial"
+
+    async def stream_preferences_recommendations(self, user_input: str,
+                                                 context: SessionState) -> AsyncIterator[str]:
+        """Save the collected preferences, streaming recommendations for them one line per movie"""
+        preferred_times = [t.strip() for t in user_input.split(",")]
         
-        return (
-            f"Thanks for sharing your preferences!{rec_text}\n\n"
-            "What movie would you like to watch today?",
-            "initial"
-        )
+        # Save all preferences
+        preferences = {
+            "favorite_genres": context["favorite_genres"],
+            "favorite_actors": context["favorite_actors"],
+            "preferred_times": preferred_times,
+            "price_sensitivity": "medium"  # default value
+        }
+        user_id = context.get("user_id", "user123")
+        await self.preferences_agent.update_preferences(user_id, preferences)
+        yield "Thanks for sharing your preferences!"
         
-        return "Let's start looking for movies!", "initial"
+        # Get personalized recommendations
+        count = 0
+        async for movie in self.preferences_agent.stream_personalized_recommendations(user_id):
+            if not count:
+                yield "\nBased on your preferences, you might enjoy these movies:\n"
+            count += 1
+            yield f"{count}. {movie.title} - {movie.genre}\n"
+        
+        context["current_state"] = "initial"
+        yield "\n\nWhat movie would you like to watch today?"
 
-    async def handle_initial_state(self, user_input: str, context: Dict) -> Tuple[str, str]:
+    async def handle_initial_state(self, user_input: str, context: SessionState) -> Tuple[str, str]:
         """Handle initial movie search with recommendations"""
-        if user_input.lower() in ["what movies do you have", "show movies", "available movies", "list movies"]:
+        route = await self.router.route(user_input)
+        return await self._reply_to_route(route, user_input, context)
+
+    async def _reply_to_route(self, route: Route, user_input: str, context: SessionState) -> Tuple[str, str]:
+        """Reply to a routed new search: a movie list to pick from, or how to search again"""
+        intent = route.intent
+        if intent == "browse":
+            movies = self.movie_agent.browse_local_catalog(list(route.genres), list(route.actors))
+            if movies:
+                self._list_movies(context, movies)
+                movie_list = "\n".join([
+                    f"{i+1}. {m.title} "
+                    f"({m.year}) - "
+                    f"{m.genre}"
+                    for i, m in enumerate(movies)
+                ])
+                found = ", ".join(route.genres + route.actors)
+                return (
+                    f"Here are some top rated picks for {found}:\n{movie_list}\n\n"
+                    "Which one would you like to watch? (Enter the number or search for another movie)",
+                    "movie_selection"
+                )
+
+        if intent == "list_movies":
             # Get a list of trending movies as default options
             movies = await self.preferences_agent.get_trending_movies(10)
             if movies:
-                context["available_movies"] = movies
+                self._list_movies(context, movies)
                 movie_list = "\n".join([
-                    f"{i+1}. {m.get('title', m.get('Title', ''))} "
-                    f"({m.get('year', m.get('Year', 'N/A'))}) - "
-                    f"{m.get('genre', m.get('Genre', 'N/A'))}"
+                    f"{i+1}. {m.title} "
+                    f"({m.year}) - "
+                    f"{m.genre}"
                     for i, m in enumerate(movies)
                 ])
                 return (
@@ -550,15 +687,15 @@ class CoordinatorAgent:
         )
         
         # Handle recommendation requests
-        if user_input.lower() in ["recommend", "suggestions", "what's good"]:
+        if intent == "recommend":
             recommendations = await self.preferences_agent.get_personalized_recommendations(
                 context.get("user_id", "user123")
             )
             if recommendations:
-                context["available_movies"] = recommendations
+                self._list_movies(context, recommendations)
                 movie_list = "\n".join([
-                    f"{i+1}. {m.get('title', m.get('Title', ''))} - "
-                    f"{m.get('genre', m.get('Genre', 'N/A'))}"
+                    f"{i+1}. {m.title} - "
+                    f"{m.genre}"
                     for i, m in enumerate(recommendations)
                 ])
                 return (
@@ -568,13 +705,13 @@ class CoordinatorAgent:
                 )
         
         # Regular movie search
-        movies = await self.movie_agent.search_movies(user_input)
+        movies = await self.movie_agent.search_movies(route.query if intent == "search" else user_input)
         if movies:
-            context["available_movies"] = movies
+            self._list_movies(context, movies)
             movie_list = "\n".join([
-                f"{i+1}. {m.get('Title', m.get('title', ''))} "
-                f"({m.get('Year', m.get('year', 'N/A'))}) - "
-                f"{m.get('Genre', m.get('genre', 'N/A'))}"
+                f"{i+1}. {m.title} "
+                f"({m.year}) - "
+                f"{m.genre}"
                 for i, m in enumerate(movies)
             ])
             
@@ -582,10 +719,10 @@ class CoordinatorAgent:
             suggestion = ""
             if preferences and preferences.get('favorite_genres'):
                 for movie in movies:
-                    movie_genre = movie.get('Genre', movie.get('genre', '')).lower()
+                    movie_genre = movie.genre.lower()
                     if any(genre.strip().lower() in movie_genre 
                         for genre in preferences['favorite_genres']):
-                        suggestion = f"\n💡 Based on your preferences, you might especially enjoy '{movie.get('Title', movie.get('title', ''))}'!"
+                        suggestion = f"\n💡 Based on your preferences, you might especially enjoy '{movie.title}'!"
                         break
             
             return (
@@ -604,41 +741,71 @@ class CoordinatorAgent:
             "initial"
         )
 
-    async def handle_movie_selection(self, user_input: str, context: Dict) -> Tuple[str, str]:
+    async def handle_movie_selection(self, user_input: str, context: SessionState) -> Tuple[str, str]:
         """Handle movie selection"""
+        chunks = [chunk async for chunk in self.stream_movie_selection(user_input, context)]
+        return "".join(chunks), context["current_state"]
+
+    async def stream_movie_selection(self, user_input: str, context: SessionState) -> AsyncIterator[str]:
+        """Confirm the picked movie as soon as it resolves, then stream its theaters and similar titles"""
+        context["current_state"] = "movie_selection"
         try:
             selection = int(user_input) - 1
-            movies = context.get("available_movies", [])
-            if 0 <= selection < len(movies):
-                selected_movie = movies[selection]
-                context["selected_movie"] = selected_movie
-                theaters = await self.booking_agent.get_theaters()
-                theater_list = "\n".join([f"{i+1}. {t['name']} ({t['location']})" 
-                                        for i, t in enumerate(theaters)])
-                context["available_theaters"] = theaters
-                return (
-                    f"Great choice, {context['customer_name']}! '{selected_movie['Title']}' is playing at these theaters:\n"
-                    f"{theater_list}\n\nWhich theater would you prefer? (Enter the number)",
-                    "theater_selection"
-                )
-            return "Invalid selection. Please choose a number from the list.", "movie_selection"
         except ValueError:
-            return "Please enter a valid number.", "movie_selection"
+            yield "Please enter a valid number."
+            return
+        movie_ids = context.get("movie_ids", ())
+        if not 0 <= selection < len(movie_ids):
+            yield "Invalid selection. Please choose a number from the list."
+            return
+        selected_movie = await self.movie_agent.resolve_movie(movie_ids[selection])
+        if selected_movie is None:
+            yield "Sorry, I couldn't load that movie. Please choose another one."
+            return
+        context["movie_id"] = selected_movie.id
+        yield f"Great choice, {context['customer_name']}! '{selected_movie.title}' is playing at these theaters:\n"
+        
+        # Usually prefetched while the user was reading the list
+        movie_step = await self.prefetcher.get(
+            ("movie", selected_movie.id),
+            lambda: self._load_movie_step(selected_movie.id, with_showtimes=False)
+        )
+        theaters = movie_step["theaters"]
+        context["theater_ids"] = [theater["id"] for theater in theaters]
+        yield "\n".join([f"{i+1}. {t['name']} ({t['location']})" for i, t in enumerate(theaters)])
+        
+        # Precomputed neighbours make "more like this" a lookup
+        similar = movie_step["similar"]
+        if similar:
+            yield "\n\n🎞️ If you like this, you might also enjoy: " + ", ".join(
+                self._get_movie_title(m) for m in similar
+            )
+        context["current_state"] = "theater_selection"
+        yield "\n\nWhich theater would you prefer? (Enter the number)"
 
-    async def handle_theater_selection(self, user_input: str, context: Dict) -> Tuple[str, str]:
+    async def handle_theater_selection(self, user_input: str, context: SessionState) -> Tuple[str, str]:
         """Handle theater selection"""
         try:
             selection = int(user_input) - 1
-            theaters = context.get("available_theaters", [])
-            if 0 <= selection < len(theaters):
-                selected_theater = theaters[selection]
-                context["selected_theater"] = selected_theater
-                showtimes = await self.booking_agent.get_showtimes(
-                    selected_theater["id"],
-                    context["selected_movie"]["imdbID"],
-                    None  # You can add date selection later
+            theater_ids = context.get("theater_ids", ())
+            if 0 <= selection < len(theater_ids):
+                movie_id = context["movie_id"]
+                movie_step = await self.prefetcher.get(("movie", movie_id))
+                theaters = movie_step["theaters"] if movie_step else await self.booking_agent.get_theaters()
+                selected_theater = next(
+                    (theater for theater in theaters if theater["id"] == theater_ids[selection]), None
                 )
-                context["available_showtimes"] = showtimes
+                if selected_theater is None:
+                    return "Sorry, that theater is no longer available. Please choose another one.", "theater_selection"
+                context["theater_id"] = selected_theater["id"]
+                showtimes = movie_step["showtimes"].get(selected_theater["id"]) if movie_step else None
+                if showtimes is None:
+                    showtimes = await self.booking_agent.get_showtimes(
+                        selected_theater["id"],
+                        movie_id,
+                        None  # You can add date selection later
+                    )
+                context["showtime_ids"] = [showtime["id"] for showtime in showtimes]
                 showtime_list = "\n".join([f"{i+1}. {s['time']} - ${s['price']}"
                                          for i, s in enumerate(showtimes)])
                 return (
@@ -650,28 +817,31 @@ class CoordinatorAgent:
         except ValueError:
             return "Please enter a valid number.", "theater_selection"
 
-    async def handle_seat_selection(self, user_input: str, context: Dict) -> Tuple[str, str]:
+    async def handle_seat_selection(self, user_input: str, context: SessionState) -> Tuple[str, str]:
         """Handle seat selection"""
         try:
             selection = int(user_input) - 1
-            showtimes = context.get("available_showtimes", [])
-            if 0 <= selection < len(showtimes):
-                selected_showtime = showtimes[selection]
-                # Store the complete showtime object
-                context["selected_showtime"] = {
-                    "id": f"st_{context['selected_theater']['id']}_{selection}",  # Generate proper showtime ID
-                    "time": selected_showtime["time"],
-                    "date": selected_showtime["date"],
-                    "price": selected_showtime["price"]
-                }
+            showtime_ids = context.get("showtime_ids", ())
+            if 0 <= selection < len(showtime_ids):
+                showtime_id = showtime_ids[selection]
+                context["showtime_id"] = showtime_id
                 
-                # Get and display available seats
-                available_seats = await self.seating_agent.get_available_seats(context["selected_showtime"]["id"])
+                # Get and display available seats; a prefetched map is only
+                # used while no booking has changed it since. The session only
+                # keeps the map's version, bookings check the live map
+                seat_step = await self.prefetcher.get(
+                    ("seats", showtime_id, self.db.get_seat_version(showtime_id)),
+                    lambda: self._load_seat_step(showtime_id)
+                )
+                available_seats = seat_step["seats"]
                 seat_map = self.seating_agent.format_seat_map(available_seats)
-                context["available_seats"] = available_seats
+                context["seat_version"] = seat_step["version"]
+                suggestion = ""
+                if seat_step["suggested"]:
+                    suggestion = f"💺 Best seats together: {' '.join(seat_step['suggested'])}\n"
                 
                 return (
-                    f"Here's the seating map:\n{seat_map}\n"
+                    f"Here's the seating map:\n{seat_map}\n{suggestion}"
                     "Please enter your seat selections (e.g., 'A1 A2' for multiple seats):",
                     "booking_confirmation"
                 )
@@ -679,28 +849,22 @@ class CoordinatorAgent:
         except ValueError:
             return "Please enter a valid number.", "seat_selection"
 
-    async def handle_booking(self, user_input: str, context: Dict) -> Tuple[str, str]:
+    async def handle_booking(self, user_input: str, context: SessionState) -> Tuple[str, str]:
         """Handle final booking process"""
         try:
             if context.get("booking_completed"):
                 # Handle post-booking interactions
-                if user_input.lower() in ['thanks', 'thank you', 'bye', 'goodbye', 'no']:
+                intent = match_intent(user_input)
+                if intent in ("farewell", "deny"):
                     return (
                         f"Thank you for using our service, {context['customer_name']}! "
                         f"Your booking confirmation and tickets have been sent to {context['customer_email']}. "
                         "Have a great time at the movies! 👋",
                         "finished"
                     )
-                elif user_input.lower() in ['yes', 'yeah', 'sure', 'ok']:
+                elif intent == "affirm":
                     # Reset necessary context for new booking
-                    context.update({
-                        "current_state": "initial",
-                        "selected_movie": None,
-                        "selected_theater": None,
-                        "selected_showtime": None,
-                        "selected_seats": None,
-                        "booking_completed": False
-                    })
+                    self._reset_booking_context(context)
                     return (
                         "What movie would you like to watch?",
                         "initial"
@@ -708,25 +872,18 @@ class CoordinatorAgent:
 
             # First time handling seat selection or if we need to select seats again
             if "selected_seats" not in context or context.get("selecting_seats", True):
-                seats = user_input.upper().replace("'", "").strip().split()
-                available_seats = context.get("available_seats", {})
-
-                # Validate seat format
-                valid_format = all(
-                    len(seat) in [2, 3] and 
-                    seat[0] in "ABCDEFGH" and 
-                    seat[1:].isdigit() and 
-                    1 <= int(seat[1:]) <= 10 
-                    for seat in seats
-                )
+                seats = parse_seat_labels(user_input)
+                showtime_id = context["showtime_id"]
 
-                if not valid_format:
+                if not seats:
                     return (
                         "Invalid seat format. Please use format like 'A1 A2' or 'B1 B2'.", 
                         "booking_confirmation"
                     )
 
-                # Validate seat availability
+                # Validate seat availability against the live map, not the one shown earlier
+                version = self.db.get_seat_version(showtime_id)
+                available_seats = await self.seating_agent.get_available_seats(showtime_id)
                 if all(seat in available_seats and available_seats[seat]["status"] == "available" 
                       for seat in seats):
                     # Store the selected seats in context
@@ -734,20 +891,24 @@ class CoordinatorAgent:
                     context["selecting_seats"] = False  # Mark seat selection as complete
                     total_price = sum(float(available_seats[seat]["price"]) for seat in seats)
                     context["total_price"] = total_price
+                    details = await self.describe_booking(context)
 
                     # Create booking summary
                     booking_summary = (
                         f"Booking Summary for {context['customer_name']}:\n"
                         f"Email: {context['customer_email']}\n"
-                        f"Movie: {context['selected_movie']['Title']}\n"
-                        f"Theater: {context['selected_theater']['name']}\n"
-                        f"Time: {context['selected_showtime']['time']}\n"
+                        f"Movie: {details['movie_title']}\n"
+                        f"Theater: {details['theater_name']}\n"
+                        f"Time: {details['time']}\n"
                         f"Seats: {', '.join(seats)}\n"
                         f"Total Price: ${total_price:.2f}\n\n"
                         f"Would you like to confirm your booking? (Yes/No)"
                     )
                     return (booking_summary, "booking_confirmation")
 
+                if version != context.get("seat_version"):
+                    # Someone booked since the map was shown; show the current one
+                    return await self._seats_taken_response(context)
                 return (
                     "Some of the selected seats are not available. Please choose different seats.", 
                     "booking_confirmation"
@@ -755,14 +916,15 @@ class CoordinatorAgent:
 
             # Handle booking confirmation
             if not context.get("selecting_seats", True):
-                if user_input.lower() in ['yes', 'y', 'confirm', 'yeah', 'yep']:
-                    showtime_id = context["selected_showtime"]["id"]
+                intent = match_intent(user_input)
+                if intent == "affirm":
+                    showtime_id = context["showtime_id"]
                     
                     # In a real app, user_id would come from user authentication
                     booking_id = await self.booking_agent.create_booking(
                         user_id="user123",
                         showtime_id=showtime_id,
-                        seats=context["selected_seats"]
+                        seats=list(context["selected_seats"])
                     )
                     
                     if booking_id:
@@ -770,10 +932,7 @@ class CoordinatorAgent:
                             "id": booking_id,
                             "customer_name": context["customer_name"],
                             "customer_email": context["customer_email"],
-                            "theater_name": context["selected_theater"]["name"],
-                            "movie_title": context["selected_movie"]["Title"],
-                            "date": context["selected_showtime"]["date"],
-                            "time": context["selected_showtime"]["time"],
+                            **await self.describe_booking(context),
                             "seats": context["selected_seats"],
                             "total_price": context["total_price"]
                         }
@@ -786,12 +945,15 @@ class CoordinatorAgent:
                             "booking_confirmation"
                         )
                     
+                    if self.db.get_seat_version(showtime_id) != context.get("seat_version"):
+                        # The seats went to someone else while the summary was being read
+                        return await self._seats_taken_response(context)
                     return (
                         "Sorry, there was an error processing your booking. Please try again.", 
                         "booking_confirmation"
                     )
                     
-                elif user_input.lower() in ['no', 'n', 'cancel']:
+                elif intent == "deny":
                     # Reset the seat selection process
                     context["selecting_seats"] = True
                     if "selected_seats" in context:
@@ -818,21 +980,41 @@ class CoordinatorAgent:
                 "An error occurred while processing your booking. Please try again.", 
                 "booking_confirmation"
             )
+    async def _seats_taken_response(self, context: SessionState) -> Tuple[str, str]:
+        """Send the user back to seat selection with the live map after a conflicting booking"""
+        showtime_id = context["showtime_id"]
+        context["seat_version"] = self.db.get_seat_version(showtime_id)
+        context["selecting_seats"] = True
+        del context["selected_seats"]
+        available_seats = await self.seating_agent.get_available_seats(showtime_id)
+        return (
+            "Some of those seats were just booked by someone else. Here's the updated map:\n"
+            f"{self.seating_agent.format_seat_map(available_seats)}\n"
+            "Please choose different seats.",
+            "booking_confirmation"
+        )
+
     async def get_movie_recommendations(self, preferences: Dict) -> List[Dict]:
         """Get movie recommendations based on preferences"""
         try:
+            user_id = preferences.get("user_id", "user123")
+            
             # First try preferences agent
-            recommendations = await self.preferences_agent.get_personalized_recommendations(
-                preferences.get("user_id", "user123")
-            )
+            recommendations = await self.preferences_agent.get_personalized_recommendations(user_id)
             
             if not recommendations:
-                # Fall back to movie agent if preferences agent returns nothing
-                recommendations = await self.movie_agent.get_movie_suggestions({
-                    'favorite_genres': preferences.get('favorite_genres', []),
-                    'favorite_actors': preferences.get('favorite_actors', []),
-                    'recent_movies': preferences.get('recent_movies', [])
-                })
+                # Fall back to movie agent if preferences agent returns nothing,
+                # sharing the preferences agent's cache and invalidation
+                cache = self.preferences_agent.recommendation_cache
+                fingerprint = cache.fingerprint(preferences)
+                recommendations = cache.get(user_id, fingerprint, namespace="suggestions")
+                if recommendations is None:
+                    recommendations = await self.movie_agent.get_movie_suggestions({
+                        'favorite_genres': preferences.get('favorite_genres', []),
+                        'favorite_actors': preferences.get('favorite_actors', []),
+                        'recent_movies': preferences.get('recent_movies', [])
+                    })
+                    cache.put(user_id, fingerprint, recommendations, namespace="suggestions")
             
             return recommendations
             
@@ -0,0 +1,63 @@
+# utils/deadline.py
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Iterator, Optional
+
+# Absolute time.monotonic() deadline of the current turn. Context variables
+# are copied into every task a turn creates, so gathered sub-calls see it too.
+_turn_deadline: ContextVar[Optional[float]] = ContextVar("turn_deadline", default=None)
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The current turn ran out of time"""
+
+def deadline_at(seconds: float) -> float:
+    """Absolute deadline `seconds` from now"""
+    return time.monotonic() + seconds
+
+@contextmanager
+def deadline_scope(at: Optional[float]) -> Iterator[Optional[float]]:
+    """Run a block under an absolute deadline; an outer, earlier deadline still wins"""
+    current = _turn_deadline.get()
+    if at is None or (current is not None and current <= at):
+        yield current
+        return
+    token = _turn_deadline.set(at)
+    try:
+        yield at
+    finally:
+        _turn_deadline.reset(token)
+
+def remaining(cap: Optional[float] = None) -> Optional[float]:
+    """Seconds left in the turn, limited to `cap`; None if there is neither"""
+    at = _turn_deadline.get()
+    if at is None:
+        return cap
+    left = max(0.0, at - time.monotonic())
+    return left if cap is None else min(left, cap)
+
+def expired() -> bool:
+    """Whether the current turn's deadline has passed"""
+    return remaining() == 0.0
+
+# asyncio may fire a timer up to its clock resolution before it is due
+_CLOCK_SLACK_SECONDS = 0.001
+
+async def with_deadline(awaitable: Awaitable, cap: Optional[float] = None) -> Any:
+    """Await under the turn deadline (and `cap`), cancelling it on timeout.
+
+    Raises DeadlineExceeded only if the turn's deadline has passed; a
+    shorter `cap` or a timeout raised by the awaited call itself (such as
+    a per-request HTTP timeout) propagates as the original TimeoutError.
+    """
+    timeout = remaining(cap)
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError as e:
+        left = remaining()
+        if isinstance(e, DeadlineExceeded) or left is None or left > _CLOCK_SLACK_SECONDS:
+            raise
+        raise DeadlineExceeded() from e
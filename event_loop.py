@@ -0,0 +1,116 @@
+# utils/event_loop.py
+import asyncio
+import atexit
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable, List, Optional
+
+async def _await(awaitable: Awaitable) -> Any:
+    """Wrap an awaitable such as an async generator step into a coroutine"""
+    return await awaitable
+
+class BackgroundEventLoop:
+    """A long-lived asyncio loop running on its own daemon thread.
+
+    Synchronous callers such as Streamlit script runs submit coroutines and
+    wait on the result, so pooled connections, loop-bound caches and
+    background tasks outlive a single chat turn. Shutdown hooks run on the
+    loop before it stops.
+    """
+
+    def __init__(self, name: str = "event-loop"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.shutdown_hooks: List[Callable[[], Awaitable[Any]]] = []
+        self.lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> "BackgroundEventLoop":
+        """Start the loop thread if it is not already running"""
+        with self.lock:
+            if not self.running:
+                self.loop = asyncio.new_event_loop()
+                started = threading.Event()
+                self.thread = threading.Thread(
+                    target=self._run_forever, args=(started,), name=self.name, daemon=True
+                )
+                self.thread.start()
+                started.wait()
+        return self
+
+    def _run_forever(self, started: threading.Event):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(started.set)
+        self.loop.run_forever()
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """Schedule a coroutine (or other awaitable) on the loop without waiting for it"""
+        if not self.running:
+            self.start()
+        if not asyncio.iscoroutine(coro):
+            coro = _await(coro)
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and wait for its result.
+
+        Raises concurrent.futures.TimeoutError after `timeout` seconds, in
+        which case the coroutine is cancelled on the loop.
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def add_shutdown_hook(self, hook: Callable[[], Awaitable[Any]]):
+        """Register an async cleanup callable (e.g. closing a connection pool)"""
+        with self.lock:
+            self.shutdown_hooks.append(hook)
+
+    def shutdown(self, timeout: float = 5.0):
+        """Run the shutdown hooks, cancel leftover tasks and stop the loop"""
+        with self.lock:
+            if not self.running:
+                return
+            loop, thread = self.loop, self.thread
+            hooks, self.shutdown_hooks = self.shutdown_hooks, []
+
+        async def drain():
+            for hook in hooks:
+                try:
+                    await hook()
+                except Exception as e:
+                    print(f"Error in event loop shutdown hook: {str(e)}")
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await loop.shutdown_asyncgens()
+
+        try:
+            asyncio.run_coroutine_threadsafe(drain(), loop).result(timeout)
+        except Exception as e:
+            print(f"Error shutting down event loop: {str(e)}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+
+_background_loop: Optional[BackgroundEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+def get_background_loop() -> BackgroundEventLoop:
+    """The process-wide background loop, started on first use"""
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                _background_loop = BackgroundEventLoop().start()
+                atexit.register(_background_loop.shutdown)
+    return _background_loop
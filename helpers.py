@@ -1,17 +1,15 @@
 # utils/helpers.py
 from typing import List
-import re
+from input_parser import seat_ordinal, split_seat_tokens
 
 def parse_seat_selection(seat_input: str) -> List[str]:
     """Parse seat selection input into list of seats"""
     # Handle inputs like "A1, A2" or "A1,A2" or "A1 A2"
-    seats = re.split(r'[,\s]+', seat_input.strip())
-    return [seat.strip().upper() for seat in seats if seat.strip()]
+    return split_seat_tokens(seat_input)
 
 def validate_seat_format(seats: List[str]) -> bool:
     """Validate seat format (e.g., 'A1', 'B2', etc.)"""
-    pattern = re.compile(r'^[A-H][1-9]|10$')
-    return all(pattern.match(seat) for seat in seats)
+    return all(seat_ordinal(seat) is not None for seat in seats)
 
 def calculate_total_price(seats: List[str], price_per_seat: float) -> float:
     """Calculate total price for selected seats"""
@@ -20,3 +18,14 @@ def calculate_total_price(seats: List[str], price_per_seat: float) -> float:
 def format_price(price: float) -> str:
     """Format price with currency symbol"""
     return f"${price:.2f}"
+
+def get_time_slot(time: str) -> str:
+    """Convert a 'HH:MM' time to a time slot category"""
+    hour = int(time.split(':')[0])
+    if hour < 12:
+        return 'morning'
+    elif hour < 17:
+        return 'afternoon'
+    elif hour < 20:
+        return 'evening'
+    return 'night'
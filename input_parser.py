@@ -0,0 +1,111 @@
+# utils/input_parser.py
+import re
+from typing import Dict, List, Optional
+from config_file import Config
+
+# Every pattern is compiled once, at import. Alternatives that used to be
+# tried one pattern at a time are combined into a single alternation, so a
+# message is scanned once per slot.
+
+_NAME_WORD = r"([a-z]+)"
+_NAME = re.compile(
+    rf"i am {_NAME_WORD}|my name is {_NAME_WORD}|i'm {_NAME_WORD}|call me {_NAME_WORD}"
+    rf"|this is {_NAME_WORD}|^{_NAME_WORD}$|^(?:hi|hello|hey)[,\s]+{_NAME_WORD}$",
+    re.IGNORECASE
+)
+_NAME_FILLER = re.compile(r"\b(?:hi|hello|hey|i am|i'm|my name is|this is|call me)\b", re.IGNORECASE)
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+_EMAIL_ADDRESS = r"[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,}"
+_EMAIL = re.compile(_EMAIL_ADDRESS, re.IGNORECASE)
+_EMAIL_AFTER_CUE = re.compile(
+    rf"(?:my email is|email address|email|here'?s my email|you can reach me at)[:\s]+({_EMAIL_ADDRESS})",
+    re.IGNORECASE
+)
+
+# Seats: a row letter and a number, e.g. "A1" or "h10". Tokens are looked up in
+# a table of every valid label, so one split both tokenizes and validates.
+_SEAT_ROWS = Config.VALID_SEAT_ROWS
+_SEAT_ORDINALS: Dict[str, int] = {
+    f"{row}{number}": i * Config.MAX_SEAT_NUMBER + number - 1
+    for i, row in enumerate(_SEAT_ROWS)
+    for number in range(1, Config.MAX_SEAT_NUMBER + 1)
+}
+_SEAT_SPLIT = re.compile(r"[\s,;']+")
+
+# Whole-message intents; each group name is the intent it stands for
+INTENT_PHRASES: Dict[str, List[str]] = {
+    "affirm": ["yes", "y", "yeah", "yep", "sure", "ok", "okay", "confirm"],
+    "deny": ["no", "n", "nope", "cancel"],
+    "farewell": ["thanks", "thank you", "bye", "goodbye"],
+    "list_movies": ["what movies do you have", "show movies", "available movies", "list movies"],
+    "recommend": ["recommend", "suggestions", "what's good"],
+}
+_INTENT = re.compile(
+    r"\s*(?:"
+    + "|".join(
+        f"(?P<{intent}>" + "|".join(sorted(map(re.escape, phrases), key=len, reverse=True)) + ")"
+        for intent, phrases in INTENT_PHRASES.items()
+    )
+    + r")\s*[.!]*\s*",
+    re.IGNORECASE
+)
+
+def extract_name(text: str) -> str:
+    """Name from greetings like "I am John", "call me John" or just "John" ("" if none)"""
+    match = _NAME.search(text)
+    if match:
+        return next(group for group in match.groups() if group).title()
+
+    # Fall back to the first word left after dropping greetings and punctuation
+    cleaned = _PUNCTUATION.sub("", _NAME_FILLER.sub(" ", text)).split()
+    return cleaned[0].title() if cleaned else ""
+
+def extract_email(text: str) -> str:
+    """Email address from inputs like "my email is a@b.com" or just "a@b.com" ("" if none)"""
+    match = _EMAIL_AFTER_CUE.search(text) or _EMAIL.search(text)
+    if match:
+        return match.group(match.lastindex or 0).lower()
+    return ""
+
+def validate_email(email: str) -> bool:
+    """Whether the whole string is a plausible email address"""
+    return _EMAIL.fullmatch(email.strip()) is not None
+
+def match_intent(text: str) -> Optional[str]:
+    """The intent of a whole message ("affirm", "deny", "farewell", "list_movies", "recommend"), if any"""
+    match = _INTENT.fullmatch(text)
+    return match.lastgroup if match else None
+
+def seat_ordinal(seat: str) -> Optional[int]:
+    """Row-major index of a seat label ("A1" -> 0, "B1" -> 10), or None if it isn't one"""
+    return _SEAT_ORDINALS.get(seat.strip().upper())
+
+def seat_label(ordinal: int) -> str:
+    """Seat label of a row-major index (0 -> "A1")"""
+    row, number = divmod(ordinal, Config.MAX_SEAT_NUMBER)
+    return f"{_SEAT_ROWS[row]}{number + 1}"
+
+def parse_seats(text: str) -> Optional[List[int]]:
+    """Seat ordinals of a list like "A1 A2", "a1,a2" or "'B3'; B4", in order and without repeats.
+
+    Returns None if any token isn't a valid seat and [] for an empty list.
+    """
+    ordinals = []
+    for token in _SEAT_SPLIT.split(text.upper()):
+        if token:
+            ordinal = _SEAT_ORDINALS.get(token)
+            if ordinal is None:
+                return None
+            if ordinal not in ordinals:
+                ordinals.append(ordinal)
+    return ordinals
+
+def parse_seat_labels(text: str) -> Optional[List[str]]:
+    """Like parse_seats, as normalized labels ("a1, a2" -> ["A1", "A2"])"""
+    ordinals = parse_seats(text)
+    return None if ordinals is None else [seat_label(ordinal) for ordinal in ordinals]
+
+def split_seat_tokens(text: str) -> List[str]:
+    """Upper-cased tokens of a seat list, valid or not"""
+    return [token.upper() for token in _SEAT_SPLIT.split(text) if token]
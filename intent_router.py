@@ -0,0 +1,225 @@
+# utils/intent_router.py
+import asyncio
+import difflib
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from config_file import Config
+from admission import DEGRADED, AdmissionController, admission as default_admission
+from deadline import remaining
+from input_parser import match_intent
+from metrics import MetricsRegistry, metrics as default_metrics
+from mockdb import MockDatabase
+
+_WORD = re.compile(r"[a-z0-9'-]+")
+_ACTOR_CUE = re.compile(r"\b(?:with|starring|featuring)\s+([a-z][a-z .'-]*[a-z])", re.IGNORECASE)
+
+# Words and phrases that give away what a message is asking for. Single
+# words also match when misspelt ("recomend"); phrases must appear as is.
+_KEYWORDS: Dict[str, Set[str]] = {
+    "recommend": {"recommend", "recommendation", "recommendations", "suggest", "suggestion",
+                  "suggestions", "surprise"},
+    "list_movies": {"playing", "showing", "showtimes", "available", "list"},
+}
+_PHRASES: Dict[str, List[str]] = {
+    "recommend": ["what's good", "something good", "what should i watch", "pick for me"],
+    "list_movies": ["what's on", "what movies", "all movies", "now showing", "in theaters"],
+}
+
+# Genre words as users say them, mapped to catalog genres
+_GENRES: Dict[str, str] = {
+    genre.lower(): genre for genre in (
+        "Action", "Adventure", "Animation", "Biography", "Comedy", "Crime", "Documentary", "Drama",
+        "Family", "Fantasy", "History", "Horror", "Music", "Musical", "Mystery", "Romance",
+        "Sci-Fi", "Sport", "Thriller", "War", "Western"
+    )
+}
+_GENRES.update({
+    "funny": "Comedy", "comedies": "Comedy", "scary": "Horror", "romantic": "Romance",
+    "animated": "Animation", "cartoon": "Animation", "scifi": "Sci-Fi", "kids": "Family",
+    "thrillers": "Thriller", "westerns": "Western", "documentaries": "Documentary",
+})
+
+@dataclass(frozen=True)
+class Route:
+    """Where a turn should go and the slots found on the way.
+
+    intent: "search" (a title), "browse" (genres or actors), "list_movies" or "recommend"
+    tier: what resolved it: "exact" (a command), "keyword", "fuzzy" (misspelt keywords), "catalog"
+        (genre, actor or title found locally), "title" (short and unmatched,
+        searched as a title like before), "llm" (the ReAct agent) or
+        "fallback" (ambiguous, but escalation was unavailable)
+    """
+
+    intent: str
+    query: str
+    tier: str
+    genres: Tuple[str, ...] = ()
+    actors: Tuple[str, ...] = ()
+
+class TokenBucket:
+    """Allows `rate_per_minute` events on average, in bursts of up to `burst`"""
+
+    def __init__(self, rate_per_minute: float, burst: int,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+Escalation = Callable[[str], Awaitable[Optional[Route]]]
+
+class IntentRouter:
+    """Tiered routing of free-text turns at the start of a search.
+
+    Cheap local tiers go first: the exact command table, keywords (misspelt
+    ones too), then genres, actors and titles found in the local catalog.
+    A message they resolve to exactly one intent is routed without an LLM,
+    and so is a short one they don't recognize at all, which is searched as
+    a title as before. Only conflicting or long unmatched messages are
+    escalated to the ReAct agent, at most `ROUTER_LLM_PER_MINUTE` times a
+    minute and not while the LLM is degraded; otherwise they fall back to
+    a title search.
+    """
+
+    def __init__(self, db: MockDatabase, escalate: Optional[Escalation] = None,
+                 rate_per_minute: float = Config.ROUTER_LLM_PER_MINUTE,
+                 burst: int = Config.ROUTER_LLM_BURST,
+                 admission: Optional[AdmissionController] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.db = db
+        self.escalate = escalate
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.admission = admission or default_admission
+        self.metrics = metrics or default_metrics
+        self.keywords = {word: intent for intent, words in _KEYWORDS.items() for word in words}
+        self.vocabulary = list(self.keywords)
+        self.lock = threading.Lock()
+        self.tiers: Dict[str, int] = {}
+        self.rate_limited = 0
+
+    async def route(self, text: str) -> Route:
+        """Route one message, escalating to the LLM only when the local tiers disagree"""
+        start = time.perf_counter()
+        route = self.route_locally(text)
+        if route is None:
+            route = await self._escalate(text) or Route("search", text, "fallback")
+        with self.lock:
+            self.tiers[route.tier] = self.tiers.get(route.tier, 0) + 1
+        self.metrics.increment(f"router.{route.tier}")
+        self.metrics.observe("router.route", time.perf_counter() - start)
+        return route
+
+    def route_locally(self, text: str) -> Optional[Route]:
+        """The route the local tiers agree on, or None if the message is ambiguous"""
+        intent = match_intent(text)
+        if intent in ("list_movies", "recommend"):
+            return Route(intent, text, "exact")
+
+        lowered = text.lower()
+        words = _WORD.findall(lowered)
+        if not words:
+            return Route("search", text, "title")
+
+        intents, fuzzy = self._keyword_intents(words, lowered)
+        genres = self._genres(words)
+        actors = self._actors(text)
+        if genres or actors:
+            # "recommend a comedy" and "show me comedies" both mean browsing the genre
+            intents.discard("recommend")
+            intents.discard("list_movies")
+            intents.add("browse")
+        if self._title_score(text) >= Config.ROUTER_TITLE_MIN_SCORE:
+            intents.add("search")
+
+        if len(intents) == 1:
+            intent = intents.pop()
+            tier = "catalog" if intent in ("browse", "search") else ("fuzzy" if fuzzy else "keyword")
+            return Route(intent, text, tier, tuple(genres), tuple(actors))
+        if not intents and len(words) <= Config.ROUTER_MAX_TITLE_WORDS:
+            return Route("search", text, "title")
+        return None
+
+    def _keyword_intents(self, words: List[str], lowered: str) -> Tuple[Set[str], bool]:
+        """Intents whose keywords or phrases appear, and whether any keyword was misspelt"""
+        intents = {intent for intent, phrases in _PHRASES.items()
+                   if any(phrase in lowered for phrase in phrases)}
+        fuzzy = False
+        for word in words:
+            intent = self.keywords.get(word)
+            if intent is None and len(word) >= 5:
+                close = difflib.get_close_matches(word, self.vocabulary, 1, Config.ROUTER_FUZZY_CUTOFF)
+                if close:
+                    intent = self.keywords[close[0]]
+                    fuzzy = True
+            if intent is not None:
+                intents.add(intent)
+        return intents, fuzzy
+
+    def _genres(self, words: List[str]) -> List[str]:
+        genres = []
+        for i, word in enumerate(words):
+            genre = _GENRES.get(word)
+            if genre is None and i + 1 < len(words):
+                genre = _GENRES.get(f"{word}-{words[i + 1]}")  # "sci fi"
+            if genre is None and word.endswith("s"):
+                genre = _GENRES.get(word[:-1])  # "westerns", "thrillers"
+            if genre is not None and genre not in genres:
+                genres.append(genre)
+        return genres
+
+    def _actors(self, text: str) -> List[str]:
+        """Names after "with", "starring" or "featuring" that the catalog knows as actors"""
+        actors = []
+        for match in _ACTOR_CUE.finditer(text):
+            # The name is the longest run of up to three words the catalog knows ("with tom hanks tonight")
+            words = match.group(1).split()
+            for n in range(min(3, len(words)), 0, -1):
+                name = " ".join(words[:n])
+                if (n > 1 or len(name) >= 4) and self.db.catalog.filter(actors=[name], limit=1):
+                    actors.append(name.title())
+                    break
+        return actors
+
+    def _title_score(self, text: str) -> float:
+        matches = self.db.search_index.search(text, 1)
+        return matches[0][1] if matches else 0.0
+
+    async def _escalate(self, text: str) -> Optional[Route]:
+        if self.escalate is None:
+            return None
+        if self.admission.llm.at_least(DEGRADED) or not self.bucket.try_acquire():
+            with self.lock:
+                self.rate_limited += 1
+            self.metrics.increment("router.rate_limited")
+            return None
+        try:
+            return await asyncio.wait_for(self.escalate(text), remaining(Config.ROUTER_LLM_TIMEOUT_SECONDS))
+        except Exception as e:
+            print(f"Error escalating intent: {str(e)}")
+            return None
+
+    def stats(self) -> Dict:
+        """Turns per tier and the share resolved without the LLM"""
+        with self.lock:
+            total = sum(self.tiers.values())
+            return {
+                "turns": total,
+                "tiers": dict(self.tiers),
+                "local_share": 1.0 - self.tiers.get("llm", 0) / total if total else 0.0,
+                "rate_limited": self.rate_limited,
+            }
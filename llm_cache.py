@@ -0,0 +1,522 @@
+# utils/llm_cache.py
+import atexit
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms.llm import LLM
+from config_file import Config
+from llm_gateway import estimate_tokens, reported_tokens
+from metrics import MetricsRegistry, metrics as default_metrics
+
+# Differences that don't change what is being asked: case and spacing. Punctuation
+# stays, since "it's"/"its" or a seat or email with and without separators differ
+_WHITESPACE = re.compile(r"\s+")
+_NUMBERS = re.compile(r"\d+")
+
+# A row to write, or None to delete it
+Change = Optional[Tuple[str, str, str, int, float, Optional[bytes]]]
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def _usage_tokens(raw: Any, prompt: str, text: str) -> int:
+    """Tokens a response cost: the provider's count if reported, else an estimate"""
+    total = reported_tokens(raw)
+    return total if total is not None else estimate_tokens(prompt) + estimate_tokens(text)
+
+class _Entry:
+    __slots__ = ("response", "tokens", "expires_at", "scope", "query", "vector")
+
+    def __init__(self, response: str, tokens: int, expires_at: float, scope: str, query: str,
+                 vector: Optional[np.ndarray]):
+        self.response = response
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.scope = scope
+        self.query = query
+        self.vector = vector
+
+class LLMResponseCache:
+    """LLM responses by request, with TTL, bounded LRU memory and an optional SQLite copy.
+
+    The exact tier looks up the request's key. The semantic tier, on when a
+    `similarity_threshold` is set, also matches a request whose last user
+    message is a close paraphrase of a cached one (cosine similarity at
+    least the threshold, same numbers) when everything before it, its
+    `scope`, is identical. With a `path`, entries are also kept in SQLite
+    and unexpired ones are loaded back on startup. Writes are behind: a
+    background thread writes the entries added or evicted since its last
+    run every `flush_seconds`, in one transaction, so callers on an event
+    loop never wait on the database.
+    """
+
+    def __init__(self, path: Optional[str] = Config.LLM_CACHE_PATH,
+                 max_entries: int = Config.LLM_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = Config.LLM_CACHE_TTL_SECONDS,
+                 similarity_threshold: Optional[float] = Config.LLM_CACHE_SIMILARITY_THRESHOLD or None,
+                 flush_seconds: float = Config.LLM_CACHE_FLUSH_SECONDS,
+                 clock: Callable[[], float] = time.time,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.flush_seconds = flush_seconds
+        self.clock = clock
+        self.metrics = metrics or default_metrics
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Keys with embedded queries, by scope, for the semantic tier
+        self.scopes: Dict[str, Dict[str, np.ndarray]] = {}
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tokens_saved = 0
+        self.lock = threading.Lock()
+        self.pending: Dict[str, Change] = {}  # added or evicted since the last flush
+        self.writes = 0
+        self.flush_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.flusher: Optional[threading.Thread] = None
+        self.db: Optional[sqlite3.Connection] = None
+        if path:
+            self._open(path)
+        if self.db is not None:
+            self.flusher = threading.Thread(target=self._run, name="llm-cache-flush", daemon=True)
+            self.flusher.start()
+            atexit.register(self.close)
+
+    @property
+    def semantic(self) -> bool:
+        return self.similarity_threshold is not None
+
+    def _open(self, path: str):
+        try:
+            self.db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, scope TEXT NOT NULL, query TEXT NOT NULL, response TEXT NOT NULL, "
+                "tokens INTEGER NOT NULL, expires_at REAL NOT NULL, vector BLOB)"
+            )
+            self.db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (self.clock(),))
+            rows = self.db.execute(
+                "SELECT key, scope, query, response, tokens, expires_at, vector FROM llm_cache "
+                "ORDER BY expires_at DESC LIMIT ?", (self.max_entries,)
+            ).fetchall()
+            # Oldest first, so the LRU order roughly follows age
+            for key, scope, query, response, tokens, expires_at, vector in reversed(rows):
+                vector = np.frombuffer(vector, dtype=np.float32) if vector is not None else None
+                self._insert(key, _Entry(response, tokens, expires_at, scope, query, vector))
+        except Exception as e:
+            print(f"Error opening LLM cache {path}, caching in memory only: {str(e)}")
+            self.db = None
+
+    def get(self, key: str) -> Optional[str]:
+        """The cached response to exactly this request, or None"""
+        with self.lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self._hit(entry, semantic=False)
+            return entry.response
+
+    def get_similar(self, scope: str, query: str, vector: np.ndarray) -> Optional[str]:
+        """The cached response to the closest paraphrase of `query` in the same scope, or None"""
+        if not self.semantic:
+            return None
+        with self.lock:
+            candidates = self.scopes.get(scope)
+            if candidates:
+                keys = list(candidates)
+                scores = np.stack([candidates[key] for key in keys]) @ vector
+                numbers = _NUMBERS.findall(query)
+                for i in np.argsort(-scores):
+                    if scores[i] < self.similarity_threshold:
+                        break
+                    entry = self._live(keys[i])
+                    if entry is not None and _NUMBERS.findall(entry.query) == numbers:
+                        self.entries.move_to_end(keys[i])
+                        self._hit(entry, semantic=True)
+                        return entry.response
+            return None
+
+    def miss(self):
+        with self.lock:
+            self.misses += 1
+        self.metrics.increment("llm_cache.miss")
+
+    def put(self, key: str, scope: str, query: str, response: str, tokens: int,
+            vector: Optional[np.ndarray] = None):
+        """Cache a response, evicting the least recently used entries if full"""
+        entry = _Entry(response, tokens, self.clock() + self.ttl_seconds, scope, query, vector)
+        with self.lock:
+            self._insert(key, entry)
+            evicted = []
+            while len(self.entries) > self.max_entries:
+                evicted.append(self._remove(next(iter(self.entries))))
+                self.evictions += 1
+            if self.db is not None:
+                for evicted_key in evicted:
+                    self.pending[evicted_key] = None
+                self.pending[key] = (
+                    scope, query, response, tokens, entry.expires_at,
+                    vector.astype(np.float32).tobytes() if vector is not None else None
+                )
+
+    def flush(self):
+        """Write every entry added or evicted since the last flush, in one transaction"""
+        with self.flush_lock:
+            with self.lock:
+                if self.db is None or not self.pending:
+                    return
+                changes, self.pending = self.pending, {}
+            try:
+                self.db.execute("BEGIN")
+                try:
+                    self.db.executemany(
+                        "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(key, *change) for key, change in changes.items() if change is not None]
+                    )
+                    self.db.executemany(
+                        "DELETE FROM llm_cache WHERE key = ?",
+                        [(key,) for key, change in changes.items() if change is None]
+                    )
+                    self.db.execute("COMMIT")
+                except BaseException:
+                    self.db.execute("ROLLBACK")
+                    raise
+                with self.lock:
+                    self.writes += len(changes)
+            except Exception as e:
+                print(f"Error writing LLM cache: {str(e)}")
+                with self.lock:
+                    # Retry on the next flush unless a newer change superseded it
+                    for key, change in changes.items():
+                        self.pending.setdefault(key, change)
+
+    def _run(self):
+        while not self.stopped.wait(self.flush_seconds):
+            self.flush()
+
+    def _live(self, key: str) -> Optional[_Entry]:
+        """The unexpired entry for a key, dropping it if expired"""
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires_at <= self.clock():
+            self._remove(key)
+            return None
+        return entry
+
+    def _hit(self, entry: _Entry, semantic: bool):
+        if semantic:
+            self.semantic_hits += 1
+        else:
+            self.exact_hits += 1
+        self.tokens_saved += entry.tokens
+        self.metrics.increment("llm_cache.semantic_hit" if semantic else "llm_cache.exact_hit")
+        self.metrics.increment("llm_cache.tokens_saved", entry.tokens)
+
+    def _insert(self, key: str, entry: _Entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if entry.vector is not None:
+            self.scopes.setdefault(entry.scope, {})[key] = entry.vector
+
+    def _remove(self, key: str) -> str:
+        entry = self.entries.pop(key, None)
+        if entry is not None and entry.vector is not None:
+            candidates = self.scopes.get(entry.scope)
+            if candidates is not None:
+                candidates.pop(key, None)
+                if not candidates:
+                    del self.scopes[entry.scope]
+        return key
+
+    def stats(self) -> Dict:
+        """Hit rates per tier and the tokens the hits saved"""
+        with self.lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "tokens_saved": self.tokens_saved,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+                "pending": len(self.pending),
+                "writes": self.writes,
+            }
+
+    def close(self):
+        """Stop the flusher, write what is left and close the database"""
+        self.stopped.set()
+        if self.flusher is not None and self.flusher is not threading.current_thread():
+            self.flusher.join()
+        self.flush()
+        with self.flush_lock, self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+class CachingLLM(LLM):
+    """Wraps an LLM so repeated requests are answered from an LLMResponseCache.
+
+    Set it as `Settings.llm` and every ReAct agent's copy shares the cache.
+    A request's key covers the model, the normalized messages and the call's
+    keyword arguments (tool specs included), plus `state_version()` if given,
+    so answers that depend on outside state can be invalidated by bumping it.
+    ReAct prompts carry tool observations, so later reasoning steps miss
+    whenever a tool returns something new. Responses with tool calls or
+    other extra fields are passed through uncached.
+    """
+
+    llm: LLM = Field(description="The model whose responses are cached")
+    _cache: LLMResponseCache = PrivateAttr()
+    _embed_model: Optional[BaseEmbedding] = PrivateAttr(default=None)
+    _state_version: Optional[Callable[[], Any]] = PrivateAttr(default=None)
+
+    def __init__(self, llm: LLM, cache: Optional[LLMResponseCache] = None,
+                 embed_model: Optional[BaseEmbedding] = None,
+                 state_version: Optional[Callable[[], Any]] = None, **kwargs: Any):
+        super().__init__(llm=llm, system_prompt=llm.system_prompt, **kwargs)
+        self._cache = cache or LLMResponseCache()
+        self._embed_model = embed_model
+        self._state_version = state_version
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachingLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self.llm.metadata
+
+    @property
+    def cache(self) -> LLMResponseCache:
+        return self._cache
+
+    def _model(self) -> LLM:
+        """The wrapped model, with this wrapper's system prompt (agents set their own on a copy)"""
+        if self.llm.system_prompt != self.system_prompt:
+            llm = self.llm.copy()
+            llm.system_prompt = self.system_prompt
+            self.llm = llm
+        return self.llm
+
+    def _request(self, messages: Sequence[ChatMessage], kwargs: Dict, mode: str) -> Tuple[str, str, str]:
+        """(key, scope, query) of a request; the query is the last message if the user sent it"""
+        context = [
+            self.llm.class_name(), self.metadata.model_name, mode, _normalize(self.system_prompt or ""),
+            json.dumps(kwargs, sort_keys=True, default=repr),
+            repr(self._state_version()) if self._state_version else "",
+        ]
+        context.extend(f"{message.role.value}:{_normalize(message.content or '')}" for message in messages[:-1])
+        query = ""
+        if messages:
+            last = _normalize(messages[-1].content or "")
+            if messages[-1].role == MessageRole.USER:
+                query = last
+            else:
+                context.append(f"{messages[-1].role.value}:{last}")
+        scope = _digest(*context)
+        return _digest(scope, query), scope, query
+
+    def _vector(self, query: str) -> Optional[np.ndarray]:
+        if not (self._cache.semantic and query):
+            return None
+        try:
+            return self._unit(self._embedder().get_query_embedding(query))
+        except Exception as e:
+            print(f"Error embedding LLM cache query: {str(e)}")
+            return None
+
+    async def _avector(self, query: str) -> Optional[np.ndarray]:
+        if not (self._cache.semantic and query):
+            return None
+        try:
+            return self._unit(await self._embedder().aget_query_embedding(query))
+        except Exception as e:
+            print(f"Error embedding LLM cache query: {str(e)}")
+            return None
+
+    def _embedder(self) -> BaseEmbedding:
+        if self._embed_model is None:
+            from llama_index.core import Settings
+            return Settings.embed_model
+        return self._embed_model
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _lookup(self, key: str, scope: str, query: str, vector: Optional[np.ndarray]) -> Optional[str]:
+        cached = self._cache.get(key)
+        if cached is None and vector is not None:
+            cached = self._cache.get_similar(scope, query, vector)
+        if cached is None:
+            self._cache.miss()
+        return cached
+
+    def _store(self, key: str, scope: str, query: str, vector: Optional[np.ndarray], prompt: str,
+               text: Optional[str], raw: Any, additional_kwargs: Dict):
+        if text and not additional_kwargs:
+            self._cache.put(key, scope, query, text, _usage_tokens(raw, prompt, text), vector)
+
+    @staticmethod
+    def _prompt(messages: Sequence[ChatMessage]) -> str:
+        return "\n".join(message.content or "" for message in messages)
+
+    @staticmethod
+    def _chat_response(text: str) -> ChatResponse:
+        return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=text), delta=text)
+
+    def _chat_request(self, messages: Sequence[ChatMessage], kwargs: Dict):
+        key, scope, query = self._request(messages, kwargs, "chat")
+        return key, scope, query, self._prompt(messages)
+
+    def _complete_request(self, prompt: str, formatted: bool, kwargs: Dict):
+        messages = [ChatMessage(role=MessageRole.USER, content=prompt)]
+        key, scope, query = self._request(messages, kwargs, f"complete:{formatted}")
+        return key, scope, query, prompt
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        key, scope, query, prompt = self._chat_request(messages, kwargs)
+        vector = self._vector(query)
+        cached = self._lookup(key, scope, query, vector)
+        if cached is not None:
+            return self._chat_response(cached)
+        response = self._model().chat(messages, **kwargs)
+        self._store(key, scope, query, vector, prompt, response.message.content, response.raw,
+                    response.message.additional_kwargs)
+        return response
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        key, scope, query, prompt = self._chat_request(messages, kwargs)
+        vector = await self._avector(query)
+        cached = self._lookup(key, scope, query, vector)
+        if cached is not None:
+            return self._chat_response(cached)
+        response = await self._model().achat(messages, **kwargs)
+        self._store(key, scope, query, vector, prompt, response.message.content, response.raw,
+                    response.message.additional_kwargs)
+        return response
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        key, scope, query, prompt = self._chat_request(messages, kwargs)
+        vector = self._vector(query)
+        cached = self._lookup(key, scope, query, vector)
+
+        def gen() -> ChatResponseGen:
+            if cached is not None:
+                yield self._chat_response(cached)
+                return
+            last = None
+            for last in self._model().stream_chat(messages, **kwargs):
+                yield last
+            if last is not None:
+                self._store(key, scope, query, vector, prompt, last.message.content, last.raw,
+                            last.message.additional_kwargs)
+
+        return gen()
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        key, scope, query, prompt = self._chat_request(messages, kwargs)
+        vector = await self._avector(query)
+        cached = self._lookup(key, scope, query, vector)
+
+        async def gen() -> ChatResponseAsyncGen:
+            if cached is not None:
+                yield self._chat_response(cached)
+                return
+            last = None
+            async for last in await self._model().astream_chat(messages, **kwargs):
+                yield last
+            if last is not None:
+                self._store(key, scope, query, vector, prompt, last.message.content, last.raw,
+                            last.message.additional_kwargs)
+
+        return gen()
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        key, scope, query, prompt_text = self._complete_request(prompt, formatted, kwargs)
+        vector = self._vector(query)
+        cached = self._lookup(key, scope, query, vector)
+        if cached is not None:
+            return CompletionResponse(text=cached, delta=cached)
+        response = self._model().complete(prompt, formatted=formatted, **kwargs)
+        self._store(key, scope, query, vector, prompt_text, response.text, response.raw,
+                    response.additional_kwargs)
+        return response
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        key, scope, query, prompt_text = self._complete_request(prompt, formatted, kwargs)
+        vector = await self._avector(query)
+        cached = self._lookup(key, scope, query, vector)
+        if cached is not None:
+            return CompletionResponse(text=cached, delta=cached)
+        response = await self._model().acomplete(prompt, formatted=formatted, **kwargs)
+        self._store(key, scope, query, vector, prompt_text, response.text, response.raw,
+                    response.additional_kwargs)
+        return response
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        key, scope, query, prompt_text = self._complete_request(prompt, formatted, kwargs)
+        vector = self._vector(query)
+        cached = self._lookup(key, scope, query, vector)
+
+        def gen() -> CompletionResponseGen:
+            if cached is not None:
+                yield CompletionResponse(text=cached, delta=cached)
+                return
+            last = None
+            for last in self._model().stream_complete(prompt, formatted=formatted, **kwargs):
+                yield last
+            if last is not None:
+                self._store(key, scope, query, vector, prompt_text, last.text, last.raw, last.additional_kwargs)
+
+        return gen()
+
+    async def astream_complete(self, prompt: str, formatted: bool = False,
+                               **kwargs: Any) -> CompletionResponseAsyncGen:
+        key, scope, query, prompt_text = self._complete_request(prompt, formatted, kwargs)
+        vector = await self._avector(query)
+        cached = self._lookup(key, scope, query, vector)
+
+        async def gen() -> CompletionResponseAsyncGen:
+            if cached is not None:
+                yield CompletionResponse(text=cached, delta=cached)
+                return
+            last = None
+            async for last in await self._model().astream_complete(prompt, formatted=formatted, **kwargs):
+                yield last
+            if last is not None:
+                self._store(key, scope, query, vector, prompt_text, last.text, last.raw, last.additional_kwargs)
+
+        return gen()
@@ -0,0 +1,481 @@
+# utils/llm_gateway.py
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+)
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms.llm import LLM
+from config_file import Config
+from admission import Overloaded
+from deadline import remaining
+from metrics import MetricsRegistry, metrics as default_metrics
+
+INTERACTIVE, BACKGROUND = 0, 1
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+@contextmanager
+def background() -> Iterator[None]:
+    """Run LLM and embedding calls made in the block, and in tasks started from it, as background work"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def _on_event_loop() -> bool:
+    """Whether this thread is running an event loop, so blocking it would stall its coroutines"""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt, about 4 characters a token"""
+    return len(text) // 4 + 1
+
+def reported_tokens(raw: Any) -> Optional[int]:
+    """Total tokens a provider reported for a response, if it did"""
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    total = usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
+    return total if isinstance(total, int) else None
+
+class Reservation:
+    """Tokens held for one call; set `used` once the real count is known"""
+
+    __slots__ = ("tokens", "used")
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.used: Optional[int] = None
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "granted", "loop", "future", "event")
+
+    def __init__(self, priority: int, seq: int, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.granted = False
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional[asyncio.Future] = None
+        self.event: Optional[threading.Event] = None
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class LLMGateway:
+    """Process-wide gate in front of the LLM provider, shared by every agent and event loop.
+
+    At most `max_concurrent` calls run at once, and background work never
+    holds the last `interactive_reserve` of them. Each call reserves its
+    estimated tokens from a tokens-per-minute bucket and settles up with
+    the real count when it finishes. Callers wait in priority order,
+    interactive turns first and FIFO within a priority, until both a slot
+    and their tokens are free; a wait longer than `queue_timeout` (or the
+    turn's deadline) raises Overloaded.
+    """
+
+    def __init__(self, max_concurrent: int = Config.LLM_MAX_CONCURRENT,
+                 interactive_reserve: int = Config.LLM_INTERACTIVE_RESERVE,
+                 tokens_per_minute: int = Config.LLM_TOKENS_PER_MINUTE,
+                 queue_timeout: float = Config.LLM_QUEUE_TIMEOUT_SECONDS,
+                 clock: Callable[[], float] = time.monotonic,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.max_concurrent = max_concurrent
+        self.interactive_reserve = min(interactive_reserve, max_concurrent - 1)
+        self.tokens_per_minute = tokens_per_minute
+        self.queue_timeout = queue_timeout
+        self.clock = clock
+        self.metrics = metrics or default_metrics
+
+        self.in_flight = 0
+        self.tokens = float(tokens_per_minute)
+        self.refilled_at = clock()
+        self.waiters: List[_Waiter] = []
+        self.sequence = itertools.count()
+        self.refill_timer: Optional[threading.Timer] = None
+        self.calls = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.waited = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.tokens_used = 0
+        self.lock = threading.Lock()
+
+    @asynccontextmanager
+    async def slot(self, tokens: int, priority: Optional[int] = None) -> AsyncIterator[Reservation]:
+        """Hold one call's slot and tokens for the block"""
+        reservation = Reservation(tokens)
+        await self._acquire(tokens, _priority.get() if priority is None else priority)
+        try:
+            yield reservation
+        finally:
+            self._release(reservation)
+
+    @contextmanager
+    def sync_slot(self, tokens: int, priority: Optional[int] = None) -> Iterator[Reservation]:
+        """Like slot(), for calls made from plain threads.
+
+        A blocking call made on an event loop's thread (e.g. a sync model call
+        inside a coroutine on the background loop) gets a slot only if one is
+        free right away; otherwise it raises Overloaded at once rather than
+        stall every turn queued on that loop while it waits.
+        """
+        reservation = Reservation(tokens)
+        self._acquire_sync(tokens, _priority.get() if priority is None else priority)
+        try:
+            yield reservation
+        finally:
+            self._release(reservation)
+
+    def _enqueue(self, tokens: int, priority: int) -> _Waiter:
+        waiter = _Waiter(priority, next(self.sequence), tokens)
+        heapq.heappush(self.waiters, waiter)
+        self._grant()
+        if not waiter.granted:
+            self.waited[priority] += 1
+            self.metrics.increment(f"llm_gateway.{_PRIORITY_NAMES[priority]}.queued")
+        return waiter
+
+    async def _acquire(self, tokens: int, priority: int):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            waiter = self._enqueue(tokens, priority)
+            if waiter.granted:
+                return
+            waiter.loop, waiter.future = loop, loop.create_future()
+        try:
+            await asyncio.wait_for(waiter.future, remaining(self.queue_timeout))
+        except BaseException as e:
+            with self.lock:
+                granted = waiter.granted
+                if not granted:
+                    self._withdraw(waiter)
+            # A slot handed over just as the wait ended goes back, unused
+            if granted:
+                unused = Reservation(tokens)
+                unused.used = 0
+                self._release(unused)
+            if isinstance(e, asyncio.TimeoutError):
+                self.metrics.increment("llm_gateway.rejected")
+                raise Overloaded("llm gateway: timed out waiting for capacity") from e
+            raise
+
+    def _acquire_sync(self, tokens: int, priority: int):
+        with self.lock:
+            waiter = self._enqueue(tokens, priority)
+            if waiter.granted:
+                return
+            if _on_event_loop():
+                self._withdraw(waiter)
+                self.metrics.increment("llm_gateway.rejected")
+                raise Overloaded("llm gateway: no capacity for a blocking call on an event loop thread")
+            waiter.event = threading.Event()
+        if not waiter.event.wait(remaining(self.queue_timeout)):
+            with self.lock:
+                if not waiter.granted:
+                    self._withdraw(waiter)
+                    self.metrics.increment("llm_gateway.rejected")
+                    raise Overloaded("llm gateway: timed out waiting for capacity")
+
+    def _withdraw(self, waiter: _Waiter):
+        """Drop a waiter that gave up (lock held); the line behind it may now fit"""
+        self.waiters.remove(waiter)
+        heapq.heapify(self.waiters)
+        self._grant()
+
+    def _release(self, reservation: Reservation):
+        used = reservation.tokens if reservation.used is None else reservation.used
+        with self.lock:
+            self.in_flight -= 1
+            self.tokens += reservation.tokens - used
+            self.tokens_used += used
+            self._grant()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.tokens_per_minute,
+                          self.tokens + (now - self.refilled_at) * self.tokens_per_minute / 60.0)
+        self.refilled_at = now
+
+    def _grant(self):
+        """Start every waiter at the front of the line that fits (lock held)"""
+        self._refill()
+        while self.waiters:
+            waiter = self.waiters[0]
+            limit = self.max_concurrent - (self.interactive_reserve if waiter.priority == BACKGROUND else 0)
+            if self.in_flight >= limit:
+                return
+            # A call bigger than the whole budget waits for a full bucket, not forever
+            needed = min(waiter.tokens, self.tokens_per_minute)
+            if self.tokens < needed:
+                self._schedule_refill((needed - self.tokens) * 60.0 / self.tokens_per_minute)
+                return
+            heapq.heappop(self.waiters)
+            self.in_flight += 1
+            self.tokens -= waiter.tokens
+            self.calls[waiter.priority] += 1
+            waiter.granted = True
+            if waiter.event is not None:
+                waiter.event.set()
+            elif waiter.future is not None and not waiter.loop.is_closed():
+                waiter.loop.call_soon_threadsafe(self._deliver, waiter.future)
+
+    @staticmethod
+    def _deliver(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+    def _schedule_refill(self, delay: float):
+        """Wake the line once enough tokens have accrued (lock held)"""
+        if self.refill_timer is not None and self.refill_timer.is_alive():
+            return
+        self.refill_timer = threading.Timer(delay, self._on_refill)
+        self.refill_timer.daemon = True
+        self.refill_timer.start()
+
+    def _on_refill(self):
+        with self.lock:
+            self.refill_timer = None
+            self._grant()
+
+    def stats(self) -> Dict:
+        """Calls started and queued per priority, slots in use and the token budget left"""
+        with self.lock:
+            self._refill()
+            return {
+                "in_flight": self.in_flight,
+                "waiting": len(self.waiters),
+                "calls": {_PRIORITY_NAMES[p]: count for p, count in self.calls.items()},
+                "queued": {_PRIORITY_NAMES[p]: count for p, count in self.waited.items()},
+                "tokens_available": int(self.tokens),
+                "tokens_used": self.tokens_used,
+            }
+
+# Process-wide gateway
+gateway = LLMGateway()
+
+class GatewayLLM(LLM):
+    """Wraps an LLM so every call goes through an LLMGateway.
+
+    A call reserves its prompt's estimated tokens plus `num_output` (or its
+    `max_tokens`), and settles with the provider's reported usage.
+    Streaming calls hold their slot until the stream is exhausted or closed.
+    """
+
+    llm: LLM = Field(description="The model behind the gateway")
+    _gateway: LLMGateway = PrivateAttr()
+
+    def __init__(self, llm: LLM, llm_gateway: Optional[LLMGateway] = None, **kwargs: Any):
+        super().__init__(llm=llm, system_prompt=llm.system_prompt, **kwargs)
+        self._gateway = llm_gateway or gateway
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "GatewayLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self.llm.metadata
+
+    def _model(self) -> LLM:
+        """The wrapped model, with this wrapper's system prompt (agents set their own on a copy)"""
+        if self.llm.system_prompt != self.system_prompt:
+            llm = self.llm.copy()
+            llm.system_prompt = self.system_prompt
+            self.llm = llm
+        return self.llm
+
+    def _tokens(self, prompt: str, kwargs: Dict) -> int:
+        return estimate_tokens(prompt) + (kwargs.get("max_tokens") or self.metadata.num_output)
+
+    @staticmethod
+    def _chat_prompt(messages: Sequence[ChatMessage]) -> str:
+        return "\n".join(message.content or "" for message in messages)
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        with self._gateway.sync_slot(self._tokens(self._chat_prompt(messages), kwargs)) as reservation:
+            response = self._model().chat(messages, **kwargs)
+            reservation.used = reported_tokens(response.raw)
+            return response
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        async with self._gateway.slot(self._tokens(self._chat_prompt(messages), kwargs)) as reservation:
+            response = await self._model().achat(messages, **kwargs)
+            reservation.used = reported_tokens(response.raw)
+            return response
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        tokens = self._tokens(self._chat_prompt(messages), kwargs)
+
+        def gen() -> ChatResponseGen:
+            with self._gateway.sync_slot(tokens) as reservation:
+                for chunk in self._model().stream_chat(messages, **kwargs):
+                    reservation.used = reported_tokens(chunk.raw) or reservation.used
+                    yield chunk
+
+        return gen()
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        tokens = self._tokens(self._chat_prompt(messages), kwargs)
+
+        async def gen() -> ChatResponseAsyncGen:
+            async with self._gateway.slot(tokens) as reservation:
+                async for chunk in await self._model().astream_chat(messages, **kwargs):
+                    reservation.used = reported_tokens(chunk.raw) or reservation.used
+                    yield chunk
+
+        return gen()
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        with self._gateway.sync_slot(self._tokens(prompt, kwargs)) as reservation:
+            response = self._model().complete(prompt, formatted=formatted, **kwargs)
+            reservation.used = reported_tokens(response.raw)
+            return response
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        async with self._gateway.slot(self._tokens(prompt, kwargs)) as reservation:
+            response = await self._model().acomplete(prompt, formatted=formatted, **kwargs)
+            reservation.used = reported_tokens(response.raw)
+            return response
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        tokens = self._tokens(prompt, kwargs)
+
+        def gen() -> CompletionResponseGen:
+            with self._gateway.sync_slot(tokens) as reservation:
+                for chunk in self._model().stream_complete(prompt, formatted=formatted, **kwargs):
+                    reservation.used = reported_tokens(chunk.raw) or reservation.used
+                    yield chunk
+
+        return gen()
+
+    async def astream_complete(self, prompt: str, formatted: bool = False,
+                               **kwargs: Any) -> CompletionResponseAsyncGen:
+        tokens = self._tokens(prompt, kwargs)
+
+        async def gen() -> CompletionResponseAsyncGen:
+            async with self._gateway.slot(tokens) as reservation:
+                async for chunk in await self._model().astream_complete(prompt, formatted=formatted, **kwargs):
+                    reservation.used = reported_tokens(chunk.raw) or reservation.used
+                    yield chunk
+
+        return gen()
+
+class GatewayEmbedding(BaseEmbedding):
+    """Wraps an embedding model so calls go through an LLMGateway, micro-batched.
+
+    Single text embeddings requested concurrently on one event loop are
+    collected for up to `EMBED_BATCH_WINDOW_SECONDS`, or until
+    `embed_batch_size` are waiting, and sent as one batch call. A batch runs
+    as interactive work if any of its requests is interactive. Query
+    embeddings, which some models compute differently, go one at a time.
+    """
+
+    embed_model: BaseEmbedding = Field(description="The embedding model behind the gateway")
+    _gateway: LLMGateway = PrivateAttr()
+    _window: float = PrivateAttr()
+    _pending: Dict[asyncio.AbstractEventLoop, List[Tuple[str, asyncio.Future, int]]] = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _batches: int = PrivateAttr(default=0)
+    _batched_texts: int = PrivateAttr(default=0)
+
+    def __init__(self, embed_model: BaseEmbedding, llm_gateway: Optional[LLMGateway] = None,
+                 batch_size: int = Config.EMBED_BATCH_SIZE,
+                 window_seconds: float = Config.EMBED_BATCH_WINDOW_SECONDS, **kwargs: Any):
+        super().__init__(embed_model=embed_model, model_name=embed_model.model_name,
+                         embed_batch_size=batch_size, **kwargs)
+        self._gateway = llm_gateway or gateway
+        self._window = window_seconds
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "GatewayEmbedding"
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        with self._gateway.sync_slot(estimate_tokens(query)):
+            return self.embed_model.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        async with self._gateway.slot(estimate_tokens(query)):
+            return await self.embed_model.aget_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        with self._gateway.sync_slot(sum(estimate_tokens(text) for text in texts)):
+            return self.embed_model.get_text_embedding_batch(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        async with self._gateway.slot(sum(estimate_tokens(text) for text in texts)):
+            return await self.embed_model.aget_text_embedding_batch(texts)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            batch = self._pending.setdefault(loop, [])
+            batch.append((text, future, _priority.get()))
+            if len(batch) >= self.embed_batch_size:
+                loop.create_task(self._send(self._pending.pop(loop)))
+            elif len(batch) == 1:
+                loop.call_later(self._window, self._flush, loop)
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop):
+        """Send whatever is waiting on this loop once the batch window closes"""
+        with self._lock:
+            batch = self._pending.pop(loop, None)
+        if batch:
+            loop.create_task(self._send(batch))
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future, int]]):
+        """Embed a batch in one call and hand each caller its vector"""
+        texts = [text for text, _, _ in batch]
+        priority = min(priority for _, _, priority in batch)
+        try:
+            async with self._gateway.slot(sum(estimate_tokens(text) for text in texts), priority):
+                vectors = await self.embed_model.aget_text_embedding_batch(texts)
+        except BaseException as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    if isinstance(e, Exception):
+                        future.set_exception(e)
+                    else:
+                        future.cancel()
+            if not isinstance(e, Exception):
+                raise
+            return
+        with self._lock:
+            self._batches += 1
+            self._batched_texts += len(texts)
+        for (_, future, _), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self) -> Dict:
+        """Batches sent and their average size"""
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "texts": self._batched_texts,
+                "mean_batch": self._batched_texts / self._batches if self._batches else 0.0,
+            }
@@ -0,0 +1,102 @@
+# utils/metrics.py
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+class LatencyHistogram:
+    """Latency histogram over fixed log-spaced buckets.
+
+    Memory is constant however many samples are recorded; percentiles are
+    reported as the upper bound of the bucket they fall in, i.e. within
+    `growth` (25% by default) of the true value.
+    """
+
+    def __init__(self, min_seconds: float = 1e-4, max_seconds: float = 100.0, growth: float = 1.25):
+        buckets = math.ceil(math.log(max_seconds / min_seconds) / math.log(growth))
+        self.bounds: List[float] = [min_seconds * growth ** i for i in range(buckets + 1)]
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct: float) -> float:
+        """Approximate nearest-rank percentile in seconds"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+class MetricsRegistry:
+    """Named latency histograms and counters, safe to share between threads"""
+
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float):
+        """Record one latency sample"""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def increment(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Time a block into the named histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Dict]:
+        """Summaries of every histogram (and counter) whose name starts with `prefix`"""
+        with self.lock:
+            return {
+                "histograms": {
+                    name: histogram.summary() for name, histogram in sorted(self.histograms.items())
+                    if name.startswith(prefix)
+                },
+                "counters": {
+                    name: value for name, value in sorted(self.counters.items())
+                    if name.startswith(prefix)
+                },
+            }
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+# Process-wide registry
+metrics = MetricsRegistry()
@@ -1,55 +1,90 @@
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from itertools import islice
+import os
+from typing import Callable, Dict, List, Optional
 import json
+import threading
+from booking_stats import BookingStatsStore
+from catalog import ColumnarCatalog
+from catalog_snapshot import open_snapshot
+from config_file import Config
+from search_index import TrigramIndex
 
 class MockDatabase:
     def __init__(self):
-        self.movies = {}
+        # One database serves every session thread; bookings and other
+        # writes hold this lock so seat checks and updates stay atomic
+        self.lock = threading.RLock()
+        self.catalog = ColumnarCatalog()
+        self.movies = self.catalog
         self.theaters = {}
         self.showtimes = {}
         self.seats = {}
+        # Bumped whenever a showtime's seats change, so sessions can tell
+        # whether the seat map they showed is still current
+        self.seat_versions: Dict[str, int] = {}
+        # Bumped whenever movies are added or imported, so indexes derived
+        # from the catalog can tell they need rebuilding
+        self.catalog_version = 0
         self.bookings = {}
         self.user_preferences = {}
+        self.showtime_index = {}
+        self.booking_stats = BookingStatsStore()
+        self.search_index = TrigramIndex()
+        self.booking_listeners: List[Callable[[str, Dict], None]] = []
         self._initialize_mock_data()
     
     def _initialize_mock_data(self):
         """Initialize mock data for testing"""
-        # Mock movies data
-        self.movies = {
-            "tt1375666": {
-                "id": "tt1375666",
-                "title": "Inception",
-                "year": "2010",
-                "genre": "Action, Adventure, Sci-Fi",
-                "director": "Christopher Nolan",
-                "actors": "Leonardo DiCaprio, Joseph Gordon-Levitt, Ellen Page",
-                "plot": "A thief who steals corporate secrets through dream-sharing technology is given the inverse task of planting an idea into the mind of a C.E.O.",
-                "rating": "8.8",
-                "poster": "https://example.com/inception.jpg"
-            },
-            "tt0468569": {
-                "id": "tt0468569",
-                "title": "The Dark Knight",
-                "year": "2008",
-                "genre": "Action, Crime, Drama",
-                "director": "Christopher Nolan",
-                "actors": "Christian Bale, Heath Ledger, Aaron Eckhart",
-                "plot": "When the menace known as the Joker wreaks havoc and chaos on the people of Gotham, Batman must accept one of the greatest psychological and physical tests of his ability to fight injustice.",
-                "rating": "9.0",
-                "poster": "https://example.com/dark-knight.jpg"
-            },
-            "tt0111161": {
-                "id": "tt0111161",
-                "title": "The Shawshank Redemption",
-                "year": "1994",
-                "genre": "Drama",
-                "director": "Frank Darabont",
-                "actors": "Tim Robbins, Morgan Freeman",
-                "plot": "Two imprisoned men bond over a number of years, finding solace and eventual redemption through acts of common decency.",
-                "rating": "9.3",
-                "poster": "https://example.com/shawshank.jpg"
-            }
-        }
+        # A prebuilt snapshot (see catalog_snapshot.py) is mapped instead of rebuilding the catalog
+        snapshot = open_snapshot()
+        if snapshot is not None:
+            self.catalog = snapshot
+            self.search_index = snapshot.search_index()
+        else:
+            # Mock movies data
+            self.catalog = ColumnarCatalog.from_records([
+                {
+                    "id": "tt1375666",
+                    "title": "Inception",
+                    "year": "2010",
+                    "genre": "Action, Adventure, Sci-Fi",
+                    "director": "Christopher Nolan",
+                    "actors": "Leonardo DiCaprio, Joseph Gordon-Levitt, Ellen Page",
+                    "plot": "A thief who steals corporate secrets through dream-sharing technology is given the inverse task of planting an idea into the mind of a C.E.O.",
+                    "rating": "8.8",
+                    "poster": "https://example.com/inception.jpg"
+                },
+                {
+                    "id": "tt0468569",
+                    "title": "The Dark Knight",
+                    "year": "2008",
+                    "genre": "Action, Crime, Drama",
+                    "director": "Christopher Nolan",
+                    "actors": "Christian Bale, Heath Ledger, Aaron Eckhart",
+                    "plot": "When the menace known as the Joker wreaks havoc and chaos on the people of Gotham, Batman must accept one of the greatest psychological and physical tests of his ability to fight injustice.",
+                    "rating": "9.0",
+                    "poster": "https://example.com/dark-knight.jpg"
+                },
+                {
+                    "id": "tt0111161",
+                    "title": "The Shawshank Redemption",
+                    "year": "1994",
+                    "genre": "Drama",
+                    "director": "Frank Darabont",
+                    "actors": "Tim Robbins, Morgan Freeman",
+                    "plot": "Two imprisoned men bond over a number of years, finding solace and eventual redemption through acts of common decency.",
+                    "rating": "9.3",
+                    "poster": "https://example.com/shawshank.jpg"
+                }
+            ])
+            if Config.MOVIE_CATALOG_PATH and os.path.exists(Config.MOVIE_CATALOG_PATH):
+                self.catalog.import_file(Config.MOVIE_CATALOG_PATH)
+
+            for movie in self.catalog.values():
+                self.search_index.add_movie(movie)
+
+        self.movies = self.catalog
 
         # Mock theaters
         self.theaters = {
@@ -60,11 +95,12 @@ class MockDatabase:
         
         # Mock showtimes - now with movie references
         current_date = datetime.now()
+        movie_ids = list(islice(self.movies, 4))
         for theater_id in self.theaters:
             self.showtimes[theater_id] = [
                 {
                     "id": f"st_{theater_id}_{i}",
-                    "movie_id": list(self.movies.keys())[i % len(self.movies)],  # Rotate through movies
+                    "movie_id": movie_ids[i % len(movie_ids)],  # Rotate through movies
                     "time": (current_date + timedelta(hours=i)).strftime("%H:%M"),
                     "date": current_date.strftime("%Y-%m-%d"),
                     "price": 12.99
@@ -76,6 +112,7 @@ class MockDatabase:
         for theater_id, shows in self.showtimes.items():
             for show in shows:
                 self.seats[show["id"]] = self._create_empty_seat_map()
+                self.showtime_index[show["id"]] = (theater_id, show)
 
     def _create_empty_seat_map(self) -> Dict:
         """Create an empty seat map with 8 rows and 10 seats per row"""
@@ -90,10 +127,47 @@ class MockDatabase:
         """Get all movies in the database"""
         return list(self.movies.values())
 
+    async def filter_movies(self, genres: Optional[List[str]] = None,
+                            actors: Optional[List[str]] = None,
+                            year_from: Optional[int] = None, year_to: Optional[int] = None,
+                            min_rating: Optional[float] = None,
+                            limit: Optional[int] = None) -> List[Dict]:
+        """Vectorized catalog filter, best rated first"""
+        return self.catalog.filter(genres, actors, year_from, year_to, min_rating, limit)
+
     async def get_movie_details(self, movie_id: str) -> Optional[Dict]:
         """Get detailed movie information"""
         return self.movies.get(movie_id)
 
+    async def search_movies(self, query: str, limit: int = 5,
+                            min_score: float = Config.LOCAL_SEARCH_MIN_SCORE) -> List[Dict]:
+        """Ranked fuzzy search over titles, genres, directors and actors"""
+        return [
+            self.movies[movie_id]
+            for movie_id, _ in self.search_index.search(query, limit, min_score)
+            if movie_id in self.movies
+        ]
+
+    def add_movie(self, movie: Dict):
+        """Add or replace a movie and index it for search"""
+        with self.lock:
+            self.catalog.add(movie)
+            self.search_index.add_movie(movie)
+            self.catalog_version += 1
+
+    def import_movies(self, path: str) -> int:
+        """Bulk import a CSV/TSV movie dump into the catalog and search index"""
+        try:
+            with self.lock:
+                movie_ids = self.catalog.import_file(path)
+                for movie_id in movie_ids:
+                    self.search_index.add_movie(self.catalog[movie_id])
+                self.catalog_version += 1
+            return len(movie_ids)
+        except Exception as e:
+            print(f"Error importing movies: {str(e)}")
+            return 0
+
     async def get_user_preferences(self, user_id: str) -> Optional[Dict]:
         """Get user preferences"""
         return self.user_preferences.get(user_id)
@@ -101,7 +175,8 @@ class MockDatabase:
     async def update_user_preferences(self, user_id: str, preferences: Dict) -> bool:
         """Update user preferences"""
         try:
-            self.user_preferences[user_id] = preferences
+            with self.lock:
+                self.user_preferences[user_id] = preferences
             return True
         except Exception as e:
             print(f"Error updating preferences: {str(e)}")
@@ -109,19 +184,21 @@ class MockDatabase:
 
     async def get_user_bookings(self, user_id: str) -> List[Dict]:
         """Get user's booking history"""
-        return [
-            booking for booking in self.bookings.values()
-            if booking["user_id"] == user_id
-        ]
+        with self.lock:
+            return [
+                booking for booking in self.bookings.values()
+                if booking["user_id"] == user_id
+            ]
 
     async def get_recent_bookings(self, limit: int = 50) -> List[Dict]:
         """Get recent bookings"""
-        sorted_bookings = sorted(
-            self.bookings.values(),
-            key=lambda x: x["created_at"],
-            reverse=True
-        )
-        return sorted_bookings[:limit]
+        with self.lock:
+            sorted_bookings = sorted(
+                self.bookings.values(),
+                key=lambda x: x["created_at"],
+                reverse=True
+            )
+            return sorted_bookings[:limit]
     
     async def get_theaters(self) -> List[Dict]:
         """Get all theaters"""
@@ -134,32 +211,112 @@ class MockDatabase:
     async def get_available_seats(self, showtime_id: str) -> Dict:
         """Get available seats for a showtime"""
         return self.seats.get(showtime_id, {})
+
+    async def get_showtime(self, showtime_id: str) -> Optional[Dict]:
+        """Get a showtime (with its theater_id) by ID"""
+        theater_id, show = self.showtime_index.get(showtime_id, (None, None))
+        if show is None:
+            return None
+        return {**show, "theater_id": theater_id}
+
+    def get_seat_version(self, showtime_id: str) -> int:
+        """Change counter of a showtime's seat map"""
+        return self.seat_versions.get(showtime_id, 0)
     
     async def create_booking(self, user_id: str, showtime_id: str, seats: List[str]) -> Optional[str]:
         """Create a new booking"""
-        booking_id = f"bk_{len(self.bookings) + 1}"
-        showtime_seats = self.seats.get(showtime_id, {})
+        with self.lock:
+            booking_id = f"bk_{len(self.bookings) + 1}"
+            showtime_seats = self.seats.get(showtime_id, {})
         
-        # Check if seats are available
-        for seat in seats:
-            if seat not in showtime_seats or showtime_seats[seat]["status"] != "available":
-                return None
+            # Check if seats are available
+            for seat in seats:
+                if seat not in showtime_seats or showtime_seats[seat]["status"] != "available":
+                    return None
         
-        # Mark seats as booked
-        for seat in seats:
-            showtime_seats[seat]["status"] = "booked"
+            # Mark seats as booked
+            for seat in seats:
+                showtime_seats[seat]["status"] = "booked"
+            self.seat_versions[showtime_id] = self.seat_versions.get(showtime_id, 0) + 1
         
-        # Create booking record
-        self.bookings[booking_id] = {
-            "user_id": user_id,
-            "showtime_id": showtime_id,
-            "seats": seats,
-            "status": "confirmed",
-            "created_at": datetime.now().isoformat()
-        }
+            # Create booking record
+            theater_id, show = self.showtime_index.get(showtime_id, (None, {}))
+            self.bookings[booking_id] = {
+                "id": booking_id,
+                "user_id": user_id,
+                "showtime_id": showtime_id,
+                "theater_id": theater_id,
+                "movie_id": show.get("movie_id"),
+                "date": show.get("date"),
+                "time": show.get("time"),
+                "seats": seats,
+                "total_price": sum(float(showtime_seats[seat]["price"]) for seat in seats),
+                "status": "confirmed",
+                "created_at": datetime.now().isoformat()
+            }
+            self._update_booking_stats(self.bookings[booking_id], 1)
+            self._notify_booking_listeners("created", self.bookings[booking_id])
         
-        return booking_id
+            return booking_id
+    
+    async def cancel_booking(self, booking_id: str) -> bool:
+        """Cancel a booking and release its seats"""
+        with self.lock:
+            booking = self.bookings.get(booking_id)
+            if not booking or booking["status"] != "confirmed":
+                return False
+        
+            showtime_seats = self.seats.get(booking["showtime_id"], {})
+            for seat in booking["seats"]:
+                if seat in showtime_seats:
+                    showtime_seats[seat]["status"] = "available"
+            showtime_id = booking["showtime_id"]
+            self.seat_versions[showtime_id] = self.seat_versions.get(showtime_id, 0) + 1
+        
+            booking["status"] = "cancelled"
+            self._update_booking_stats(booking, -1)
+            self._notify_booking_listeners("cancelled", booking)
+            return True
     
     async def get_booking(self, booking_id: str) -> Optional[Dict]:
         """Get booking details"""
         return self.bookings.get(booking_id)
+
+    async def get_user_booking_stats(self, user_id: str) -> Dict:
+        """Get precomputed booking-history aggregates for a user"""
+        with self.lock:
+            return self.booking_stats.get_analysis(user_id)
+
+    def rebuild_booking_stats(self) -> int:
+        """Backfill booking-history aggregates from all existing bookings"""
+        with self.lock:
+            return self.booking_stats.backfill(
+                self.bookings.values(), self.movies, self.theaters
+            )
+
+    def add_booking_listener(self, listener: Callable[[str, Dict], None]):
+        """Register a callback invoked with ("created"|"cancelled", booking)"""
+        with self.lock:
+            self.booking_listeners.append(listener)
+
+    def _notify_booking_listeners(self, event: str, booking: Dict):
+        """Publish a booking event to all registered listeners"""
+        for listener in self.booking_listeners:
+            try:
+                listener(event, booking)
+            except Exception as e:
+                print(f"Error in booking listener: {str(e)}")
+
+    def _update_booking_stats(self, booking: Dict, delta: int):
+        """Apply a created (delta=1) or cancelled (delta=-1) booking to the aggregates"""
+        update = (
+            self.booking_stats.record_booking if delta > 0
+            else self.booking_stats.remove_booking
+        )
+        update(
+            booking["user_id"],
+            self.movies.get(booking.get("movie_id")),
+            self.theaters.get(booking.get("theater_id"), {}).get("name", ""),
+            booking.get("time") or "",
+            booking.get("total_price", 0.0)
+        )
@@ -0,0 +1,58 @@
+# models/movie.py
+import sys
+from dataclasses import dataclass
+from typing import Dict, Union
+
+# (OMDB key, local database key) for every field we keep
+_FIELD_KEYS = {
+    "id": ("imdbID", "id"),
+    "title": ("Title", "title"),
+    "year": ("Year", "year"),
+    "genre": ("Genre", "genre"),
+    "director": ("Director", "director"),
+    "actors": ("Actors", "actors"),
+    "plot": ("Plot", "plot"),
+    "rating": ("imdbRating", "rating"),
+    "runtime": ("Runtime", "runtime"),
+    "poster": ("Poster", "poster"),
+}
+
+# Low-cardinality fields shared across many movies; interning them means
+# every Movie with the same genre list or director points at one string
+_INTERNED_FIELDS = {"year", "genre", "director", "actors", "rating", "runtime"}
+
+@dataclass(frozen=True)
+class Movie:
+    """Compact, immutable movie record shared by OMDB and local data"""
+
+    __slots__ = tuple(_FIELD_KEYS)
+
+    id: str
+    title: str
+    year: str
+    genre: str
+    director: str
+    actors: str
+    plot: str
+    rating: str
+    runtime: str
+    poster: str
+
+    @classmethod
+    def from_dict(cls, data: Union[Dict, "Movie"]) -> "Movie":
+        """Normalize an OMDB payload or MockDatabase record into a Movie"""
+        if isinstance(data, Movie):
+            return data
+
+        values = {}
+        for field, (omdb_key, local_key) in _FIELD_KEYS.items():
+            value = data.get(omdb_key, data.get(local_key))
+            if value is None or value == "":
+                value = "" if field in ("id", "poster") else "N/A"
+            value = str(value).strip()
+            values[field] = sys.intern(value) if field in _INTERNED_FIELDS else value
+        return cls(**values)
+
+    def to_dict(self) -> Dict[str, str]:
+        """Local database representation of the movie"""
+        return {field: getattr(self, field) for field in _FIELD_KEYS}
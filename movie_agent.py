@@ -1,18 +1,42 @@
 from llama_index.core.agent.react import ReActAgent
 from llama_index.core.tools import FunctionTool
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from functools import cached_property
+from typing import AsyncIterator, Iterable, List, Dict, Optional
 from omdb_client import OMDBClient
 from mockdb import MockDatabase
-from llama_index.core import Settings
+from agent_registry import build_react_agent
 from config_file import Config
+from movie import Movie
+from similarity import SimilarityIndex, rebuild_similarity_index
+from taste_vectors import CatalogVectorIndex, load_catalog_vectors
+from deadline import remaining
+from admission import Overloaded, admission
+import asyncio
+import threading
 
 class MovieAgent:
-    def __init__(self):
+    def __init__(self, db: Optional[MockDatabase] = None):
         self.omdb_client = OMDBClient()
-        self.db = MockDatabase()
-        
-        # Define tools for movie-related operations
-        self.tools = [
+        self.db = db or MockDatabase()
+        self.admission = admission
+        # Movies listed to any session, so sessions only keep their IDs
+        self.movie_cache: "OrderedDict[str, Movie]" = OrderedDict()
+        self.movie_cache_lock = threading.Lock()
+        # Indexes derived from the catalog are built by one background job,
+        # never on a user's turn; each records the catalog version it covers
+        self.catalog_vectors: Optional[CatalogVectorIndex] = None
+        self.similarity_version = -1
+        self.similarity_index = self._load_similarity_index()
+        self.catalog_indexes_version = -1
+        self.catalog_indexes_building = False
+        self.catalog_indexes_lock = threading.Lock()
+        self.refresh_catalog_indexes()
+
+    @cached_property
+    def tools(self) -> List[FunctionTool]:
+        """Tool wrappers, built on first use"""
+        return [
             FunctionTool.from_defaults(
                 fn=self.search_movies,
                 name="search_movies",
@@ -27,84 +51,107 @@ class MovieAgent:
                 fn=self.format_movie_info,
                 name="format_movie_info",
                 description="Format movie information for display"
+            ),
+            FunctionTool.from_defaults(
+                fn=self.find_similar_movies,
+                name="find_similar_movies",
+                description="Find movies similar to a given movie ID or title"
             )
         ]
-        
-        # Initialize ReAct agent with global settings
-        llm = Settings.llm
-        if llm:
-            llm = llm.copy()
-            llm.system_prompt = Config.SYSTEM_MESSAGES.get("movie_agent", "")
-            
-        self.agent = ReActAgent.from_tools(
-            tools=self.tools,
-            llm=llm,
-            verbose=True
-        )
-
-    async def search_movies(self, query: str) -> List[Dict]:
-        """Search for movies using OMDB API and local database"""
+
+    @cached_property
+    def agent(self) -> ReActAgent:
+        """ReAct agent over the tools, built on first use"""
+        return build_react_agent(self.tools, "movie_agent")
+
+    async def search_movies(self, query: str) -> List[Movie]:
+        """Search for movies in the local index first, then the OMDB API"""
         try:
-            # First try OMDB search
+            # Fuzzy local matches are answered without a network round trip
+            local_movies = await self._search_local(query)
+            if local_movies:
+                return local_movies
+            if self.admission.mode("local_search"):
+                return await self._search_local(query, min_score=Config.DEGRADED_SEARCH_MIN_SCORE)
+
             movies = await self.omdb_client.search(query)
+            if movies and self.admission.mode("skip_enrichment"):
+                # OMDB is struggling; list the search hits without a lookup each
+                return [Movie.from_dict(movie) for movie in movies[:5]]
             if movies:
-                # Get additional details for each movie
-                detailed_movies = []
-                for movie in movies[:5]:  # Limit to 5 movies for performance
-                    details = await self.get_movie_details(movie['imdbID'])
-                    if details:
-                        detailed_movies.append(details)
-                return detailed_movies
-            
-            # If no movies found in OMDB, try local database as fallback
-            local_movies = list(self.db.movies.values())
-            matching_movies = [
-                movie for movie in local_movies 
-                if query.lower() in movie['title'].lower()
-            ]
-            
-            # Convert local movie format to match OMDB format
-            formatted_movies = [
-                {
-                    'Title': movie['title'],
-                    'Year': movie['year'],
-                    'imdbID': movie['id'],
-                    'Genre': movie['genre'],
-                    'Director': movie['director'],
-                    'Actors': movie['actors'],
-                    'Plot': movie['plot'],
-                    'imdbRating': movie.get('rating', 'N/A')
-                }
-                for movie in matching_movies
-            ]
+                # Get additional details for each movie concurrently
+                details = await asyncio.gather(*[
+                    self.get_movie_details(movie['imdbID'])
+                    for movie in movies[:5]  # Limit to 5 movies for performance
+                ])
+                return [movie for movie in details if movie]
             
-            return formatted_movies[:5]
+            return []
             
+        except (asyncio.TimeoutError, Overloaded):
+            # OMDB is too slow or too busy for this turn; settle for looser local matches
+            return await self._search_local(query, min_score=Config.DEGRADED_SEARCH_MIN_SCORE)
         except Exception as e:
             print(f"Error searching movies: {str(e)}")
             return []
 
-    async def get_movie_details(self, movie_id: str) -> Optional[Dict]:
+    async def stream_movies(self, query: str) -> AsyncIterator[Movie]:
+        """Search for movies, yielding each one as soon as its details resolve"""
+        try:
+            local_movies = await self._search_local(query)
+            if not local_movies and self.admission.mode("local_search"):
+                local_movies = await self._search_local(query, min_score=Config.DEGRADED_SEARCH_MIN_SCORE)
+            if local_movies:
+                for movie in local_movies:
+                    yield movie
+                return
+
+            movies = await self.omdb_client.search(query)
+            if movies and self.admission.mode("skip_enrichment"):
+                for movie in movies[:5]:
+                    yield Movie.from_dict(movie)
+            elif movies:
+                tasks = [
+                    asyncio.create_task(self.get_movie_details(movie['imdbID']))
+                    for movie in movies[:5]  # Limit to 5 movies for performance
+                ]
+                try:
+                    for next_details in asyncio.as_completed(tasks):
+                        details = await next_details
+                        if details:
+                            yield details
+                finally:
+                    # The consumer may stop early; don't leave lookups running
+                    for task in tasks:
+                        task.cancel()
+                
+        except (asyncio.TimeoutError, Overloaded):
+            for movie in await self._search_local(query, min_score=Config.DEGRADED_SEARCH_MIN_SCORE):
+                yield movie
+        except Exception as e:
+            print(f"Error streaming movies: {str(e)}")
+
+    async def _search_local(self, query: str,
+                            min_score: float = Config.LOCAL_SEARCH_MIN_SCORE) -> List[Movie]:
+        """Ranked fuzzy search over the local trigram index"""
+        matching_movies = await self.db.search_movies(query, limit=5, min_score=min_score)
+        return [Movie.from_dict(movie) for movie in matching_movies]
+
+    async def get_movie_details(self, movie_id: str) -> Optional[Movie]:
         """Get detailed movie information"""
         try:
-            # First try OMDB
-            details = await self.omdb_client.get_details(movie_id)
+            # First try OMDB; only the fields we use are kept, not the raw payload
+            try:
+                details = await self.omdb_client.get_details(movie_id)
+            except (asyncio.TimeoutError, Overloaded):
+                details = None
             if details:
-                return details
+                return Movie.from_dict(details)
             
             # Fallback to local database
             local_movie = self.db.movies.get(movie_id)
             if local_movie:
-                return {
-                    'Title': local_movie['title'],
-                    'Year': local_movie['year'],
-                    'imdbID': local_movie['id'],
-                    'Genre': local_movie['genre'],
-                    'Director': local_movie['director'],
-                    'Actors': local_movie['actors'],
-                    'Plot': local_movie['plot'],
-                    'imdbRating': local_movie.get('rating', 'N/A')
-                }
+                return Movie.from_dict(local_movie)
             
             return None
             
@@ -112,68 +159,194 @@ class MovieAgent:
             print(f"Error getting movie details: {str(e)}")
             return None
 
+    def remember(self, movies: Iterable[Movie]):
+        """Keep movies shown to a user resolvable by ID, evicting the least recently used"""
+        with self.movie_cache_lock:
+            for movie in movies:
+                if movie.id:
+                    self.movie_cache[movie.id] = movie
+                    self.movie_cache.move_to_end(movie.id)
+            while len(self.movie_cache) > Config.MOVIE_CACHE_MAX_ENTRIES:
+                self.movie_cache.popitem(last=False)
+
+    def peek_movie(self, movie_id: str) -> Optional[Movie]:
+        """A movie from the shared cache or the local catalog, without any network call"""
+        with self.movie_cache_lock:
+            movie = self.movie_cache.get(movie_id)
+            if movie is not None:
+                self.movie_cache.move_to_end(movie_id)
+                return movie
+        local_movie = self.db.movies.get(movie_id)
+        return Movie.from_dict(local_movie) if local_movie else None
+
+    async def resolve_movie(self, movie_id: str) -> Optional[Movie]:
+        """A movie by ID: shared cache, then local catalog, then OMDB"""
+        movie = self.peek_movie(movie_id)
+        if movie is None:
+            movie = await self.get_movie_details(movie_id)
+            if movie is not None:
+                self.remember([movie])
+        return movie
+
+    async def resolve_movies(self, movie_ids: Iterable[str]) -> List[Optional[Movie]]:
+        """Movies by ID, in order (None where one can no longer be found)"""
+        return list(await asyncio.gather(*[self.resolve_movie(movie_id) for movie_id in movie_ids]))
+
+    def _load_similarity_index(self) -> Optional[SimilarityIndex]:
+        """Load the precomputed similarity index if it was built for the current catalog"""
+        version = self.db.catalog_version
+        index = SimilarityIndex.load(Config.SIMILARITY_INDEX_PATH, ids=list(self.db.movies))
+        if index is not None:
+            self.similarity_version = version
+        return index
+
+    def refresh_catalog_indexes(self):
+        """Start the background catalog job if the catalog changed since it last ran"""
+        with self.catalog_indexes_lock:
+            if (self.catalog_indexes_building
+                    or self.catalog_indexes_version == self.db.catalog_version):
+                return
+            self.catalog_indexes_building = True
+        threading.Thread(target=self._build_catalog_indexes, daemon=True).start()
+
+    def _build_catalog_indexes(self):
+        """Background job: load or embed catalog vectors, then rebuild stale neighbour lists"""
+        try:
+            version = self.db.catalog_version
+            movies = list(self.db.movies.values())
+            catalog_vectors = load_catalog_vectors(movies)
+            if catalog_vectors is not None:
+                self.catalog_vectors = catalog_vectors
+            if self.similarity_version != version:
+                self.similarity_index = rebuild_similarity_index(
+                    movies, use_embeddings=False, vectors=catalog_vectors
+                )
+                self.similarity_version = version
+            # A failed embedding is retried on the next catalog change, not every turn
+            self.catalog_indexes_version = version
+        except Exception as e:
+            print(f"Error building catalog indexes: {str(e)}")
+        finally:
+            with self.catalog_indexes_lock:
+                self.catalog_indexes_building = False
+
+    async def find_similar_movies(self, movie: str, limit: int = 5) -> List[Movie]:
+        """Find movies similar to a movie ID or title using precomputed neighbours"""
+        try:
+            # The previous index keeps serving while a changed catalog is rebuilt
+            self.refresh_catalog_indexes()
+            if self.similarity_index is None:
+                return []
+            similar = []
+            for movie_id, _ in self.similarity_index.similar(movie, limit):
+                details = await self.db.get_movie_details(movie_id)
+                if details:
+                    similar.append(Movie.from_dict(details))
+            return similar
+        except Exception as e:
+            print(f"Error finding similar movies: {str(e)}")
+            return []
+
     def format_movie_info(self, movie: Dict) -> str:
         """Format movie information for display"""
         try:
-            # Handle both OMDB and local database formats
-            title = movie.get('Title', movie.get('title', 'N/A'))
-            year = movie.get('Year', movie.get('year', 'N/A'))
-            rating = movie.get('imdbRating', movie.get('rating', 'N/A'))
-            runtime = movie.get('Runtime', 'N/A')
-            genre = movie.get('Genre', movie.get('genre', 'N/A'))
-            actors = movie.get('Actors', movie.get('actors', 'N/A'))
-            plot = movie.get('Plot', movie.get('plot', 'N/A'))
+            # Accepts a Movie or an OMDB/local dict (e.g. from a tool call)
+            movie = Movie.from_dict(movie)
             
             return (
-                f"🎬 {title} ({year})\n"
-                f"⭐ Rating: {rating}\n"
-                f"⏱️ Runtime: {runtime}\n"
-                f"🎭 Genre: {genre}\n"
-                f"👥 Cast: {actors}\n"
-                f"📝 Plot: {plot[:200]}..."
+                f"🎬 {movie.title} ({movie.year})\n"
+                f"⭐ Rating: {movie.rating}\n"
+                f"⏱️ Runtime: {movie.runtime}\n"
+                f"🎭 Genre: {movie.genre}\n"
+                f"👥 Cast: {movie.actors}\n"
+                f"📝 Plot: {movie.plot[:200]}..."
             )
         except Exception as e:
             print(f"Error formatting movie info: {str(e)}")
             return "Error formatting movie information"
 
-    async def get_movie_suggestions(self, preferences: Dict) -> List[Dict]:
+    async def get_movie_suggestions(self, preferences: Dict,
+                                    deadline_seconds: float = Config.SUGGESTION_DEADLINE_SECONDS,
+                                    limit: int = 5) -> List[Movie]:
         """Get movie suggestions based on user preferences"""
+        return [
+            movie async for movie in
+            self.stream_movie_suggestions(preferences, deadline_seconds, limit)
+        ]
+
+    async def stream_movie_suggestions(self, preferences: Dict,
+                                       deadline_seconds: float = Config.SUGGESTION_DEADLINE_SECONDS,
+                                       limit: int = 5) -> AsyncIterator[Movie]:
+        """Yield movie suggestions based on user preferences as each search returns"""
         try:
             if not preferences:
-                return []
+                return
                 
-            # Create search query based on preferences
+            # Create search queries based on preferences
             favorite_genres = preferences.get('favorite_genres', [])
             favorite_actors = preferences.get('favorite_actors', [])
+            queries = (
+                [f"{genre} movies" for genre in favorite_genres[:2]]  # Limit to top 2 genres
+                + list(favorite_actors[:2])  # Limit to top 2 actors
+            )
             
-            suggestions = []
-            if favorite_genres:
-                # Search by preferred genre
-                for genre in favorite_genres[:2]:  # Limit to top 2 genres
-                    movies = await self.search_movies(f"{genre} movies")
-                    suggestions.extend(movies)
-                    
-            if favorite_actors:
-                # Add movies with favorite actors
-                for actor in favorite_actors[:2]:  # Limit to top 2 actors
-                    movies = await self.search_movies(actor)
-                    suggestions.extend(movies)
-            
-            # Remove duplicates and limit results
-            unique_suggestions = []
+            # Run every search concurrently and pass results on as they arrive,
+            # stopping with whatever has been found when the budget (or the
+            # turn's deadline) runs out
+            deadline_seconds = remaining(deadline_seconds)
             seen_ids = set()
+            tasks = [asyncio.create_task(self.search_movies(query)) for query in queries]
+            try:
+                for next_result in asyncio.as_completed(tasks, timeout=deadline_seconds):
+                    try:
+                        movies = await next_result
+                    except asyncio.TimeoutError:
+                        break
+                    for movie in movies:
+                        if movie.id and movie.id not in seen_ids and len(seen_ids) < limit:
+                            seen_ids.add(movie.id)
+                            yield movie
+                    if len(seen_ids) >= limit:
+                        break
+            finally:
+                for task in tasks:
+                    task.cancel()
             
-            for movie in suggestions:
-                movie_id = movie.get('imdbID')
-                if movie_id and movie_id not in seen_ids:
-                    seen_ids.add(movie_id)
-                    unique_suggestions.append(movie)
-            
-            return unique_suggestions[:5]  # Return top 5 suggestions
+            # Backfill from the local catalog if the searches came up short
+            for movie in self._match_local_movies(favorite_genres, favorite_actors):
+                if len(seen_ids) >= limit:
+                    break
+                if movie.id not in seen_ids:
+                    seen_ids.add(movie.id)
+                    yield movie
             
         except Exception as e:
             print(f"Error getting movie suggestions: {str(e)}")
-            return []
+
+    async def search_local_catalog(self, query: str, preferences: Optional[Dict] = None,
+                                   limit: int = 5) -> List[Movie]:
+        """Loose local matches for a query, else local picks for the user's tastes (no network)"""
+        movies = await self._search_local(query, min_score=Config.DEGRADED_SEARCH_MIN_SCORE)
+        if not movies and preferences:
+            matches = self._match_local_movies(
+                preferences.get('favorite_genres', []), preferences.get('favorite_actors', [])
+            )
+            movies = list({movie.id: movie for movie in matches}.values())
+        return movies[:limit]
+
+    def browse_local_catalog(self, genres: List[str], actors: List[str], limit: int = 5) -> List[Movie]:
+        """Best rated local catalog movies in any of the genres or with any of the actors (no network)"""
+        matches = self._match_local_movies(genres, actors)
+        return list({movie.id: movie for movie in matches}.values())[:limit]
+
+    def _match_local_movies(self, genres: List[str], actors: List[str], limit: int = 20) -> List[Movie]:
+        """Best rated local catalog movies matching any of the given genres or actors"""
+        matches = []
+        if any(genre.strip() for genre in genres):
+            matches.extend(self.db.catalog.filter(genres=genres, limit=limit))
+        if any(actor.strip() for actor in actors):
+            matches.extend(self.db.catalog.filter(actors=actors, limit=limit))
+        return [Movie.from_dict(movie) for movie in matches]
 
     def _validate_movie_data(self, movie: Dict) -> bool:
         """Validate movie data has required fields"""
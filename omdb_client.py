@@ -1,37 +1,98 @@
 # utils/omdb_client.py
+import asyncio
+import threading
 import aiohttp
 from typing import Dict, List, Optional
 from config_file import Config
+from admission import admission
+from deadline import DeadlineExceeded, remaining
 
 class OMDBClient:
+    """OMDB API client reusing pooled HTTP connections.
+
+    aiohttp sessions are bound to the event loop that created them, and a
+    shared client is used from every session's loop, so one pooled session
+    is kept per running loop instead of opening a new one for each request.
+    Every request is bounded by the turn deadline and a per-request timeout,
+    and passes through the process-wide OMDB admission limiter.
+    """
+
     def __init__(self):
         self.base_url = Config.OMDB_BASE_URL
         self.api_key = Config.OMDB_API_KEY
-    
+        self.sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self.lock = threading.Lock()
+        self.admission = admission
+
+    def _session(self) -> aiohttp.ClientSession:
+        """The pooled session of the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        session = self.sessions.get(loop)
+        if session is None or session.closed:
+            with self.lock:
+                session = self.sessions.get(loop)
+                # Sessions whose loop has gone away are released, not just forgotten
+                for other in [other for other in self.sessions if other.is_closed()]:
+                    self._release_session(self.sessions.pop(other))
+                if session is None or session.closed:
+                    session = aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(limit=Config.OMDB_MAX_CONNECTIONS)
+                    )
+                    self.sessions[loop] = session
+        return session
+
+    def _release_session(self, session: aiohttp.ClientSession):
+        """Drop a session whose event loop has closed without running anything on another loop"""
+        try:
+            connector = session.connector
+            session.detach()
+            if connector is not None:
+                # Synchronous; with the owning loop closed it only clears the pool
+                connector._close()
+        except Exception as e:
+            print(f"Error releasing OMDB session: {str(e)}")
+
+    def _timeout(self) -> aiohttp.ClientTimeout:
+        """Per-request timeout, never past the current turn's deadline"""
+        seconds = remaining(Config.OMDB_REQUEST_TIMEOUT_SECONDS)
+        if seconds <= 0:
+            raise DeadlineExceeded()
+        return aiohttp.ClientTimeout(total=seconds)
+
+    async def close(self):
+        """Close the running loop's pooled session; call it on that loop before it stops"""
+        with self.lock:
+            session = self.sessions.pop(asyncio.get_running_loop(), None)
+        try:
+            if session is not None and not session.closed:
+                await session.close()
+        except Exception as e:
+            print(f"Error closing OMDB session: {str(e)}")
+
     async def search(self, query: str) -> List[Dict]:
         """Search for movies in OMDB"""
-        async with aiohttp.ClientSession() as session:
-            params = {
-                "apikey": self.api_key,
-                "s": query,
-                "type": "movie"
-            }
-            async with session.get(self.base_url, params=params) as response:
+        params = {
+            "apikey": self.api_key,
+            "s": query,
+            "type": "movie"
+        }
+        async with self.admission.omdb.slot():
+            async with self._session().get(self.base_url, params=params, timeout=self._timeout()) as response:
                 if response.status == 200:
                     data = await response.json()
                     if data.get("Response") == "True":
                         return data.get("Search", [])
                 return []
-    
+
     async def get_details(self, movie_id: str) -> Optional[Dict]:
         """Get detailed movie information"""
-        async with aiohttp.ClientSession() as session:
-            params = {
-                "apikey": self.api_key,
-                "i": movie_id,
-                "plot": "full"
-            }
-            async with session.get(self.base_url, params=params) as response:
+        params = {
+            "apikey": self.api_key,
+            "i": movie_id,
+            "plot": "full"
+        }
+        async with self.admission.omdb.slot():
+            async with self._session().get(self.base_url, params=params, timeout=self._timeout()) as response:
                 if response.status == 200:
                     data = await response.json()
                     if data.get("Response") == "True":
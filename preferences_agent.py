@@ -1,21 +1,51 @@
 from llama_index.core.agent.react import ReActAgent
 from llama_index.core.tools import FunctionTool
-from llama_index.core import VectorStoreIndex, Document, Settings
-from typing import List, Dict, Optional
+from functools import cached_property
+from llama_index.core import Settings
+from typing import AsyncIterator, List, Dict, Optional
 from mockdb import MockDatabase
+from movie import Movie
 from movie_agent import MovieAgent
-from config_file import Config
+from agent_registry import build_react_agent, get_shared_agent
+from helpers import get_time_slot
+from trending import TrendingEngine
+from recommendation_cache import RecommendationCache
+from taste_vectors import TasteProfileStore
+from admission import admission
 import json
+import threading
 
 class PreferencesAgent:
-    def __init__(self):
-        self.db = MockDatabase()
-        self.movie_agent = MovieAgent()  # Add MovieAgent instance
+    def __init__(self, db: Optional[MockDatabase] = None):
+        self.db = db or MockDatabase()
         
-        # Initialize vector store for movie data
-        self.movie_index = self._initialize_movie_index()
+        # Trending scores are driven by booking events from the database
+        self.trending = TrendingEngine()
+        self.recommendation_cache = RecommendationCache()
+        self.admission = admission
+        with self.db.lock:
+            self.trending.replay(self.db.bookings.values())
+            self.db.add_booking_listener(self.trending.on_booking_event)
+            
+            # Recommendations are cached per user and preference fingerprint;
+            # a new booking changes the user's inputs and drops their entries
+            self.db.add_booking_listener(self.recommendation_cache.on_booking_event)
         
-        self.tools = [
+        # Dense per-user taste vectors, created once the catalog vectors are
+        # built; preference vectors embedded before then wait here
+        self.taste_profiles: Optional[TasteProfileStore] = None
+        self.taste_profiles_lock = threading.Lock()
+        self.pending_preference_vectors: Dict[str, List[float]] = {}
+
+    @cached_property
+    def movie_agent(self) -> MovieAgent:
+        """The movie agent shared by everything using this database"""
+        return get_shared_agent(MovieAgent, self.db)
+
+    @cached_property
+    def tools(self) -> List[FunctionTool]:
+        """Tool wrappers, built on first use"""
+        return [
             FunctionTool.from_defaults(
                 fn=self.get_user_preferences,
                 name="get_user_preferences",
@@ -36,79 +66,134 @@ class PreferencesAgent:
                 name="analyze_booking_history",
                 description="Analyze user's booking history for patterns"
             ),
+            FunctionTool.from_defaults(
+                fn=self.get_recommendation_cache_stats,
+                name="get_recommendation_cache_stats",
+                description="Get recommendation cache hit rates"
+            ),
             FunctionTool.from_defaults(
                 fn=self.get_trending_movies,
                 name="get_trending_movies",
-                description="Get currently trending movies"
+                description="Get currently trending movies, optionally at a theater and time slot"
             )
         ]
-        
-        # Initialize ReAct agent
-        llm = Settings.llm
-        if llm:
-            llm = llm.copy()
-            llm.system_prompt = Config.SYSTEM_MESSAGES.get("preferences_agent", "")
-        
-        self.agent = ReActAgent.from_tools(
-            tools=self.tools,
-            llm=llm,
-            verbose=True
-        )
 
-    def _initialize_movie_index(self) -> VectorStoreIndex:
-        """Initialize vector store index for movie data synchronously"""
-        try:
-            # Get movies directly from the mock database
-            movies = self.db.movies.values()
-            
-            # Create documents from movie data
-            movie_docs = []
-            for movie in movies:
-                content = f"""
-                Title: {movie['title']}
-                Genre: {movie['genre']}
-                Director: {movie['director']}
-                Actors: {movie['actors']}
-                Plot: {movie['plot']}
-                """
-                movie_docs.append(Document(text=content, metadata=movie))
-            
-            # Create vector store index
-            return VectorStoreIndex.from_documents(movie_docs)
-            
-        except Exception as e:
-            print(f"Error initializing movie index: {str(e)}")
-            return None
+    @cached_property
+    def agent(self) -> ReActAgent:
+        """ReAct agent over the tools, built on first use"""
+        return build_react_agent(self.tools, "preferences_agent")
 
-    async def get_personalized_recommendations(self, user_id: str, limit: int = 5) -> List[Dict]:
+    async def get_personalized_recommendations(self, user_id: str, limit: int = 5) -> List[Movie]:
         """Get personalized movie recommendations"""
+        return [
+            movie async for movie in
+            self.stream_personalized_recommendations(user_id, limit)
+        ]
+
+    async def stream_personalized_recommendations(self, user_id: str,
+                                                  limit: int = 5) -> AsyncIterator[Movie]:
+        """Yield personalized recommendations as they are found, caching the full list"""
         try:
             preferences = await self.get_user_preferences(user_id)
             if not preferences:
-                return await self.get_trending_movies(limit)
-
-            # First try OMDB search for user preferences
-            omdb_recommendations = await self.movie_agent.get_movie_suggestions(preferences)
-            if omdb_recommendations:
-                return omdb_recommendations
+                for movie in await self.get_trending_movies(limit):
+                    yield movie
+                return
 
-            # If no OMDB results, fall back to local database and vector search
-            query = f"""
-            Find movies with genres {', '.join(preferences['favorite_genres'])} 
-            or starring {', '.join(preferences['favorite_actors'])}
-            """
+            fingerprint = f"{self.recommendation_cache.fingerprint(preferences)}:{limit}"
+            cached = self.recommendation_cache.get(user_id, fingerprint)
+            if cached is not None:
+                for movie in cached:
+                    yield movie
+                return
 
-            # Use query engine to find relevant movies
-            query_engine = self.movie_index.as_query_engine()
-            response = query_engine.query(query)
-            
-            # Process and rank results
-            recommendations = self._rank_recommendations(response.source_nodes, preferences)
-            return recommendations[:limit]
+            # Under load, a cache miss is answered locally instead of searching OMDB
+            local_only = self.admission.mode("cached_recommendations")
+            recommendations = []
+            async for movie in self._stream_recommendations(user_id, preferences, limit, local_only):
+                recommendations.append(movie)
+                yield movie
+            # Only complete, full-quality lists are cached; an abandoned
+            # stream or a local stopgap stores nothing
+            if not local_only:
+                self.recommendation_cache.put(user_id, fingerprint, recommendations)
             
         except Exception as e:
             print(f"Error getting recommendations: {str(e)}")
-            return []
+
+    async def _stream_recommendations(self, user_id: str, preferences: Dict, limit: int,
+                                      local_only: bool = False) -> AsyncIterator[Movie]:
+        """Compute recommendations for a set of preferences (uncached)"""
+        # First the user's taste vector: a nearest-neighbour lookup over
+        # catalog embeddings, no OMDB or embedding call
+        found = False
+        taste_profiles = self._get_taste_profiles()
+        if taste_profiles:
+            for movie_id, _ in taste_profiles.recommend(user_id, limit):
+                movie = await self.db.get_movie_details(movie_id)
+                if movie:
+                    found = True
+                    yield Movie.from_dict(movie)
+        if found:
+            return
+
+        # Without a taste profile or catalog vectors, search OMDB
+        if not local_only:
+            async for movie in self.movie_agent.stream_movie_suggestions(preferences, limit=limit):
+                found = True
+                yield movie
+        if local_only and not found:
+            for movie in await self.movie_agent.search_local_catalog("", preferences, limit):
+                yield movie
+
+    def _get_taste_profiles(self) -> Optional[TasteProfileStore]:
+        """The taste profile store, or None until the catalog vectors are built.
+
+        The vectors come from the movie agent's background catalog job; this
+        only wraps them, so it never embeds anything on a user's turn.
+        """
+        self.movie_agent.refresh_catalog_indexes()
+        catalog = self.movie_agent.catalog_vectors
+        if catalog is None:
+            return None
+        if self.taste_profiles is None:
+            with self.taste_profiles_lock:
+                if self.taste_profiles is None:
+                    taste_profiles = TasteProfileStore(catalog)
+                    for user_id, vector in self.pending_preference_vectors.items():
+                        taste_profiles.set_preference_vector(user_id, vector)
+                    self.pending_preference_vectors.clear()
+                    with self.db.lock:
+                        for booking in self.db.bookings.values():
+                            if booking.get("status") == "confirmed":
+                                taste_profiles.on_booking_event("created", booking)
+                        self.db.add_booking_listener(taste_profiles.on_booking_event)
+                    self.taste_profiles = taste_profiles
+        elif self.taste_profiles.catalog is not catalog:
+            self.taste_profiles.set_catalog(catalog)
+        return self.taste_profiles
+
+    async def _update_taste_preferences(self, user_id: str, preferences: Dict):
+        """Embed stated preferences once per change into the user's taste vector"""
+        text = (
+            f"Genre: {', '.join(preferences['favorite_genres'])}\n"
+            f"Actors: {', '.join(preferences['favorite_actors'])}"
+        )
+        async with self.admission.llm.slot():
+            vector = await Settings.embed_model.aget_text_embedding(text)
+        taste_profiles = self._get_taste_profiles()
+        if taste_profiles:
+            taste_profiles.set_preference_vector(user_id, vector)
+            return
+        with self.taste_profiles_lock:
+            if self.taste_profiles is None:
+                self.pending_preference_vectors[user_id] = vector
+                return
+        self.taste_profiles.set_preference_vector(user_id, vector)
+
+    def get_recommendation_cache_stats(self) -> Dict:
+        """Get recommendation cache hit rates"""
+        return self.recommendation_cache.stats()
 
     async def get_user_preferences(self, user_id: str) -> Dict:
         """Get user's movie preferences"""
@@ -162,6 +247,16 @@ class PreferencesAgent:
                 "price_sensitivity": preferences.get('price_sensitivity', 'medium')
             }
 
+            # Only a real change to the inputs invalidates cached recommendations
+            previous = await self.db.get_user_preferences(user_id)
+            if (self.recommendation_cache.fingerprint(previous)
+                    != self.recommendation_cache.fingerprint(cleaned_preferences)):
+                self.recommendation_cache.invalidate_user(user_id)
+                try:
+                    await self._update_taste_preferences(user_id, cleaned_preferences)
+                except Exception as e:
+                    print(f"Error updating taste vector: {str(e)}")
+
             # Update preferences in database
             return await self.db.update_user_preferences(user_id, cleaned_preferences)
             
@@ -169,91 +264,12 @@ class PreferencesAgent:
             print(f"Error updating preferences: {str(e)}")
             return False
         
-    def _rank_recommendations(self, movies: List[Dict], preferences: Dict) -> List[Dict]:
-        """Rank movie recommendations based on user preferences"""
-        ranked_movies = []
-        for movie in movies:
-            score = 0
-            metadata = movie.metadata
-            
-            # Score based on genre match
-            for genre in metadata['genre'].split(','):
-                if genre.strip() in preferences['favorite_genres']:
-                    score += 2
-                    
-            # Score based on actor match
-            for actor in metadata['actors'].split(','):
-                if actor.strip() in preferences['favorite_actors']:
-                    score += 1
-                    
-            ranked_movies.append({
-                'movie': metadata,
-                'score': score
-            })
-            
-        # Sort by score and return movies
-        return [item['movie'] for item in sorted(ranked_movies, 
-                key=lambda x: x['score'], reverse=True)]
-
     async def analyze_booking_history(self, user_id: str) -> Dict:
         """Analyze user's booking history for patterns"""
         try:
-            bookings = await self.db.get_user_bookings(user_id)
-            if not bookings:
-                return {}
-
-            analysis = {
-                'favorite_genres': {},
-                'favorite_actors': {},
-                'preferred_times': {},
-                'preferred_theaters': {},
-                'average_spending': 0.0
-            }
-
-            total_spent = 0
-            for booking in bookings:
-                # Analyze genres
-                for genre in booking['movie']['genre'].split(','):
-                    genre = genre.strip()
-                    analysis['favorite_genres'][genre] = \
-                        analysis['favorite_genres'].get(genre, 0) + 1
-
-                # Analyze actors
-                for actor in booking['movie']['actors'].split(','):
-                    actor = actor.strip()
-                    analysis['favorite_actors'][actor] = \
-                        analysis['favorite_actors'].get(actor, 0) + 1
-
-                # Analyze preferred times
-                time_slot = self._get_time_slot(booking['showtime'])
-                analysis['preferred_times'][time_slot] = \
-                    analysis['preferred_times'].get(time_slot, 0) + 1
-
-                # Analyze theaters
-                theater = booking['theater']['name']
-                analysis['preferred_theaters'][theater] = \
-                    analysis['preferred_theaters'].get(theater, 0) + 1
-
-                total_spent += booking['total_price']
-
-            # Calculate average spending
-            if bookings:  # Avoid division by zero
-                analysis['average_spending'] = total_spent / len(bookings)
-
-            # Sort and get top items
-            analysis['favorite_genres'] = dict(sorted(
-                analysis['favorite_genres'].items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:3])
-            
-            analysis['favorite_actors'] = dict(sorted(
-                analysis['favorite_actors'].items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:3])
-
-            return analysis
+            # Aggregates are maintained by the database as bookings are
+            # created or cancelled, so this is a read rather than a rescan
+            return await self.db.get_user_booking_stats(user_id)
 
         except Exception as e:
             print(f"Error analyzing booking history: {str(e)}")
@@ -261,43 +277,23 @@ class PreferencesAgent:
 
     def _get_time_slot(self, time: str) -> str:
         """Convert time to time slot category"""
-        hour = int(time.split(':')[0])
-        if hour < 12:
-            return 'morning'
-        elif hour < 17:
-            return 'afternoon'
-        elif hour < 20:
-            return 'evening'
-        return 'night'
+        return get_time_slot(time)
 
-    async def get_trending_movies(self, limit: int = 5) -> List[Dict]:
+    async def get_trending_movies(self, limit: int = 5, theater_id: Optional[str] = None,
+                                  time_slot: Optional[str] = None) -> List[Movie]:
         """Get currently trending movies based on recent bookings"""
         try:
-            # Get recent bookings
-            recent_bookings = await self.db.get_recent_bookings()
-            
-            # Count movie occurrences
-            movie_counts = {}
-            for booking in recent_bookings:
-                movie_id = booking['movie']['id']
-                movie_counts[movie_id] = movie_counts.get(movie_id, 0) + 1
-            
-            # Get top movies
-            top_movie_ids = sorted(
-                movie_counts.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:limit]
+            top_movie_ids = self.trending.top(limit, theater_id, time_slot)
             
             # Get movie details
             trending_movies = []
             for movie_id, _ in top_movie_ids:
                 movie = await self.db.get_movie_details(movie_id)
                 if movie:
-                    trending_movies.append(movie)
+                    trending_movies.append(Movie.from_dict(movie))
             
             return trending_movies
             
         except Exception as e:
             print(f"Error getting trending movies: {str(e)}")
-            return []
\ No newline at end of file
+            return []
@@ -0,0 +1,139 @@
+# utils/prefetch.py
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set
+from config_file import Config
+from llm_gateway import background
+
+class _Prefetch:
+    __slots__ = ("task", "loop", "owners", "created_at", "used")
+
+    def __init__(self, task: asyncio.Task, loop: asyncio.AbstractEventLoop,
+                 owner: str, created_at: float):
+        self.task = task
+        self.loop = loop
+        self.owners: Set[str] = {owner}
+        self.created_at = created_at
+        self.used = False
+
+class Prefetcher:
+    """Speculative background loads for the likely next step of a conversation.
+
+    Results are keyed by what they load (e.g. ("showtimes", theater_id,
+    movie_id)), so sessions looking at the same movie share them. Each
+    conversation owns the prefetches it asked for; `retain` cancels the ones
+    it no longer needs once nobody else wants them. At most `max_concurrent`
+    prefetches run at a time; beyond that, new ones are skipped rather than
+    queued, since speculative work must never delay real requests.
+    """
+
+    def __init__(self, max_concurrent: int = Config.PREFETCH_MAX_CONCURRENT,
+                 ttl_seconds: float = Config.PREFETCH_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_concurrent = max_concurrent
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.entries: Dict[Hashable, _Prefetch] = {}
+        self.running = 0
+        self.lock = threading.Lock()
+        self.metrics = {
+            "scheduled": 0, "skipped": 0, "hits": 0, "misses": 0,
+            "cancelled": 0, "wasted": 0, "errors": 0
+        }
+
+    def prefetch(self, owner: str, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> bool:
+        """Start loading `key` in the background unless it is already loaded or the budget is spent"""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            self._expire()
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry.loop is loop:
+                    entry.owners.add(owner)
+                    return True
+                self._drop(key, entry)
+            if self.running >= self.max_concurrent:
+                self.metrics["skipped"] += 1
+                return False
+            self.running += 1
+            self.metrics["scheduled"] += 1
+            # LLM calls made by speculative loads yield to users' turns
+            with background():
+                task = loop.create_task(loader())
+            # A done callback also runs for tasks cancelled before they start
+            task.add_done_callback(self._finished)
+            self.entries[key] = _Prefetch(task, loop, owner, self.clock())
+            return True
+
+    def _finished(self, task: asyncio.Task):
+        """Done callback: release the budget slot and count failures"""
+        with self.lock:
+            self.running -= 1
+            error = None if task.cancelled() else task.exception()
+            if error is not None:
+                self.metrics["errors"] += 1
+        if error is not None:
+            print(f"Error prefetching: {str(error)}")
+
+    async def get(self, key: Hashable, loader: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """The prefetched value for `key` (waiting if still loading), else a direct load (or None)"""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            self._expire()
+            entry = self.entries.get(key)
+            if entry is not None and (entry.loop is not loop or entry.task.cancelled()):
+                entry = None
+        if entry is not None:
+            try:
+                value = await asyncio.shield(entry.task)
+                with self.lock:
+                    entry.used = True
+                    self.metrics["hits"] += 1
+                return value
+            except asyncio.CancelledError:
+                # A cancelled prefetch is a miss; a cancelled caller is not
+                if not entry.task.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            except Exception:
+                pass
+        with self.lock:
+            self.metrics["misses"] += 1
+        return await loader() if loader is not None else None
+
+    def retain(self, owner: str, keys: Iterable[Hashable] = ()):
+        """Keep only these prefetches for an owner, cancelling abandoned ones"""
+        keep = set(keys)
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if owner not in entry.owners or key in keep:
+                    continue
+                entry.owners.discard(owner)
+                if not entry.owners:
+                    self._drop(key, entry)
+
+    def _drop(self, key: Hashable, entry: _Prefetch):
+        """Forget an entry, cancelling it if it is still running (lock held)"""
+        del self.entries[key]
+        if entry.loop.is_closed():
+            return
+        if not entry.task.done():
+            entry.loop.call_soon_threadsafe(entry.task.cancel)
+            self.metrics["cancelled"] += 1
+        elif not entry.used:
+            self.metrics["wasted"] += 1
+
+    def _expire(self):
+        """Drop finished entries older than the TTL (lock held)"""
+        cutoff = self.clock() - self.ttl_seconds
+        for key, entry in list(self.entries.items()):
+            if entry.created_at < cutoff and (entry.task.done() or entry.loop.is_closed()):
+                self._drop(key, entry)
+
+    def stats(self) -> Dict[str, float]:
+        """Prefetch counters plus the hit rate of lookups"""
+        with self.lock:
+            stats = dict(self.metrics, running=self.running, entries=len(self.entries))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,114 @@
+# utils/recommendation_cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+from config_file import Config
+
+CacheKey = Tuple[str, str, str]
+
+class RecommendationCache:
+    """Per-user recommendation cache with TTL and bounded LRU memory.
+
+    Entries are keyed by (user_id, namespace, preference fingerprint) so a
+    preference change naturally misses; invalidate_user() drops every entry
+    of a user when their inputs change (new preferences or a booking).
+    A lock guards every operation so one cache serves all session threads.
+    """
+
+    def __init__(self, max_entries: int = Config.RECOMMENDATION_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = Config.RECOMMENDATION_CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self.user_keys: Dict[str, Set[CacheKey]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(preferences: Optional[Dict]) -> str:
+        """Stable fingerprint of the preference fields recommendations depend on"""
+        if not preferences:
+            return ""
+        relevant = {
+            key: sorted(str(v).strip().lower() for v in preferences.get(key, []) or [])
+            for key in ("favorite_genres", "favorite_actors", "preferred_times", "preferred_theaters")
+        }
+        relevant["price_sensitivity"] = preferences.get("price_sensitivity", "medium")
+        payload = json.dumps(relevant, sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def get(self, user_id: str, fingerprint: str, namespace: str = "recommendations") -> Optional[Any]:
+        """Get a cached value, or None on a miss or expired entry"""
+        with self.lock:
+            key = (user_id, namespace, fingerprint)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, user_id: str, fingerprint: str, value: Any, namespace: str = "recommendations"):
+        """Store a value, evicting the least recently used entries if full"""
+        with self.lock:
+            key = (user_id, namespace, fingerprint)
+            self.entries[key] = (self.clock() + self.ttl_seconds, value)
+            self.entries.move_to_end(key)
+            self.user_keys.setdefault(user_id, set()).add(key)
+
+            while len(self.entries) > self.max_entries:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: str):
+        """Drop every cached entry for a user"""
+        with self.lock:
+            keys = self.user_keys.pop(user_id, None)
+            if not keys:
+                return
+            for key in keys:
+                self.entries.pop(key, None)
+            self.invalidations += 1
+
+    def on_booking_event(self, event: str, booking: Dict):
+        """MockDatabase booking listener: bookings change a user's inputs"""
+        self.invalidate_user(booking.get("user_id"))
+
+    def _remove(self, key: CacheKey):
+        """Remove a single entry and its user index reference"""
+        self.entries.pop(key, None)
+        keys = self.user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.user_keys[key[0]]
+
+    def stats(self) -> Dict:
+        """Cache effectiveness counters"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self.entries)
+            }
@@ -0,0 +1,223 @@
+# utils/search_index.py
+import re
+import threading
+from array import array
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+from config_file import Config
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+def trigrams(text: str) -> Set[str]:
+    """Padded character trigrams of every word in a text"""
+    grams = set()
+    for word in _NON_ALNUM.sub(" ", text.lower()).split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+class TrigramIndex:
+    """In-memory trigram inverted index for ranked fuzzy movie search.
+
+    Every trigram maps to a sorted array of document positions plus a
+    parallel array with the weight of the best field (title, director,
+    actors, genre) it occurs in. Appends are cheap, so the index is kept
+    up to date incrementally. Queries accumulate scores with numpy from the
+    rarest postings first, then only verify the best candidates against the
+    very common ones with a binary search, which keeps lookups under a
+    millisecond on large catalogs. A re-entrant lock serializes appends
+    against searches, since numpy views pin the posting buffers.
+    """
+
+    FIELDS = ("title", "genre", "director", "actors")
+
+    def __init__(self, field_weights: Dict[str, float] = None,
+                 scan_budget: int = Config.SEARCH_INDEX_SCAN_BUDGET,
+                 max_candidates: int = 128):
+        self.field_weights = field_weights or Config.SEARCH_INDEX_FIELD_WEIGHTS
+        self.scan_budget = scan_budget
+        self.max_candidates = max_candidates
+        self.doc_ids: List[str] = []
+        self.title_sizes = array("H")
+        self.positions: Dict[str, int] = {}
+        self.deleted: Set[int] = set()
+        self.postings: Dict[str, array] = {}
+        self.weights: Dict[str, array] = {}
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def _size(self) -> int:
+        """Number of document positions, including replaced ones"""
+        return len(self.doc_ids)
+
+    def _doc_id(self, position: int) -> str:
+        return self.doc_ids[position]
+
+    def _title_sizes(self, positions: np.ndarray) -> np.ndarray:
+        return np.frombuffer(self.title_sizes, dtype=np.uint16)[positions]
+
+    def _posting(self, gram: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Sorted positions and weights of a trigram's posting"""
+        posting = self.postings.get(gram)
+        if not posting:
+            return None
+        return (np.frombuffer(posting, dtype=np.uint32),
+                np.frombuffer(self.weights[gram], dtype=np.float32))
+
+    def add(self, doc_id: str, fields: Dict[str, str]):
+        """Index (or re-index) a document; cost is proportional to its own text"""
+        with self.lock:
+            previous = self.positions.get(doc_id)
+            if previous is not None:
+                self.deleted.add(previous)
+
+            position = self._size()
+            self.doc_ids.append(doc_id)
+            self.positions[doc_id] = position
+
+            doc_weights: Dict[str, float] = {}
+            for field in self.FIELDS:
+                weight = self.field_weights.get(field, 0.0)
+                grams = trigrams(fields.get(field) or "")
+                if field == "title":
+                    self.title_sizes.append(min(len(grams), 65535))
+                for gram in grams:
+                    if weight > doc_weights.get(gram, 0.0):
+                        doc_weights[gram] = weight
+
+            for gram, weight in doc_weights.items():
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array("I")
+                    self.weights[gram] = array("f")
+                posting.append(position)
+                self.weights[gram].append(weight)
+
+    def add_movie(self, movie: Dict):
+        """Index a MockDatabase movie record"""
+        self.add(movie["id"], movie)
+
+    def search(self, query: str, limit: int = 5, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """Ranked fuzzy matches as (doc_id, score); 1.0 means every trigram hit the title"""
+        with self.lock:
+            query_grams = trigrams(query)
+            postings = []
+            for gram in query_grams:
+                posting = self._posting(gram)
+                if posting is not None:
+                    postings.append((len(posting[0]), posting))
+            if not postings:
+                return []
+            postings.sort(key=lambda x: x[0])
+
+            # Accumulate from the rarest postings until the scan budget is spent
+            scores = np.zeros(self._size(), dtype=np.float32)
+            scanned = 0
+            index = 0
+            while index < len(postings) and (scanned == 0 or scanned + postings[index][0] <= self.scan_budget):
+                size, (rows, weights) = postings[index]
+                scores[rows] += weights
+                scanned += size
+                index += 1
+
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > self.max_candidates:
+                top = np.argpartition(-scores[candidates], self.max_candidates - 1)[:self.max_candidates]
+                candidates = np.sort(candidates[top])
+            candidate_scores = scores[candidates]
+
+            # Remaining (common) trigrams only confirm existing candidates
+            for size, (rows, weights) in postings[index:]:
+                found = np.minimum(np.searchsorted(rows, candidates), size - 1)
+                candidate_scores += np.where(rows[found] == candidates, weights[found], 0.0)
+
+            # Normalize by query size, nudging titles of similar length up
+            query_size = len(query_grams)
+            title_sizes = self._title_sizes(candidates)
+            normalized = candidate_scores / query_size
+            normalized -= 0.01 * np.abs(title_sizes.astype(np.float32) - query_size) / query_size
+
+            ranked = []
+            for i in np.argsort(-normalized):
+                if normalized[i] < min_score or len(ranked) == limit:
+                    break
+                position = int(candidates[i])
+                if position not in self.deleted:
+                    ranked.append((self._doc_id(position), float(normalized[i])))
+            return ranked
+
+    def export(self) -> Dict[str, np.ndarray]:
+        """Postings as flat arrays (sorted trigrams, offsets, rows, weights) for snapshots"""
+        grams = sorted(self.postings)
+        offsets = np.zeros(len(grams) + 1, dtype=np.uint64)
+        np.cumsum([len(self.postings[gram]) for gram in grams], out=offsets[1:])
+        rows = [np.frombuffer(self.postings[gram], dtype=np.uint32) for gram in grams]
+        weights = [np.frombuffer(self.weights[gram], dtype=np.float32) for gram in grams]
+        return {
+            "grams": np.array([gram.encode() for gram in grams], dtype="S3"),
+            "offsets": offsets,
+            "rows": np.concatenate(rows) if rows else np.zeros(0, dtype=np.uint32),
+            "weights": np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32),
+            "title_sizes": np.frombuffer(self.title_sizes, dtype=np.uint16).copy(),
+        }
+
+class FrozenTrigramIndex(TrigramIndex):
+    """Read-only exported postings (e.g. memory-mapped) plus an in-memory overlay.
+
+    Documents added after loading get positions after the frozen ones, so
+    concatenating a frozen posting with its overlay keeps it sorted.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], doc_id_at: Callable[[int], str],
+                 position_of: Callable[[str], Optional[int]], **kwargs):
+        super().__init__(**kwargs)
+        self.base_grams = arrays["grams"]
+        self.base_offsets = arrays["offsets"]
+        self.base_rows = arrays["rows"]
+        self.base_weights = arrays["weights"]
+        self.base_title_sizes = arrays["title_sizes"]
+        self.base_size = len(self.base_title_sizes)
+        self.doc_id_at = doc_id_at
+        self.position_of = position_of
+
+    def __len__(self) -> int:
+        return self.base_size + len(self.doc_ids) - len(self.deleted)
+
+    def _size(self) -> int:
+        return self.base_size + len(self.doc_ids)
+
+    def _doc_id(self, position: int) -> str:
+        if position < self.base_size:
+            return self.doc_id_at(position)
+        return self.doc_ids[position - self.base_size]
+
+    def _title_sizes(self, positions: np.ndarray) -> np.ndarray:
+        sizes = np.empty(len(positions), dtype=np.uint16)
+        frozen = positions < self.base_size
+        sizes[frozen] = self.base_title_sizes[positions[frozen]]
+        sizes[~frozen] = np.frombuffer(self.title_sizes, dtype=np.uint16)[positions[~frozen] - self.base_size]
+        return sizes
+
+    def _posting(self, gram: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        key = gram.encode()
+        i = int(np.searchsorted(self.base_grams, key))
+        frozen = None
+        if i < len(self.base_grams) and self.base_grams[i] == key:
+            start, end = int(self.base_offsets[i]), int(self.base_offsets[i + 1])
+            frozen = (self.base_rows[start:end], self.base_weights[start:end])
+
+        overlay = super()._posting(gram)
+        if overlay is None or frozen is None:
+            return frozen if overlay is None else overlay
+        return np.concatenate([frozen[0], overlay[0]]), np.concatenate([frozen[1], overlay[1]])
+
+    def add(self, doc_id: str, fields: Dict[str, str]):
+        with self.lock:
+            if doc_id not in self.positions:
+                previous = self.position_of(doc_id)
+                if previous is not None:
+                    self.deleted.add(previous)
+            super().add(doc_id, fields)
@@ -1,16 +1,19 @@
 # agents/seating_agent.py
 from llama_index.core.agent.react import ReActAgent
 from llama_index.core.tools import FunctionTool
-from typing import List, Dict
+from functools import cached_property
+from typing import List, Dict, Optional
 from mockdb import MockDatabase
-from llama_index.core import Settings
-from config_file import Config
+from agent_registry import build_react_agent
 
 class SeatingAgent:
-    def __init__(self):
-        self.db = MockDatabase()
-        
-        self.tools = [
+    def __init__(self, db: Optional[MockDatabase] = None):
+        self.db = db or MockDatabase()
+
+    @cached_property
+    def tools(self) -> List[FunctionTool]:
+        """Tool wrappers, built on first use"""
+        return [
             FunctionTool.from_defaults(
                 fn=self.get_available_seats,
                 name="get_available_seats",
@@ -32,18 +35,11 @@ class SeatingAgent:
                 description="Suggest best available seats based on group size"
             )
         ]
-        
-        # Initialize ReAct agent with global settings
-        llm = Settings.llm
-        if llm:
-            llm = llm.copy()
-            llm.system_prompt = Config.SYSTEM_MESSAGES["seating_agent"]
-            
-        self.agent = ReActAgent.from_tools(
-            tools=self.tools,
-            llm=llm,
-            verbose=True
-        )
+
+    @cached_property
+    def agent(self) -> ReActAgent:
+        """ReAct agent over the tools, built on first use"""
+        return build_react_agent(self.tools, "seating_agent")
 
     async def get_available_seats(self, showtime_id: str) -> Dict:
         """Get available seats for a showtime"""
@@ -87,23 +83,25 @@ class SeatingAgent:
         """Suggest best available seats for a group"""
         try:
             seats = await self.get_available_seats(showtime_id)
-            best_seats = []
-            
-            # Prefer middle rows (D, E) for best view
-            preferred_rows = "DEFCBAGH"
-            
-            for row in preferred_rows:
-                consecutive_seats = []
-                for seat_num in range(1, 11):
-                    seat_id = f"{row}{seat_num}"
-                    if seats.get(seat_id, {}).get("status") == "available":
-                        consecutive_seats.append(seat_id)
-                        if len(consecutive_seats) == group_size:
-                            return consecutive_seats
-                    else:
-                        consecutive_seats = []
-                        
-            return []  # No suitable consecutive seats found
+            return self.best_seats(seats, group_size)
         except Exception as e:
             print(f"Error suggesting seats: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+
+    def best_seats(self, seats: Dict, group_size: int) -> List[str]:
+        """Best run of adjacent available seats for a group in an already loaded seat map"""
+        # Prefer middle rows (D, E) for best view
+        preferred_rows = "DEFCBAGH"
+        
+        for row in preferred_rows:
+            consecutive_seats = []
+            for seat_num in range(1, 11):
+                seat_id = f"{row}{seat_num}"
+                if seats.get(seat_id, {}).get("status") == "available":
+                    consecutive_seats.append(seat_id)
+                    if len(consecutive_seats) == group_size:
+                        return consecutive_seats
+                else:
+                    consecutive_seats = []
+                    
+        return []  # No suitable consecutive seats found
\ No newline at end of file
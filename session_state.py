@@ -0,0 +1,146 @@
+# utils/session_state.py
+import json
+import sys
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+SESSION_FORMAT_VERSION = 1
+
+# Field -> default. Lists of IDs are tuples so a state can't share a list
+# with a caller by accident; everything else starts out unset.
+_FIELDS: Dict[str, Any] = {
+    "current_state": "greeting",
+    "user_id": None,
+    "customer_name": None,
+    "customer_email": None,
+    "preferences_state": None,
+    "favorite_genres": None,
+    "favorite_actors": None,
+    "movie_ids": (),          # movies last listed to the user
+    "movie_id": None,         # the chosen movie
+    "theater_ids": (),
+    "theater_id": None,
+    "showtime_ids": (),
+    "showtime_id": None,
+    "seat_version": None,     # version of the seat map the user was shown
+    "selected_seats": None,
+    "selecting_seats": None,
+    "total_price": None,
+    "booking_completed": None,
+    "prefetch_owner": None,
+}
+_ID_LISTS = {"movie_ids", "theater_ids", "showtime_ids", "selected_seats"}
+_ID_FIELDS = {"movie_id", "theater_id", "showtime_id"}
+
+class SessionState:
+    """Compact, typed state of one conversation.
+
+    Only IDs, versions and small scalars are kept. Movies, theaters,
+    showtimes and seat maps are resolved through the shared caches and the
+    database when a handler needs them, so live conversations don't each
+    hold copies of them and nothing shown earlier is trusted without
+    checking the live data. IDs are interned, since many sessions refer to
+    the same movies and showtimes.
+
+    Fields read and write like dict keys (context["current_state"],
+    context.get("user_id", "user123")), an unset field counting as missing,
+    which is how the state machine and the handlers use it. `dumps` and
+    `loads` give the JSON form kept by external session stores.
+    """
+
+    __slots__ = tuple(_FIELDS)
+
+    def __init__(self, **values):
+        for field, default in _FIELDS.items():
+            object.__setattr__(self, field, default)
+        for field, value in values.items():
+            self[field] = value
+
+    def __setattr__(self, field: str, value: Any):
+        if field not in _FIELDS:
+            raise AttributeError(f"SessionState has no field {field!r}")
+        if value is not None:
+            if field in _ID_LISTS:
+                value = tuple(sys.intern(str(item)) for item in value)
+            elif field in _ID_FIELDS:
+                value = sys.intern(str(value))
+        object.__setattr__(self, field, value)
+
+    # Dict-style access
+
+    def __getitem__(self, field: str) -> Any:
+        if field not in _FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field: str, value: Any):
+        if field not in _FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def __delitem__(self, field: str):
+        self[field] = _FIELDS[field]
+
+    def __contains__(self, field: object) -> bool:
+        return field in _FIELDS and getattr(self, field) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (field for field in _FIELDS if field in self)
+
+    def get(self, field: str, default: Any = None) -> Any:
+        value = getattr(self, field, None) if field in _FIELDS else None
+        return default if value is None else value
+
+    def setdefault(self, field: str, default: Any = None) -> Any:
+        if field not in self:
+            self[field] = default
+        return self[field]
+
+    def pop(self, field: str, default: Any = None) -> Any:
+        value = self.get(field, default)
+        if field in _FIELDS:
+            del self[field]
+        return value
+
+    def update(self, values: Optional[Dict[str, Any]] = None, **more):
+        for field, value in dict(values or {}, **more).items():
+            self[field] = value
+
+    def reset(self, fields: Iterable[str]):
+        """Return fields to their defaults"""
+        for field in fields:
+            del self[field]
+
+    # Serialization
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain-JSON form holding only the fields that differ from their defaults"""
+        data: Dict[str, Any] = {"v": SESSION_FORMAT_VERSION}
+        for field, default in _FIELDS.items():
+            value = getattr(self, field)
+            if value != default:
+                data[field] = list(value) if isinstance(value, tuple) else value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SessionState":
+        """Rebuild a state from `to_dict` output; unknown fields (from newer writers) are ignored"""
+        version = data.get("v", SESSION_FORMAT_VERSION)
+        if version > SESSION_FORMAT_VERSION:
+            print(f"Error loading session: format {version} is newer than {SESSION_FORMAT_VERSION}")
+        return cls(**{field: value for field, value in data.items() if field in _FIELDS})
+
+    def dumps(self) -> str:
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, payload: str) -> "SessionState":
+        return cls.from_dict(json.loads(payload))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SessionState):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in _FIELDS)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self)
+        return f"SessionState({fields})"
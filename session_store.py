@@ -0,0 +1,373 @@
+# utils/session_store.py
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+from config_file import Config
+from session_state import SessionState
+
+class _Entry:
+    """A cached session with its expiry and, for persistent stores, what was last written"""
+
+    __slots__ = ("state", "expires_at", "payload", "revision", "persisted_until")
+
+    def __init__(self, state: SessionState, expires_at: float, payload: Optional[str] = None,
+                 revision: int = 0, persisted_until: float = 0.0):
+        self.state = state
+        self.expires_at = expires_at
+        self.payload = payload
+        self.revision = revision
+        self.persisted_until = persisted_until
+
+class SessionStore(ABC):
+    """Conversation states kept between turns, keyed by chat or browser session.
+
+    Reads like a dict of SessionState: `store[key]` raises KeyError for an
+    unknown or expired session and `store.load(key)` starts a new one
+    instead. Handlers change states in place; callers `save` the session
+    at the end of each turn so stores that persist them can write it out.
+    """
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[SessionState]:
+        """The live session for a key, or None if there is none"""
+
+    @abstractmethod
+    def put(self, key: Hashable, state: SessionState):
+        """Store a session, replacing any other for the key"""
+
+    @abstractmethod
+    def delete(self, key: Hashable):
+        """End a session"""
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        """Size and hit counters of the store"""
+
+    def save(self, key: Hashable) -> bool:
+        """Persist the changes a turn made to a session in place.
+
+        Returns False if they were rejected because the session changed
+        elsewhere meanwhile. Memory-only stores have nothing to write.
+        """
+        return True
+
+    def close(self):
+        """Release the store's resources (nothing to do for memory-only stores)"""
+
+    def load(self, key: Hashable) -> SessionState:
+        """The session for a key, started fresh if there is none"""
+        state = self.get(key)
+        if state is None:
+            state = SessionState()
+            self.put(key, state)
+        return state
+
+    def __getitem__(self, key: Hashable) -> SessionState:
+        state = self.get(key)
+        if state is None:
+            raise KeyError(key)
+        return state
+
+    def __setitem__(self, key: Hashable, state: SessionState):
+        self.put(key, state)
+
+    def __delitem__(self, key: Hashable):
+        self.delete(key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+class MemorySessionStore(SessionStore):
+    """Sessions in this process's memory, bounded by LRU and TTL.
+
+    A session expires `ttl_seconds` after it was last used and beyond
+    `max_entries` the least recently used one is dropped, so chats abandoned
+    mid-booking don't pile up. Entries are kept in order of last use, which
+    makes expiry a pop from the front.
+    """
+
+    def __init__(self, max_entries: int = Config.SESSION_MAX_ENTRIES,
+                 ttl_seconds: float = Config.SESSION_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def get(self, key: Hashable) -> Optional[SessionState]:
+        key = str(key)
+        with self.lock:
+            now = self.clock()
+            entry = self._cached(key, now)
+            if entry is None:
+                entry = self._fetch(key, now)
+                if entry is None:
+                    self.misses += 1
+                    return None
+                self.entries[key] = entry
+            else:
+                self.hits += 1
+            self._use(key, entry, now)
+            self._evict(now)
+            return entry.state
+
+    def put(self, key: Hashable, state: SessionState):
+        key = str(key)
+        with self.lock:
+            now = self.clock()
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = _Entry(state, now)
+            else:
+                entry.state = state
+            self._use(key, entry, now)
+            self._evict(now)
+
+    def delete(self, key: Hashable):
+        with self.lock:
+            self.entries.pop(str(key), None)
+
+    def _cached(self, key: str, now: float) -> Optional[_Entry]:
+        """The cached entry for a key, dropping it if it has expired"""
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            self._drop(key, expired=True)
+            return None
+        return entry
+
+    def _fetch(self, key: str, now: float) -> Optional[_Entry]:
+        """Load a session that isn't cached; memory-only stores have nowhere to look"""
+        return None
+
+    def _use(self, key: str, entry: _Entry, now: float):
+        """Mark an entry as just used: push back its expiry and move it to the back"""
+        entry.expires_at = now + self.ttl_seconds
+        self.entries.move_to_end(key)
+
+    def _evict(self, now: float):
+        """Drop expired entries, then least recently used ones over the limit"""
+        while self.entries:
+            key, entry = next(iter(self.entries.items()))
+            if entry.expires_at <= now:
+                self._drop(key, expired=True)
+            elif len(self.entries) > self.max_entries:
+                self._drop(key, expired=False)
+            else:
+                break
+
+    def _drop(self, key: str, expired: bool):
+        self.entries.pop(key, None)
+        if expired:
+            self.expired += 1
+        else:
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
+
+class SQLiteSessionStore(MemorySessionStore):
+    """Sessions persisted in SQLite behind an LRU + TTL cache of the live ones.
+
+    Sessions load lazily on first use and are written through: `put` and
+    `delete` go straight to the database and `save` writes what a turn
+    changed in place. Sessions only read get their expiry pushed back once
+    it is half used up.
+
+    Several worker processes can share the file (WAL mode). Each row has a
+    revision that every change increments, and `save` is a compare-and-set
+    against the revision the session was loaded at (UPDATE ... WHERE
+    revision = ?). If another worker changed the session first, the write
+    is rejected rather than overwriting theirs, and the stale copy is
+    dropped so the next lookup loads the newer one. A cached session is
+    also checked against the row's revision before it is served. Expired
+    rows are purged a batch at a time as sessions are written.
+    """
+
+    PURGE_BATCH = 1000
+
+    def __init__(self, path: str = Config.SESSION_STORE_PATH,
+                 max_entries: int = Config.SESSION_MAX_ENTRIES,
+                 ttl_seconds: float = Config.SESSION_TTL_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        # Expiry times are shared with other processes, so the clock is wall time
+        super().__init__(max_entries, ttl_seconds, clock)
+        self.path = path
+        self.loads = 0
+        self.reloads = 0
+        self.writes = 0
+        self.conflicts = 0
+        self.purged = 0
+
+        # Used under self.lock only, so one connection serves every thread
+        self.db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "key TEXT PRIMARY KEY, state TEXT NOT NULL, "
+            "revision INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def put(self, key: Hashable, state: SessionState):
+        key = str(key)
+        with self.lock:
+            super().put(key, state)
+            entry = self.entries[key]
+            payload = state.dumps()
+            try:
+                self.db.execute("BEGIN IMMEDIATE")
+                try:
+                    updated = self.db.execute(
+                        "UPDATE sessions SET state = ?, revision = revision + 1, expires_at = ? WHERE key = ?",
+                        (payload, entry.expires_at, key)
+                    ).rowcount
+                    if not updated:
+                        self.db.execute(
+                            "INSERT INTO sessions (key, state, revision, expires_at) VALUES (?, ?, 1, ?)",
+                            (key, payload, entry.expires_at)
+                        )
+                    revision = self.db.execute(
+                        "SELECT revision FROM sessions WHERE key = ?", (key,)
+                    ).fetchone()[0]
+                    self.db.execute("COMMIT")
+                except BaseException:
+                    self.db.execute("ROLLBACK")
+                    raise
+                entry.payload, entry.revision, entry.persisted_until = payload, revision, entry.expires_at
+                self._wrote()
+            except Exception as e:
+                print(f"Error writing session {key}: {str(e)}")
+
+    def delete(self, key: Hashable):
+        key = str(key)
+        with self.lock:
+            self.entries.pop(key, None)
+            try:
+                self.db.execute("DELETE FROM sessions WHERE key = ?", (key,))
+                self._wrote()
+            except Exception as e:
+                print(f"Error deleting session {key}: {str(e)}")
+
+    def save(self, key: Hashable) -> bool:
+        key = str(key)
+        with self.lock:
+            entry = self.entries.get(key)
+            return True if entry is None else self._write(key, entry)
+
+    def _write(self, key: str, entry: _Entry) -> bool:
+        """Compare-and-set a cached session's changes into its row"""
+        payload = entry.state.dumps()
+        changed = payload != entry.payload
+        if not changed and entry.expires_at - entry.persisted_until < self.ttl_seconds / 2:
+            return True
+        try:
+            if changed:
+                written = self.db.execute(
+                    "UPDATE sessions SET state = ?, revision = revision + 1, expires_at = ? "
+                    "WHERE key = ? AND revision = ?",
+                    (payload, entry.expires_at, key, entry.revision)
+                ).rowcount
+            else:
+                written = self.db.execute(
+                    "UPDATE sessions SET expires_at = ? WHERE key = ? AND revision = ?",
+                    (entry.expires_at, key, entry.revision)
+                ).rowcount
+        except Exception as e:
+            print(f"Error saving session {key}: {str(e)}")
+            return False
+        if not written:
+            # Changed or ended by another worker: keep theirs, reload on next use
+            print(f"Error saving session {key}: changed by another worker")
+            self.entries.pop(key, None)
+            self.conflicts += 1
+            return False
+        if changed:
+            entry.payload = payload
+            entry.revision += 1
+        entry.persisted_until = entry.expires_at
+        self._wrote()
+        return True
+
+    def _wrote(self):
+        """Count a write, purging a batch of expired rows every PURGE_BATCH writes"""
+        self.writes += 1
+        if self.writes % self.PURGE_BATCH == 0:
+            self.purged += max(self.db.execute(
+                "DELETE FROM sessions WHERE key IN "
+                "(SELECT key FROM sessions WHERE expires_at <= ? LIMIT ?)",
+                (self.clock(), self.PURGE_BATCH)
+            ).rowcount, 0)
+
+    def _cached(self, key: str, now: float) -> Optional[_Entry]:
+        entry = super()._cached(key, now)
+        if entry is None:
+            return None
+        row = self.db.execute("SELECT revision FROM sessions WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] != entry.revision:
+            # Changed (or ended) by another worker; theirs wins over unsaved changes here
+            if entry.state.dumps() != entry.payload:
+                print(f"Error saving session {key}: changed by another worker")
+                self.conflicts += 1
+            self.entries.pop(key, None)
+            self.reloads += 1
+            return None
+        return entry
+
+    def _fetch(self, key: str, now: float) -> Optional[_Entry]:
+        row = self.db.execute(
+            "SELECT state, revision, expires_at FROM sessions WHERE key = ? AND expires_at > ?",
+            (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        self.loads += 1
+        payload, revision, expires_at = row
+        return _Entry(SessionState.loads(payload), expires_at, payload, revision, expires_at)
+
+    def _drop(self, key: str, expired: bool):
+        entry = self.entries.get(key)
+        if entry is not None and not expired:
+            # Evicted mid-turn: write what it has before forgetting it
+            self._write(key, entry)
+        super()._drop(key, expired)
+
+    def close(self):
+        """Close the database"""
+        with self.lock:
+            self.db.close()
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        with self.lock:
+            stats.update({
+                "loads": self.loads,
+                "reloads": self.reloads,
+                "writes": self.writes,
+                "conflicts": self.conflicts,
+                "purged": self.purged,
+            })
+        return stats
+
+def create_session_store() -> SessionStore:
+    """The store chosen by Config.SESSION_STORE: "memory" (default) or "sqlite" """
+    if Config.SESSION_STORE == "sqlite":
+        return SQLiteSessionStore()
+    return MemorySessionStore()
@@ -0,0 +1,245 @@
+# utils/similarity.py
+import hashlib
+import os
+import sys
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from config_file import Config
+from llm_gateway import background
+
+def _movie_text(movie: Dict) -> str:
+    """Text used to embed a movie (mirrors the vector index documents)"""
+    return (
+        f"Title: {movie.get('title', '')}\n"
+        f"Genre: {movie.get('genre', '')}\n"
+        f"Director: {movie.get('director', '')}\n"
+        f"Actors: {movie.get('actors', '')}\n"
+        f"Plot: {movie.get('plot', '')}"
+    )
+
+def _split(value: Optional[str]) -> List[str]:
+    """Split a comma separated OMDB-style field into normalized tokens"""
+    parts = (part.strip().lower() for part in (value or "").split(","))
+    # OMDB fills missing fields with "N/A", which is not a shared feature
+    return [part for part in parts if part and part != "n/a"]
+
+def catalog_digest(ids: Iterable) -> str:
+    """Fingerprint of the catalog's movie IDs, stored with indexes derived from it"""
+    return hashlib.sha1("\0".join(str(movie_id) for movie_id in ids).encode()).hexdigest()
+
+def _metadata_sketch(genres: List[List[str]], people: List[List[Tuple[str, float]]],
+                     dim: int = 256) -> np.ndarray:
+    """Hashed, L2-normalized metadata vectors used to pair candidates without embeddings"""
+    sketch = np.zeros((len(genres), dim), dtype=np.float32)
+    weights = Config.SIMILARITY_WEIGHTS
+    for i, (movie_genres, movie_people) in enumerate(zip(genres, people)):
+        for feature, weight in [(f"g:{genre}", weights["genre"]) for genre in movie_genres] + movie_people:
+            sketch[i, zlib.crc32(feature.encode()) % dim] += np.sqrt(weight)
+    norms = np.linalg.norm(sketch, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return sketch / norms
+
+def embed_movies(movies: List[Dict], batch_size: int = 100) -> Optional[np.ndarray]:
+    """Embed movies with the configured embedding model, L2-normalized"""
+    try:
+        from llama_index.core import Settings
+        embed_model = Settings.embed_model
+        vectors = []
+        texts = [_movie_text(movie) for movie in movies]
+        # Bulk embedding yields to users' turns at the LLM gateway
+        with background():
+            for start in range(0, len(texts), batch_size):
+                vectors.extend(embed_model.get_text_embedding_batch(texts[start:start + batch_size]))
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    except Exception as e:
+        print(f"Error embedding movies, using metadata overlap only: {str(e)}")
+        return None
+
+class SimilarityIndex:
+    """Precomputed top-N neighbour lists per movie.
+
+    Stored as three arrays: `ids` (n,), `neighbors` (n, N) int32 row
+    positions padded with -1, and `scores` (n, N) float16. A lookup is a
+    dict probe plus an array slice.
+    """
+
+    def __init__(self, ids: np.ndarray, neighbors: np.ndarray, scores: np.ndarray,
+                 titles: Optional[np.ndarray] = None):
+        self.ids = ids
+        self.neighbors = neighbors
+        self.scores = scores
+        self.titles = titles
+        self.positions = {str(movie_id): i for i, movie_id in enumerate(ids)}
+        self.title_positions = (
+            {str(title).lower(): i for i, title in enumerate(titles)}
+            if titles is not None else {}
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def resolve(self, movie: str) -> Optional[int]:
+        """Resolve a movie ID or exact title to its row position"""
+        position = self.positions.get(movie)
+        if position is None:
+            position = self.title_positions.get(movie.strip().lower())
+        return position
+
+    def similar(self, movie: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Get the precomputed nearest neighbours of a movie ID or title"""
+        position = self.resolve(movie)
+        if position is None:
+            return []
+        result = []
+        for neighbor, score in zip(self.neighbors[position][:limit], self.scores[position][:limit]):
+            if neighbor < 0:
+                break
+            result.append((str(self.ids[neighbor]), float(score)))
+        return result
+
+    def save(self, path: str):
+        """Write the index as an uncompressed .npz archive"""
+        arrays = {
+            "ids": self.ids, "neighbors": self.neighbors, "scores": self.scores,
+            "catalog": np.array(catalog_digest(self.ids))
+        }
+        if self.titles is not None:
+            arrays["titles"] = self.titles
+        # Writer-unique temp name: two threads may save the same file at once
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, ids: Optional[Iterable] = None) -> Optional["SimilarityIndex"]:
+        """Load a saved index, or None if it does not exist or was built for other movie IDs"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if ids is not None:
+                    built_for = (
+                        str(data["catalog"]) if "catalog" in data.files
+                        else catalog_digest(data["ids"])
+                    )
+                    if built_for != catalog_digest(ids):
+                        return None
+                return cls(
+                    data["ids"], data["neighbors"], data["scores"],
+                    data["titles"] if "titles" in data.files else None
+                )
+        except Exception as e:
+            print(f"Error loading similarity index: {str(e)}")
+            return None
+
+    @classmethod
+    def build(cls, movies: List[Dict], top_n: int = Config.SIMILAR_MOVIES_TOP_N,
+              vectors: Optional["CatalogVectorIndex"] = None,
+              block_rows: int = Config.SIMILARITY_BLOCK_ROWS) -> "SimilarityIndex":
+        """Compute neighbour lists from embeddings plus genre/director/actor overlap.
+
+        Rows are scored a block at a time against the candidates the vector
+        index pairs them with: the whole catalog for small catalogs, the
+        probed inverted lists above Config.ANN_BRUTE_FORCE_MAX_MOVIES.
+        """
+        from taste_vectors import CatalogVectorIndex
+
+        n = len(movies)
+        ids = np.array([movie["id"] for movie in movies])
+        titles = np.array([movie.get("title", "") for movie in movies])
+        neighbors = np.full((n, top_n), -1, dtype=np.int32)
+        scores = np.zeros((n, top_n), dtype=np.float16)
+
+        # Overlap is scored as the cosine between binary feature sets. Genres
+        # are few and shared by many movies, so they are dense columns scored
+        # with a matrix product; actors and directors go through postings.
+        weights = Config.SIMILARITY_WEIGHTS
+        genres = [_split(movie.get("genre")) for movie in movies]
+        people = [
+            [(f"a:{actor}", weights["actor"]) for actor in _split(movie.get("actors"))]
+            + [(f"d:{director}", weights["director"]) for director in _split(movie.get("director"))]
+            for movie in movies
+        ]
+        inv_norm = np.array([
+            1.0 / np.sqrt(len(g) + len(p)) if g or p else 0.0 for g, p in zip(genres, people)
+        ], dtype=np.float32)
+
+        genre_columns: Dict[str, int] = {}
+        for movie_genres in genres:
+            for genre in movie_genres:
+                genre_columns.setdefault(genre, len(genre_columns))
+        genre_matrix = np.zeros((n, max(1, len(genre_columns))), dtype=np.float32)
+        for i, movie_genres in enumerate(genres):
+            for genre in movie_genres:
+                genre_matrix[i, genre_columns[genre]] = np.sqrt(weights["genre"]) * inv_norm[i]
+
+        postings: Dict[str, List[int]] = {}
+        for i, movie_people in enumerate(people):
+            for feature, _ in movie_people:
+                postings.setdefault(feature, []).append(i)
+        posting_arrays = {
+            feature: np.asarray(rows, dtype=np.int32) for feature, rows in postings.items()
+        }
+
+        embedding_weight = weights["embedding"] if vectors is not None else 0.0
+        if vectors is None:
+            vectors = CatalogVectorIndex(ids, _metadata_sketch(genres, people))
+
+        # Position of each candidate row within the current block, -1 elsewhere
+        column = np.full(n, -1, dtype=np.int64)
+        for rows, candidates in vectors.blocks(block_rows):
+            if candidates is None:
+                candidates = np.arange(n)
+            block = genre_matrix[rows] @ genre_matrix[candidates].T
+            if embedding_weight:
+                block += embedding_weight * (vectors.vectors[rows] @ vectors.vectors[candidates].T)
+
+            column[candidates] = np.arange(len(candidates))
+            for r, i in enumerate(rows):
+                for feature, weight in people[i]:
+                    posting = posting_arrays[feature]
+                    cols = column[posting]
+                    hit = cols >= 0
+                    block[r, cols[hit]] += weight * inv_norm[i] * inv_norm[posting[hit]]
+                if column[i] >= 0:
+                    block[r, column[i]] = -np.inf
+            column[candidates] = -1
+
+            k = min(top_n, len(candidates))
+            if k <= 0:
+                continue
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            keep = top_scores > 0
+            neighbors[rows, :k] = np.where(keep, candidates[top], -1)
+            scores[rows, :k] = np.where(keep, top_scores, 0.0)
+
+        return cls(ids, neighbors, scores, titles)
+
+def rebuild_similarity_index(movies: List[Dict], path: str = Config.SIMILARITY_INDEX_PATH,
+                             use_embeddings: bool = True,
+                             vectors: Optional["CatalogVectorIndex"] = None) -> SimilarityIndex:
+    """Offline job: compute and persist the item-to-item similarity index"""
+    from taste_vectors import load_catalog_vectors
+
+    if vectors is None and use_embeddings:
+        vectors = load_catalog_vectors(movies)
+    index = SimilarityIndex.build(movies, vectors=vectors)
+    index.save(path)
+    return index
+
+if __name__ == "__main__":
+    from mockdb import MockDatabase
+
+    db = MockDatabase()
+    output = sys.argv[1] if len(sys.argv) > 1 else Config.SIMILARITY_INDEX_PATH
+    index = rebuild_similarity_index(list(db.movies.values()), output)
+    print(f"Wrote similarity index for {len(index)} movies to {output}")
@@ -0,0 +1,69 @@
+# utils/state_machine.py
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+from metrics import MetricsRegistry, metrics as default_metrics
+
+Handler = Callable[[str, Dict], Awaitable[Tuple[str, str]]]
+
+class StateMachine:
+    """Table-driven conversation engine.
+
+    Every state has one registered handler and the set of states it may
+    move to. `dispatch` runs the handler for `context["current_state"]`,
+    rejects transitions that are not in the table (the conversation stays
+    where it is) and records per-handler and per-transition latency
+    histograms under "<name>.handler.<state>" and
+    "<name>.transition.<from>-><to>".
+    """
+
+    def __init__(self, name: str = "conversation", fallback: Optional[Handler] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.name = name
+        self.fallback = fallback
+        self.metrics = metrics or default_metrics
+        self.handlers: Dict[str, Handler] = {}
+        self.transitions: Dict[str, Set[str]] = {}
+
+    def add_state(self, state: str, handler: Handler, transitions: Iterable[str]):
+        """Register the handler of a state and the states it may move to"""
+        self.handlers[state] = handler
+        self.transitions[state] = set(transitions)
+
+    def can_transition(self, current_state: str, next_state: str) -> bool:
+        """Whether the table allows moving from one state to another"""
+        if current_state not in self.handlers:
+            # Recovering from an unknown state may go anywhere known
+            return next_state in self.handlers
+        return next_state in self.transitions[current_state]
+
+    async def dispatch(self, user_input: str, context: Dict) -> str:
+        """Run the current state's handler, apply its transition and return the reply"""
+        current_state = context.get("current_state")
+        handler = self.handlers.get(current_state, self.fallback)
+        if handler is None:
+            raise KeyError(f"No handler for state {current_state!r}")
+        start = time.perf_counter()
+        response, next_state = await handler(user_input, context)
+        self.complete(current_state, next_state, context, time.perf_counter() - start)
+        return response
+
+    def complete(self, current_state: str, next_state: Optional[str], context: Dict, seconds: float):
+        """Validate and apply a transition made by a handler, recording its latency.
+
+        Also used by streaming handlers, which set the state themselves.
+        """
+        # Unregistered states share one label so metric names stay bounded
+        source = current_state if current_state in self.handlers else "unknown"
+        if not self.can_transition(current_state, next_state):
+            print(f"Error in {self.name}: rejected transition {current_state} -> {next_state}")
+            target = next_state if next_state in self.handlers else "unknown"
+            self.metrics.increment(f"{self.name}.rejected.{source}->{target}")
+            next_state = current_state if current_state in self.handlers else next_state
+        context["current_state"] = next_state
+        target = next_state if next_state in self.handlers else "unknown"
+        self.metrics.observe(f"{self.name}.handler.{source}", seconds)
+        self.metrics.observe(f"{self.name}.transition.{source}->{target}", seconds)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Latency summaries and rejected-transition counts of this machine"""
+        return self.metrics.snapshot(f"{self.name}.")
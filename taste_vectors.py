@@ -0,0 +1,242 @@
+# utils/taste_vectors.py
+import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import numpy as np
+from config_file import Config
+from similarity import embed_movies
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    """L2-normalize a vector, leaving zero vectors untouched"""
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+# Serializes catalog embedding, so concurrent builds embed each movie once
+_catalog_vectors_lock = threading.Lock()
+
+def load_catalog_vectors(movies: List[Dict],
+                         path: str = Config.CATALOG_EMBEDDINGS_PATH) -> Optional["CatalogVectorIndex"]:
+    """Load persisted catalog embeddings, embedding only movies that are not stored yet"""
+    ids = [movie["id"] for movie in movies]
+    with _catalog_vectors_lock:
+        stored: Dict[str, np.ndarray] = {}
+        if os.path.exists(path):
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    if list(data["ids"]) == ids:
+                        return CatalogVectorIndex(data["ids"], data["vectors"])
+                    stored = dict(zip((str(movie_id) for movie_id in data["ids"]), data["vectors"]))
+            except Exception as e:
+                print(f"Error loading catalog embeddings: {str(e)}")
+
+        # An import only embeds the movies it added
+        missing = [movie for movie in movies if str(movie["id"]) not in stored]
+        if missing:
+            vectors = embed_movies(missing)
+            if vectors is None:
+                return None
+            stored.update(zip((str(movie["id"]) for movie in missing), vectors))
+        if not ids:
+            return None
+        vectors = np.stack([stored[str(movie_id)] for movie_id in ids])
+        try:
+            # Writer-unique temp name: another process may save the same file at once
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+            np.savez(tmp_path, ids=np.array(ids), vectors=vectors)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error saving catalog embeddings: {str(e)}")
+        return CatalogVectorIndex(np.array(ids), vectors)
+
+class CatalogVectorIndex:
+    """Nearest-neighbour search over L2-normalized catalog embeddings.
+
+    Small catalogs are searched exactly with one matrix-vector product;
+    above Config.ANN_BRUTE_FORCE_MAX_MOVIES an inverted-file (IVF) index
+    is trained with a few rounds of spherical k-means and only the
+    `nprobe` closest lists are scanned.
+    """
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray,
+                 brute_force_max: int = Config.ANN_BRUTE_FORCE_MAX_MOVIES,
+                 nprobe: int = Config.ANN_NPROBE):
+        self.ids = ids
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.positions = {str(movie_id): i for i, movie_id in enumerate(ids)}
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.list_rows: Optional[np.ndarray] = None
+        self.list_offsets: Optional[np.ndarray] = None
+        if len(ids) > brute_force_max:
+            self._train_ivf()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def vector(self, movie_id: str) -> Optional[np.ndarray]:
+        """Embedding of a catalog movie"""
+        position = self.positions.get(movie_id)
+        return None if position is None else self.vectors[position]
+
+    def _train_ivf(self, iterations: int = 10, chunk: int = 65536):
+        """Train coarse centroids and bucket every vector into its closest list"""
+        n, dim = self.vectors.shape
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        sample = self.vectors[rng.choice(n, min(n, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros((nlist, dim), dtype=np.float32)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, chunk):
+            assign[start:start + chunk] = np.argmax(
+                self.vectors[start:start + chunk] @ centroids.T, axis=1
+            )
+        self.centroids = centroids
+        self.list_rows = np.argsort(assign, kind="stable").astype(np.int32)
+        self.list_offsets = np.searchsorted(assign[self.list_rows], np.arange(nlist + 1))
+
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Rows of the nprobe closest inverted lists (None means exhaustive)"""
+        if self.centroids is None:
+            return None
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([
+            self.list_rows[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probes
+        ])
+
+    def blocks(self, block_rows: int) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray]]]:
+        """Row blocks paired with the rows to compare them against (None means all).
+
+        Each inverted list is paired with the lists probed for its centroid,
+        so an all-pairs neighbour search costs about n * nprobe * sqrt(n).
+        """
+        if self.centroids is None:
+            groups = [np.arange(len(self.ids))]
+        else:
+            groups = [
+                self.list_rows[self.list_offsets[p]:self.list_offsets[p + 1]]
+                for p in range(len(self.centroids))
+            ]
+        for p, rows in enumerate(groups):
+            candidates = None if self.centroids is None else self._candidates(self.centroids[p])
+            for start in range(0, len(rows), block_rows):
+                yield rows[start:start + block_rows], candidates
+
+    def search(self, query: np.ndarray, k: int = 5,
+               exclude: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """Top-k catalog movies by cosine similarity, skipping excluded IDs"""
+        if len(self.ids) == 0:
+            return []
+        exclude = exclude or set()
+        rows = self._candidates(query)
+        scores = self.vectors @ query if rows is None else self.vectors[rows] @ query
+
+        fetch = min(len(scores), k + len(exclude))
+        if fetch <= 0:
+            return []
+        top = np.argpartition(-scores, fetch - 1)[:fetch]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for i in top:
+            movie_id = str(self.ids[i if rows is None else rows[i]])
+            if movie_id in exclude:
+                continue
+            results.append((movie_id, float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+class TasteProfile:
+    """A user's dense taste vector, kept as running components"""
+
+    __slots__ = ("preference_vector", "booked_sum", "booked_counts")
+
+    def __init__(self, dim: int):
+        self.preference_vector = np.zeros(dim, dtype=np.float32)
+        self.booked_sum = np.zeros(dim, dtype=np.float32)
+        self.booked_counts: Dict[str, int] = {}
+
+    def vector(self, preference_weight: float) -> np.ndarray:
+        """Blend of the stated-preference vector and the mean booked movie"""
+        booked = sum(self.booked_counts.values())
+        blended = preference_weight * self.preference_vector
+        if booked:
+            blended = blended + self.booked_sum / booked
+        return _normalize(blended)
+
+class TasteProfileStore:
+    """Per-user taste vectors updated incrementally from preferences and bookings.
+
+    One store is shared by every session, so updates and queries take a lock.
+    """
+
+    def __init__(self, catalog: CatalogVectorIndex,
+                 preference_weight: float = Config.TASTE_PREFERENCE_WEIGHT):
+        self.catalog = catalog
+        self.dim = catalog.vectors.shape[1]
+        self.preference_weight = preference_weight
+        self.profiles: Dict[str, TasteProfile] = {}
+        self.lock = threading.Lock()
+
+    def _profile(self, user_id: str) -> TasteProfile:
+        profile = self.profiles.get(user_id)
+        if profile is None:
+            profile = self.profiles[user_id] = TasteProfile(self.dim)
+        return profile
+
+    def set_catalog(self, catalog: CatalogVectorIndex):
+        """Switch to rebuilt catalog vectors; stored movies keep their vectors"""
+        with self.lock:
+            self.catalog = catalog
+
+    def set_preference_vector(self, user_id: str, vector: Iterable[float]):
+        """Replace the stated-preference component of a user's taste"""
+        with self.lock:
+            self._profile(user_id).preference_vector = _normalize(np.asarray(vector, dtype=np.float32))
+
+    def add_booking(self, user_id: str, movie_id: str, delta: int = 1):
+        """Fold a booked (delta=1) or cancelled (delta=-1) movie into the taste"""
+        with self.lock:
+            vector = self.catalog.vector(movie_id)
+            if vector is None:
+                return
+            profile = self._profile(user_id)
+            count = profile.booked_counts.get(movie_id, 0) + delta
+            if count < 0:
+                return
+            profile.booked_sum += delta * vector
+            if count:
+                profile.booked_counts[movie_id] = count
+            else:
+                profile.booked_counts.pop(movie_id, None)
+
+    def on_booking_event(self, event: str, booking: Dict):
+        """MockDatabase booking listener"""
+        self.add_booking(
+            booking.get("user_id"),
+            booking.get("movie_id"),
+            1 if event == "created" else -1
+        )
+
+    def recommend(self, user_id: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Nearest catalog movies to the user's taste, excluding booked titles"""
+        with self.lock:
+            profile = self.profiles.get(user_id)
+            if profile is None:
+                return []
+            query = profile.vector(self.preference_weight)
+            exclude = set(profile.booked_counts)
+        if not query.any():
+            return []
+        return self.catalog.search(query, k, exclude=exclude)
@@ -1,11 +1,13 @@
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler
 from main_file import MovieBookingSystem
-from movie_agent import MovieAgent
+from movie import Movie
+from session_state import SessionState
+from session_store import SessionStore, create_session_store
+from input_parser import extract_email, extract_name, parse_seat_labels, validate_email
 import asyncio
-from typing import Dict, Any
 import os
-import re
+from typing import Awaitable, Callable, Optional
 from rich.console import Console
 
 console = Console()
@@ -17,80 +19,14 @@ class TelegramMovieBot:
     def __init__(self, token: str):
         self.token = token
         self.booking_system = MovieBookingSystem()
-        self.movie_agent = MovieAgent()  # Initialize MovieAgent directly
-        self.user_contexts: Dict[int, Dict[str, Any]] = {}
+        self.movie_agent = self.booking_system.coordinator.movie_agent  # Shared MovieAgent
+        # Bounded by LRU and TTL; with SESSION_STORE=sqlite, shared by workers and kept across restarts
+        self.user_contexts: SessionStore = create_session_store()
         
-    def _extract_name(self, input_text: str) -> str:
-        """Extract name from various greeting formats"""
-        patterns = [
-            r"(?i)i am ([a-zA-Z]+)",
-            r"(?i)my name is ([a-zA-Z]+)",
-            r"(?i)i'm ([a-zA-Z]+)",
-            r"(?i)call me ([a-zA-Z]+)",
-            r"(?i)this is ([a-zA-Z]+)",
-            r"(?i)^([a-zA-Z]+)$",
-            r"(?i)^hi[,\s]+([a-zA-Z]+)$",
-            r"(?i)^hello[,\s]+([a-zA-Z]+)$",
-            r"(?i)^hey[,\s]+([a-zA-Z]+)$"
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, input_text)
-            if match:
-                name = match.group(1)
-                return name.strip().title()
-
-        cleaned = input_text.lower()
-        for word in ['hi', 'hello', 'hey', 'i am', "i'm", 'my name is', 'this is', 'call me']:
-            cleaned = cleaned.replace(word, '').strip()
-        
-        cleaned = re.sub(r'[^\w\s]', '', cleaned).strip()
-        
-        if cleaned:
-            return cleaned.split()[0].title()
-        
-        return ""
-
-    def _extract_email(self, input_text: str) -> str:
-        """Extract email from various input formats"""
-        patterns = [
-            r"(?i)my email is[:\s]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",
-            r"(?i)email[:\s]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",
-            r"(?i)email address[:\s]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",
-            r"(?i)here'?s my email[:\s]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",
-            r"(?i)you can reach me at[:\s]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",
-            r"([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, input_text)
-            if match:
-                return match.group(1).strip().lower()
-
-        words = input_text.strip().split()
-        for word in words:
-            if self._validate_email(word):
-                return word.lower()
-        
-        return ""
-
-    def _validate_email(self, email: str) -> bool:
-        """Validate email format"""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return bool(re.match(pattern, email.strip().lower()))
-
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Start the conversation and ask for user's name."""
         user_id = update.effective_user.id
-        self.user_contexts[user_id] = {
-            "current_state": "greeting",
-            "selected_movie": None,
-            "selected_theater": None,
-            "selected_showtime": None,
-            "selected_seats": None,
-            "customer_name": None,
-            "customer_email": None
-        }
+        self.user_contexts[user_id] = SessionState()
         
         await update.message.reply_text(
             "Welcome to Movie Booking Assistant! 🎬\n"
@@ -98,12 +34,33 @@ class TelegramMovieBot:
         )
         return GET_NAME
 
+    async def _session(self, update: Update) -> Optional[SessionState]:
+        """The user's session, or None after sending them back to /start if it expired or was evicted"""
+        session = self.user_contexts.get(update.effective_user.id)
+        if session is None:
+            await update.message.reply_text(
+                "Sorry, your booking session has expired. Please send /start to begin again.",
+                reply_markup=ReplyKeyboardRemove()
+            )
+        return session
+
+    def _turn(self, handler: Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[int]]):
+        """Run a conversation step, then save the session it changed in place"""
+        async def step(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+            try:
+                return await handler(update, context)
+            finally:
+                self.user_contexts.save(update.effective_user.id)
+        return step
+
     async def get_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Store the name and ask for email."""
-        user_id = update.effective_user.id
+        session = await self._session(update)
+        if session is None:
+            return ConversationHandler.END
         input_text = update.message.text
         
-        name = self._extract_name(input_text)
+        name = extract_name(input_text)
         
         if not name or len(name) < 2:
             await update.message.reply_text(
@@ -112,7 +69,7 @@ class TelegramMovieBot:
             )
             return GET_NAME
         
-        self.user_contexts[user_id]["customer_name"] = name
+        session["customer_name"] = name
         
         await update.message.reply_text(
             f"Nice to meet you, {name}! "
@@ -122,20 +79,22 @@ class TelegramMovieBot:
 
     async def get_email(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Store the email and start movie search."""
-        user_id = update.effective_user.id
+        session = await self._session(update)
+        if session is None:
+            return ConversationHandler.END
         input_text = update.message.text
         
-        email = self._extract_email(input_text)
+        email = extract_email(input_text)
         
-        if not email or not self._validate_email(email):
+        if not email or not validate_email(email):
             await update.message.reply_text(
                 "Please provide a valid email address "
                 "(e.g., username@domain.com)."
             )
             return GET_EMAIL
         
-        self.user_contexts[user_id]["customer_email"] = email
-        name = self.user_contexts[user_id]["customer_name"]
+        session["customer_email"] = email
+        name = session["customer_name"]
         
         await update.message.reply_text(
             f"Thank you, {name}! What kind of movie would you like to watch? "
@@ -145,17 +104,15 @@ class TelegramMovieBot:
 
     async def search_movies(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Search for movies based on user input."""
-        user_id = update.effective_user.id
+        session = await self._session(update)
+        if session is None:
+            return ConversationHandler.END
         search_query = update.message.text.strip()
         
         try:
-            # First try local database through MockDatabase
-            local_movies = await self.booking_system.coordinator.booking_agent.db.get_all_movies()
-            matching_movies = [
-                movie for movie in local_movies 
-                if search_query.lower() in movie['title'].lower() or
-                   search_query.lower() in movie['genre'].lower()
-            ]
+            # First try the local trigram index (tolerates typos)
+            local_movies = await self.booking_system.coordinator.booking_agent.db.search_movies(search_query)
+            matching_movies = [Movie.from_dict(movie) for movie in local_movies]
             
             if not matching_movies:
                 # Try OMDB search through movie agent
@@ -175,19 +132,15 @@ class TelegramMovieBot:
             keyboard = []
             
             for movie in matching_movies[:5]:  # Limit to 5 movies
-                # Handle both OMDB and local database formats
-                title = movie.get('Title', movie.get('title', 'Unknown'))
-                year = movie.get('Year', movie.get('year', ''))
-                genre = movie.get('Genre', movie.get('genre', 'Unknown genre'))
-                
-                movie_text += f"🎬 {title} ({year}) - {genre}\n"
-                keyboard.append([f"{title} ({year})"])
+                movie_text += f"🎬 {movie.title} ({movie.year}) - {movie.genre}\n"
+                keyboard.append([f"{movie.title} ({movie.year})"])
             
             keyboard.append(["Search Again"])
             reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True)
             
-            # Store movies in context for later reference
-            self.user_contexts[user_id]['available_movies'] = matching_movies
+            # Store movie IDs in context for later reference
+            self.movie_agent.remember(matching_movies[:5])
+            session["movie_ids"] = [movie.id for movie in matching_movies[:5]]
             
             await update.message.reply_text(
                 movie_text,
@@ -205,7 +158,9 @@ class TelegramMovieBot:
 
     async def select_movie(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle movie selection and show theaters."""
-        user_id = update.effective_user.id
+        session = await self._session(update)
+        if session is None:
+            return ConversationHandler.END
         selected_movie = update.message.text
 
         if selected_movie == "Search Again":
@@ -217,14 +172,18 @@ class TelegramMovieBot:
 
         try:
             # Store selected movie details
-            available_movies = self.user_contexts[user_id].get('available_movies', [])
+            available_movies = [
+                movie for movie in
+                await self.movie_agent.resolve_movies(session.get("movie_ids", ()))
+                if movie
+            ]
             # Extract movie name without year
             selected_movie_name = selected_movie.split(" (")[0] if " (" in selected_movie else selected_movie
             
             # Try to find the movie in available movies
             movie_details = next(
                 (movie for movie in available_movies 
-                 if (movie.get('Title', movie.get('title', '')).strip() == selected_movie_name)),
+                 if movie.title == selected_movie_name),
                 None
             )
             
@@ -232,7 +191,7 @@ class TelegramMovieBot:
                 # If not found, try to get from local database
                 local_movies = await self.booking_system.coordinator.booking_agent.db.get_all_movies()
                 movie_details = next(
-                    (movie for movie in local_movies 
+                    (Movie.from_dict(movie) for movie in local_movies 
                      if movie['title'].strip() == selected_movie_name),
                     None
                 )
@@ -245,27 +204,15 @@ class TelegramMovieBot:
                 )
                 return MOVIE_SEARCH
             
-            # Convert to consistent format
-            formatted_movie = {
-                'title': movie_details.get('Title', movie_details.get('title')),
-                'year': movie_details.get('Year', movie_details.get('year')),
-                'id': movie_details.get('imdbID', movie_details.get('id')),
-                'genre': movie_details.get('Genre', movie_details.get('genre')),
-                'director': movie_details.get('Director', movie_details.get('director')),
-                'actors': movie_details.get('Actors', movie_details.get('actors')),
-                'plot': movie_details.get('Plot', movie_details.get('plot')),
-                'rating': movie_details.get('imdbRating', movie_details.get('rating', 'N/A'))
-            }
-            
-            self.user_contexts[user_id]["selected_movie"] = formatted_movie
+            session["movie_id"] = movie_details.id
             
             # Format movie information for display
             movie_info = (
-                f"🎬 {formatted_movie['title']} ({formatted_movie['year']})\n"
-                f"⭐ Rating: {formatted_movie['rating']}\n"
-                f"🎭 Genre: {formatted_movie['genre']}\n"
-                f"👥 Cast: {formatted_movie['actors']}\n"
-                f"📝 Plot: {formatted_movie['plot'][:200]}..."
+                f"🎬 {movie_details.title} ({movie_details.year})\n"
+                f"⭐ Rating: {movie_details.rating}\n"
+                f"🎭 Genre: {movie_details.genre}\n"
+                f"👥 Cast: {movie_details.actors}\n"
+                f"📝 Plot: {movie_details.plot[:200]}..."
             )
             
             await update.message.reply_text(f"You selected:\n\n{movie_info}")
@@ -300,14 +247,16 @@ class TelegramMovieBot:
 
     async def select_theater(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle theater selection and show showtimes."""
-        user_id = update.effective_user.id
+        session = await self._session(update)
+        if session is None:
+            return ConversationHandler.END
         user_input = update.message.text.lower()
 
         try:
             # Get theaters through coordinator
             response = await self.booking_system.coordinator.process_input(
                 "What theaters are available?",
-                self.user_contexts[user_id]
+                session
             )
             
             # If user is asking about theater availability
@@ -345,15 +294,19 @@ class TelegramMovieBot:
 
     async def select_showtime(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle showtime selection and show available seats."""
-        user_id = update.effective_user.id
-        self.user_contexts[user_id]["selected_theater"] = update.message.text
-
+        session = await self._session(update)
+        if session is None:
+            return ConversationHandler.END
+        theaters = await self.booking_system.coordinator.booking_agent.get_theaters()
+        session["theater_id"] = next(
+            (theater["id"] for theater in theaters if theater["name"] == update.message.text), None
+        )
         
         try:
             # Get showtimes through coordinator
             response = await self.booking_system.coordinator.process_input(
                 "Show available showtimes",
-                self.user_contexts[user_id]
+                session
             )
             
             # Extract showtimes from response
@@ -388,18 +341,26 @@ class TelegramMovieBot:
     async def select_seats(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle showtime selection and show available seats."""
         user_id = update.effective_user.id
+        session = await self._session(update)
+        if session is None:
+            return ConversationHandler.END
         selection = update.message.text
         
         try:
             # If this is first time showing seats
-            if "selected_seats" not in self.user_contexts[user_id]:
-                self.user_contexts[user_id]["selected_seats"] = []
-                self.user_contexts[user_id]["selected_showtime"] = selection
+            if "selected_seats" not in session:
+                session["selected_seats"] = []
+                showtimes = await self.booking_system.coordinator.booking_agent.get_showtimes(
+                    session.get("theater_id"), session.get("movie_id")
+                )
+                session["showtime_id"] = next(
+                    (showtime["id"] for showtime in showtimes if showtime["time"] in selection), None
+                )
                 
                 # Get seat map through coordinator
                 response = await self.booking_system.coordinator.process_input(
                     "Show available seats",
-                    self.user_contexts[user_id]
+                    session
                 )
                 
                 # First send the seat map visualization
@@ -431,7 +392,7 @@ class TelegramMovieBot:
                 
             # Handle seat selection
             if selection == "Confirm Selection":
-                if not self.user_contexts[user_id]["selected_seats"]:
+                if not session["selected_seats"]:
                     await update.message.reply_text(
                         "Please select at least one seat before confirming.",
                         reply_markup=ReplyKeyboardMarkup([[s] for s in seats] + [["Confirm Selection"]])
@@ -441,7 +402,7 @@ class TelegramMovieBot:
                 # Process booking through coordinator
                 response = await self.booking_system.coordinator.process_input(
                     "Confirm booking",
-                    self.user_contexts[user_id]
+                    session
                 )
                 
                 # Clean up context
@@ -455,11 +416,17 @@ class TelegramMovieBot:
                 return ConversationHandler.END
             else:
                 # Add selected seat to context
-                self.user_contexts[user_id]["selected_seats"].append(selection)
+                seats = parse_seat_labels(selection)
+                if not seats:
+                    await update.message.reply_text(
+                        "Please pick seats like 'A1', or press 'Confirm Selection'."
+                    )
+                    return SELECT_SEATS
+                session["selected_seats"] = tuple(dict.fromkeys(session["selected_seats"] + tuple(seats)))
                 
                 await update.message.reply_text(
-                    f"Seat {selection} selected. Select more seats or press 'Confirm Selection'.\n"
-                    f"Currently selected seats: {', '.join(self.user_contexts[user_id]['selected_seats'])}"
+                    f"Seat {', '.join(seats)} selected. Select more seats or press 'Confirm Selection'.\n"
+                    f"Currently selected seats: {', '.join(session['selected_seats'])}"
                 )
                 return SELECT_SEATS
 
@@ -492,13 +459,13 @@ class TelegramMovieBot:
         conv_handler = ConversationHandler(
             entry_points=[CommandHandler("start", self.start)],
             states={
-                GET_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.get_name)],
-                GET_EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.get_email)],
-                MOVIE_SEARCH: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.search_movies)],
-                SELECT_MOVIE: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.select_movie)],
-                SELECT_THEATER: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.select_theater)],
-                SELECT_SHOWTIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.select_showtime)],
-                SELECT_SEATS: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.select_seats)],
+                GET_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, self._turn(self.get_name))],
+                GET_EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, self._turn(self.get_email))],
+                MOVIE_SEARCH: [MessageHandler(filters.TEXT & ~filters.COMMAND, self._turn(self.search_movies))],
+                SELECT_MOVIE: [MessageHandler(filters.TEXT & ~filters.COMMAND, self._turn(self.select_movie))],
+                SELECT_THEATER: [MessageHandler(filters.TEXT & ~filters.COMMAND, self._turn(self.select_theater))],
+                SELECT_SHOWTIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, self._turn(self.select_showtime))],
+                SELECT_SEATS: [MessageHandler(filters.TEXT & ~filters.COMMAND, self._turn(self.select_seats))],
             },
             fallbacks=[CommandHandler("cancel", self.cancel)],
         )
@@ -507,7 +474,10 @@ class TelegramMovieBot:
 
         # Start the bot
         console.print("[bold green]Starting Telegram bot...[/bold green]")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        try:
+            application.run_polling(allowed_updates=Update.ALL_TYPES)
+        finally:
+            self.user_contexts.close()
 
 if __name__ == "__main__":
     # Initialize and run the bot
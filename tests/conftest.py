@@ -0,0 +1,22 @@
+# tests/conftest.py
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(autouse=True)
+def mock_models():
+    """Point LlamaIndex at local mock models so agents can be built offline"""
+    from llama_index.core import Settings
+    from llama_index.core.llms import MockLLM
+    from llama_index.core.embeddings import MockEmbedding
+
+    Settings.llm = MockLLM()
+    Settings.embed_model = MockEmbedding(embed_dim=64)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, so databases and caches start fresh"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,93 @@
+# tests/test_coordinator.py
+import asyncio
+import json
+import re
+from typing import Any
+import pytest
+from llama_index.core import Settings
+from llama_index.core.llms import CompletionResponse, CustomLLM, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+from agent_registry import registry
+from coordinator import CoordinatorAgent
+from session_state import SessionState
+
+class BrowsingLLM(CustomLLM):
+    """Answers every routing prompt by browsing the genre named last in the message"""
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(is_chat_model=False)
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        if "Observation: Browsing." in prompt:
+            return CompletionResponse(text="Thought: I can answer without using any more tools.\nAnswer: done")
+        genre = re.findall(r"asks: (.*)", prompt)[-1].split()[-1]
+        action = json.dumps({"genres": [genre], "actors": []})
+        return CompletionResponse(text=f"Thought: I need a tool.\nAction: browse_movies\nAction Input: {action}")
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        raise NotImplementedError
+
+@pytest.fixture
+def coordinator(workdir):
+    return CoordinatorAgent()
+
+def test_handler_tools_build_with_plain_json_schemas(coordinator):
+    names = [tool.metadata.name for tool in coordinator.tools]
+    assert names == ["handle_greeting", "handle_preferences", "handle_initial_state", "handle_booking"]
+    for tool in coordinator.tools:
+        schema = tool.metadata.fn_schema.model_json_schema()
+        assert set(schema["properties"]) == {"user_input", "context"}
+    assert coordinator.agent is not None
+
+@pytest.mark.asyncio
+async def test_handler_tool_runs_handler_on_dict_context(coordinator):
+    output = await coordinator.tools[0].acall(user_input="I am Ann", context={"current_state": "greeting"})
+    response, next_state = output.raw_output
+    assert "Ann" in response
+    assert next_state == "get_email"
+
+@pytest.mark.asyncio
+async def test_concurrent_escalations_share_one_routing_agent(workdir):
+    Settings.llm = BrowsingLLM()
+    registry.clear()
+    try:
+        coordinator, other = CoordinatorAgent(), CoordinatorAgent()
+        genres = [f"genre{i}" for i in range(10)]
+        routes = await asyncio.gather(*[
+            coordinator._route_with_agent(f"something with {genre}") for genre in genres
+        ])
+        assert [route.genres for route in routes] == [(genre,) for genre in genres]
+        assert [route.query for route in routes] == [f"something with {genre}" for genre in genres]
+        agent = coordinator.routing_agent
+        assert agent is other.routing_agent
+        assert agent.state.task_dict == {}
+        assert agent.memory.get_all() == []
+    finally:
+        registry.clear()
+
+def _selection_context() -> SessionState:
+    return SessionState(current_state="movie_selection", customer_name="Ann",
+                        movie_ids=["tt1375666", "tt0468569"])
+
+@pytest.mark.asyncio
+async def test_streamed_movie_selection_matches_the_templated_reply(coordinator):
+    context = _selection_context()
+    chunks = [chunk async for chunk in coordinator.process_input_stream("1", context)]
+    expected_context = _selection_context()
+    expected = await coordinator.process_input("1", expected_context)
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == expected
+    assert context["current_state"] == expected_context["current_state"] == "theater_selection"
+
+@pytest.mark.asyncio
+async def test_streamed_preferences_reply_addresses_the_user_by_name(coordinator):
+    context = SessionState(current_state="preferences", customer_name="Ann", preferences_state="times",
+                           favorite_genres=["drama"], favorite_actors=[])
+    chunks = [chunk async for chunk in coordinator.process_input_stream("evening", context)]
+
+    assert chunks[0] == "Thanks, Ann!"
+    assert context["current_state"] == "initial"
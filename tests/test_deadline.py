@@ -0,0 +1,104 @@
+# tests/test_deadline.py
+import asyncio
+import time
+import pytest
+from admission import AdmissionController
+from config_file import Config
+from coordinator import CoordinatorAgent
+from deadline import DeadlineExceeded, deadline_at, deadline_scope, with_deadline
+from session_state import SessionState
+
+DEADLINE_SECONDS = 0.3
+EPSILON_SECONDS = 0.15
+
+class StalledOMDBClient:
+    """OMDB client whose requests never answer, counting the ones cancelled"""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+
+    async def _stall(self):
+        self.started += 1
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+    async def search(self, query: str):
+        await self._stall()
+
+    async def get_details(self, movie_id: str):
+        await self._stall()
+
+class NoAdmission(AdmissionController):
+    """Admission control that never limits or degrades, so only the deadline acts"""
+
+    def mode(self, name: str) -> bool:
+        return False
+
+@pytest.fixture
+def coordinator(workdir, monkeypatch):
+    monkeypatch.setattr(Config, "TURN_DEADLINE_SECONDS", DEADLINE_SECONDS)
+    coordinator = CoordinatorAgent()
+    coordinator.movie_agent.omdb_client = StalledOMDBClient()
+    unlimited = {"target_seconds": 1e9, "initial_limit": 10**6, "max_limit": 10**6, "max_queue": 10**6}
+    admission = NoAdmission(limits={name: unlimited for name in ("turns", "omdb", "llm")})
+    for agent in (coordinator, coordinator.movie_agent, coordinator.preferences_agent):
+        agent.admission = admission
+    return coordinator
+
+def _context() -> SessionState:
+    return SessionState(current_state="initial", user_id="test",
+                        customer_name="Test", customer_email="test@example.com")
+
+def _pending_tasks():
+    return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+def _deadline_exceeded(coordinator: CoordinatorAgent) -> int:
+    return coordinator.get_state_metrics()["counters"].get("coordinator.deadline_exceeded.initial", 0)
+
+def _assert_degraded(coordinator: CoordinatorAgent, response: str, seconds: float, exceeded_before: int):
+    assert seconds <= DEADLINE_SECONDS + EPSILON_SECONDS
+    assert "took longer than expected" in response or "responding slowly" in response
+    omdb = coordinator.movie_agent.omdb_client
+    assert omdb.started > 0
+    assert omdb.cancelled == omdb.started
+    assert _deadline_exceeded(coordinator) == exceeded_before + 1
+
+@pytest.mark.asyncio
+async def test_stalled_search_returns_degraded_reply_within_deadline(coordinator):
+    exceeded_before = _deadline_exceeded(coordinator)
+    start = time.perf_counter()
+    response = await coordinator.process_input("zqx", _context())
+    _assert_degraded(coordinator, response, time.perf_counter() - start, exceeded_before)
+    await asyncio.sleep(0)
+    assert _pending_tasks() == []
+
+@pytest.mark.asyncio
+async def test_stalled_streamed_search_returns_degraded_reply_within_deadline(coordinator):
+    exceeded_before = _deadline_exceeded(coordinator)
+    start = time.perf_counter()
+    chunks = [chunk async for chunk in coordinator.process_input_stream("zqx", _context())]
+    _assert_degraded(coordinator, "".join(chunks), time.perf_counter() - start, exceeded_before)
+    await asyncio.sleep(0)
+    assert _pending_tasks() == []
+
+@pytest.mark.asyncio
+async def test_only_the_turn_deadline_raises_deadline_exceeded():
+    async def request_timeout():
+        raise asyncio.TimeoutError()
+
+    with deadline_scope(deadline_at(5)):
+        with pytest.raises(asyncio.TimeoutError) as raised:
+            await with_deadline(request_timeout())
+        assert not isinstance(raised.value, DeadlineExceeded)
+
+        with pytest.raises(asyncio.TimeoutError) as raised:
+            await with_deadline(asyncio.sleep(1), cap=0.01)
+        assert not isinstance(raised.value, DeadlineExceeded)
+
+    with deadline_scope(deadline_at(0.01)):
+        with pytest.raises(DeadlineExceeded):
+            await with_deadline(asyncio.sleep(1), cap=5)
@@ -0,0 +1,71 @@
+# tests/test_input_parser.py
+import random
+import pytest
+import helpers
+from benchmarks import _legacy_extract_email, _legacy_extract_name
+from config_file import Config
+from input_parser import (INTENT_PHRASES, extract_email, extract_name, match_intent, parse_seats,
+                          seat_label, seat_ordinal, validate_email)
+
+ITERATIONS = 2000
+SEAT_COUNT = len(Config.VALID_SEAT_ROWS) * Config.MAX_SEAT_NUMBER
+NAMES = ["john", "Chris", "THIAGO", "ava", "Shey", "Mohammed", "li", "Hiroshi"]
+NAME_FORMS = ["I am {}", "my name is {}", "I'm {}", "call me {}", "This is {}", "{}",
+              "hi {}", "Hello, {}", "hey {}", "Hi, I am {}"]
+EMAIL_FORMS = ["{}", "my email is {}", "Email: {}", "email address: {}", "here's my email {}",
+               "you can reach me at {}", "sure, it's {} thanks", "{} ."]
+BAD_SEATS = ["I1", "A0", "A11", "A1x", "1A", "AA", "Z10", "A-1", "B01"]
+
+@pytest.fixture
+def rng():
+    return random.Random(13)
+
+def _random_case(rng: random.Random, text: str) -> str:
+    return "".join(c.upper() if rng.random() < 0.5 else c.lower() for c in text)
+
+def _random_email(rng: random.Random) -> str:
+    user = "".join(rng.choice("abcxyz019._%+-") for _ in range(rng.randint(1, 10)))
+    return f"{user}@{rng.choice(['example', 'mail.co', 'x-y'])}.{rng.choice(['com', 'io', 'CO'])}"
+
+def test_seat_labels_round_trip_in_any_case():
+    for ordinal in range(SEAT_COUNT):
+        label = seat_label(ordinal)
+        assert seat_ordinal(label) == ordinal
+        assert seat_ordinal(label.lower()) == ordinal
+
+def test_seat_lists_parse_in_order_once_each(rng):
+    for _ in range(ITERATIONS):
+        ordinals = [rng.randrange(SEAT_COUNT) for _ in range(rng.randint(0, 6))]
+        labels = [_random_case(rng, seat_label(ordinal)) for ordinal in ordinals]
+        text = "".join(label + rng.choice([" ", ",", ", ", ";", "  ", "'"]) for label in labels)
+        assert parse_seats(text) == list(dict.fromkeys(ordinals)), text
+
+def test_any_bad_seat_rejects_the_list(rng):
+    for _ in range(ITERATIONS):
+        labels = [seat_label(rng.randrange(SEAT_COUNT)) for _ in range(rng.randint(0, 6))]
+        bad = rng.choice(BAD_SEATS)
+        labels.insert(rng.randint(0, len(labels)), bad)
+        assert parse_seats(" ".join(labels)) is None, labels
+        assert not helpers.validate_seat_format([bad.upper()])
+
+def test_names_match_the_old_extraction(rng):
+    for _ in range(ITERATIONS):
+        text = rng.choice(NAME_FORMS).format(_random_case(rng, rng.choice(NAMES)))
+        assert extract_name(text) == _legacy_extract_name(text), text
+
+def test_emails_match_the_old_extraction(rng):
+    for _ in range(ITERATIONS):
+        text = rng.choice(EMAIL_FORMS).format(_random_email(rng))
+        assert extract_email(text) == _legacy_extract_email(text), text
+        assert validate_email(extract_email(text))
+
+@pytest.mark.parametrize("name", NAMES)
+def test_greetings_are_dropped_as_whole_words_only(name):
+    for text in (f"{name}!", f"hello {name} smith", f"{name} here"):
+        assert extract_name(text) == name.title(), text
+
+def test_intents_match_whole_messages(rng):
+    for intent, phrases in INTENT_PHRASES.items():
+        for phrase in phrases:
+            assert match_intent(_random_case(rng, phrase) + rng.choice(["", "!", " .", "  "])) == intent
+            assert match_intent(f"{phrase} please maybe") is None
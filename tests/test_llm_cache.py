@@ -0,0 +1,34 @@
+# tests/test_llm_cache.py
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.llms import MockLLM
+from llm_cache import CachingLLM, LLMResponseCache
+
+def _key(llm: CachingLLM, text: str) -> str:
+    return llm._request([ChatMessage(role=MessageRole.USER, content=text)], {}, "chat")[0]
+
+def test_keys_ignore_case_and_spacing_only():
+    llm = CachingLLM(MockLLM(), cache=LLMResponseCache(path=None))
+    assert _key(llm, "Is  Inception\nshowing tonight") == _key(llm, "is inception showing tonight")
+    assert _key(llm, "it's showing") != _key(llm, "its showing")
+    assert _key(llm, "seats A1, A2") != _key(llm, "seats A1 A2")
+    assert _key(llm, "ann.lee@example.com") != _key(llm, "annlee@example.com")
+
+def test_entries_are_written_behind_and_reloaded(workdir):
+    path = str(workdir / "llm_cache.db")
+    cache = LLMResponseCache(path=path, max_entries=2, flush_seconds=3600)
+    for i in range(3):
+        cache.put(f"key{i}", "scope", f"query {i}", f"answer {i}", 10)
+    assert cache.stats()["writes"] == 0
+    cache.flush()
+    stats = cache.stats()
+    assert stats["pending"] == 0
+    assert stats["writes"] == 3  # two entries, and the delete of the one evicted
+    cache.close()
+
+    reopened = LLMResponseCache(path=path, max_entries=2)
+    try:
+        assert reopened.get("key0") is None
+        assert reopened.get("key1") == "answer 1"
+        assert reopened.get("key2") == "answer 2"
+    finally:
+        reopened.close()
@@ -0,0 +1,48 @@
+# tests/test_llm_gateway.py
+import threading
+import time
+import pytest
+from admission import Overloaded
+from llm_gateway import LLMGateway
+from metrics import MetricsRegistry
+
+def _gateway() -> LLMGateway:
+    return LLMGateway(max_concurrent=1, tokens_per_minute=10**6, queue_timeout=5.0, metrics=MetricsRegistry())
+
+@pytest.mark.asyncio
+async def test_blocking_call_on_event_loop_gets_a_free_slot():
+    gateway = _gateway()
+    with gateway.sync_slot(10):
+        assert gateway.in_flight == 1
+    assert gateway.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_blocking_call_on_event_loop_fails_fast_when_full():
+    gateway = _gateway()
+    async with gateway.slot(10):
+        start = time.perf_counter()
+        with pytest.raises(Overloaded):
+            with gateway.sync_slot(10):
+                pass
+        assert time.perf_counter() - start < 0.1
+        assert gateway.waiters == []
+    assert gateway.in_flight == 0
+
+def test_blocking_call_on_plain_thread_waits_for_a_slot():
+    gateway = _gateway()
+    held, release = threading.Event(), threading.Event()
+
+    def holder():
+        with gateway.sync_slot(10):
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    held.wait()
+    threading.Timer(0.1, release.set).start()
+    start = time.perf_counter()
+    with gateway.sync_slot(10):
+        assert time.perf_counter() - start >= 0.05
+    thread.join()
+    assert gateway.in_flight == 0
@@ -0,0 +1,41 @@
+# tests/test_session_store.py
+import pytest
+from session_state import SessionState
+from session_store import MemorySessionStore, SessionStore, SQLiteSessionStore
+
+@pytest.fixture
+def workers(workdir):
+    path = str(workdir / "sessions.db")
+    stores = [SQLiteSessionStore(path), SQLiteSessionStore(path)]
+    yield stores
+    for store in stores:
+        store.close()
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+    assert MemorySessionStore().save("chat") is True
+
+def test_saved_turn_is_seen_by_the_next_worker(workers):
+    first, second = workers
+    first["chat"] = SessionState(current_state="initial")
+    first["chat"]["current_state"] = "movie_selection"
+    assert first.save("chat")
+
+    assert second["chat"]["current_state"] == "movie_selection"
+    second["chat"]["current_state"] = "theater_selection"
+    assert second.save("chat")
+    assert first["chat"]["current_state"] == "theater_selection"
+
+def test_concurrent_turns_do_not_overwrite_each_other(workers):
+    first, second = workers
+    first["chat"] = SessionState(current_state="initial")
+    first_state, second_state = first["chat"], second["chat"]
+
+    first_state["current_state"] = "movie_selection"
+    second_state["current_state"] = "preferences"
+    assert first.save("chat")
+    assert not second.save("chat")
+
+    assert second.stats()["conflicts"] == 1
+    assert second["chat"]["current_state"] == "movie_selection"
@@ -0,0 +1,43 @@
+# tests/test_similarity.py
+import numpy as np
+from similarity import SimilarityIndex
+from taste_vectors import CatalogVectorIndex
+
+GENRES = ["Drama", "Action", "Comedy", "Sci-Fi", "Crime", "Horror", "Romance"]
+
+def _catalog(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    movies = [
+        {
+            "id": f"tt{i}",
+            "title": f"Movie {i}",
+            "genre": ", ".join(rng.choice(GENRES, 2, replace=False)),
+            "actors": ", ".join(f"Actor {a}" for a in rng.integers(0, n // 2, 3)),
+            "director": f"Director {rng.integers(0, n // 8)}",
+        }
+        for i in range(n)
+    ]
+    centers = rng.standard_normal((20, 16))
+    vectors = (centers[rng.integers(0, 20, n)] + 0.2 * rng.standard_normal((n, 16))).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return movies, np.array([movie["id"] for movie in movies]), vectors
+
+def test_ivf_build_finds_the_exhaustive_neighbours():
+    movies, ids, vectors = _catalog(2000)
+    exact = SimilarityIndex.build(movies, vectors=CatalogVectorIndex(ids, vectors), block_rows=256)
+    ivf = SimilarityIndex.build(movies, vectors=CatalogVectorIndex(ids, vectors, brute_force_max=100))
+
+    recall = np.mean([
+        len(set(exact.neighbors[i]) & set(ivf.neighbors[i])) / exact.neighbors.shape[1]
+        for i in range(len(movies))
+    ])
+    assert recall > 0.9
+    assert not (ivf.neighbors == np.arange(len(movies))[:, None]).any()
+
+def test_index_built_for_another_catalog_is_not_loaded(workdir):
+    movies, ids, _ = _catalog(200)
+    path = str(workdir / "similar_movies.npz")
+    SimilarityIndex.build(movies).save(path)
+
+    assert SimilarityIndex.load(path, ids=ids) is not None
+    assert SimilarityIndex.load(path, ids=list(ids) + ["tt_imported"]) is None
@@ -0,0 +1,41 @@
+# tests/test_taste_vectors.py
+import asyncio
+import time
+import similarity
+from mockdb import MockDatabase
+from preferences_agent import PreferencesAgent
+from taste_vectors import load_catalog_vectors
+
+def test_catalog_vectors_embed_only_new_movies(workdir, monkeypatch):
+    movies = list(MockDatabase().movies.values())
+    embedded = []
+    embed_movies = similarity.embed_movies
+
+    def counting_embed(batch):
+        embedded.append(len(batch))
+        return embed_movies(batch)
+
+    monkeypatch.setattr("taste_vectors.embed_movies", counting_embed)
+    load_catalog_vectors(movies[:-1])
+    catalog = load_catalog_vectors(movies)
+    load_catalog_vectors(movies)
+
+    assert embedded == [len(movies) - 1, 1]
+    assert list(catalog.ids) == [movie["id"] for movie in movies]
+
+def test_recommendations_use_taste_vectors_without_omdb(workdir):
+    agent = PreferencesAgent(MockDatabase())
+
+    async def no_omdb(*args, **kwargs):
+        raise AssertionError("OMDB searched although taste vectors were ready")
+        yield
+
+    agent.movie_agent.stream_movie_suggestions = no_omdb
+    preferences = {"favorite_genres": ["drama"], "favorite_actors": [], "preferred_times": []}
+    assert asyncio.run(agent.update_preferences("u1", preferences))
+
+    deadline = time.monotonic() + 10
+    while agent.movie_agent.catalog_vectors is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    recommendations = asyncio.run(agent.get_personalized_recommendations("u1", limit=2))
+    assert len(recommendations) == 2
@@ -0,0 +1,204 @@
+# utils/trending.py
+import heapq
+import math
+import threading
+import time as time_module
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from config_file import Config
+from helpers import get_time_slot
+
+# A scope is (theater_id, time_slot); None acts as a wildcard, so
+# (None, None) is the global leaderboard
+Scope = Tuple[Optional[str], Optional[str]]
+
+class _TopK:
+    """Incrementally maintained top-k leaderboard backed by a min-heap.
+
+    Heap entries are (score, movie_id); an entry is live only while its
+    score equals the member's current score, older entries are skipped
+    lazily and compacted once the heap grows too large.
+    """
+
+    __slots__ = ("k", "heap", "members")
+
+    def __init__(self, k: int):
+        self.k = k
+        self.heap: List[Tuple[float, str]] = []
+        self.members: Dict[str, float] = {}
+
+    def _pop_min(self) -> Tuple[float, str]:
+        """Pop the lowest live entry"""
+        while self.heap:
+            score, movie_id = heapq.heappop(self.heap)
+            if self.members.get(movie_id) == score:
+                return score, movie_id
+        return 0.0, ""
+
+    def _peek_min(self) -> float:
+        """Lowest live score, discarding stale entries on the way"""
+        while self.heap:
+            score, movie_id = self.heap[0]
+            if self.members.get(movie_id) == score:
+                return score
+            heapq.heappop(self.heap)
+        return 0.0
+
+    def offer(self, movie_id: str, score: float):
+        """Offer a movie whose score has increased"""
+        if movie_id in self.members:
+            self.members[movie_id] = score
+            heapq.heappush(self.heap, (score, movie_id))
+            if len(self.heap) > 4 * self.k:
+                self.heap = [(s, m) for m, s in self.members.items()]
+                heapq.heapify(self.heap)
+        elif len(self.members) < self.k:
+            self.members[movie_id] = score
+            heapq.heappush(self.heap, (score, movie_id))
+        elif score > self._peek_min():
+            _, evicted = self._pop_min()
+            del self.members[evicted]
+            self.members[movie_id] = score
+            heapq.heappush(self.heap, (score, movie_id))
+
+    def rebuild(self, scores: Dict[str, float]):
+        """Recompute the leaderboard from the full score table"""
+        top = heapq.nlargest(self.k, scores.items(), key=lambda x: x[1])
+        self.members = dict(top)
+        self.heap = [(s, m) for m, s in top]
+        heapq.heapify(self.heap)
+
+    def ranked(self) -> List[Tuple[str, float]]:
+        """Members ordered by descending score"""
+        return sorted(self.members.items(), key=lambda x: x[1], reverse=True)
+
+class TrendingEngine:
+    """Exponentially time-decayed trending scores fed by booking events.
+
+    Scores use forward decay: an event at time t adds
+    weight * exp(rate * (t - landmark)), so older scores never need to be
+    touched as time passes and ranking is unaffected by decay. When the
+    exponent grows large every score is rescaled to the current time and
+    movies whose score has decayed away are dropped.
+    """
+
+    RESCALE_EXPONENT = 50.0
+
+    def __init__(self,
+                 half_life_seconds: float = Config.TRENDING_HALF_LIFE_HOURS * 3600,
+                 top_k: int = Config.TRENDING_TOP_K,
+                 max_movies_per_scope: int = Config.TRENDING_MAX_MOVIES_PER_SCOPE,
+                 clock: Callable[[], float] = time_module.time):
+        self.rate = math.log(2) / half_life_seconds
+        self.top_k = top_k
+        self.max_movies_per_scope = max_movies_per_scope
+        self.min_score = 1e-3
+        self.clock = clock
+        self.landmark = clock()
+        self.scores: Dict[Scope, Dict[str, float]] = {}
+        self.leaders: Dict[Scope, _TopK] = {}
+        self.lock = threading.Lock()
+
+    def record(self, movie_id: str, theater_id: Optional[str] = None,
+               time_slot: Optional[str] = None, weight: float = 1.0,
+               timestamp: Optional[float] = None):
+        """Record a booking event (use a negative weight for a cancellation)"""
+        if not movie_id:
+            return
+        with self.lock:
+            now = self.clock() if timestamp is None else timestamp
+            if self.rate * (now - self.landmark) > self.RESCALE_EXPONENT:
+                self._rescale(now)
+
+            increment = weight * math.exp(self.rate * (now - self.landmark))
+            self._apply((None, None), movie_id, increment)
+            if theater_id:
+                self._apply((theater_id, None), movie_id, increment)
+            if time_slot:
+                self._apply((None, time_slot), movie_id, increment)
+            if theater_id and time_slot:
+                self._apply((theater_id, time_slot), movie_id, increment)
+
+    def _apply(self, scope: Scope, movie_id: str, increment: float):
+        """Add an increment to one scope's score table and leaderboard"""
+        scores = self.scores.get(scope)
+        if scores is None:
+            scores = self.scores[scope] = {}
+            self.leaders[scope] = _TopK(self.top_k)
+        leaders = self.leaders[scope]
+
+        score = scores.get(movie_id, 0.0) + increment
+        if score <= 0:
+            scores.pop(movie_id, None)
+        else:
+            scores[movie_id] = score
+
+        if increment >= 0:
+            leaders.offer(movie_id, score)
+            if len(scores) > self.max_movies_per_scope:
+                self._trim(scope)
+        elif movie_id in leaders.members:
+            # A leader lost score, so a non-member may now outrank it
+            leaders.rebuild(scores)
+
+    def _trim(self, scope: Scope):
+        """Drop the lowest-scoring movies once a scope exceeds its budget"""
+        scores = self.scores[scope]
+        keep = int(self.max_movies_per_scope * 0.9)
+        self.scores[scope] = dict(heapq.nlargest(keep, scores.items(), key=lambda x: x[1]))
+        self.leaders[scope].rebuild(self.scores[scope])
+
+    def _rescale(self, now: float):
+        """Move the landmark to `now`, decaying and pruning every score"""
+        factor = math.exp(-self.rate * (now - self.landmark))
+        self.landmark = now
+        for scope in list(self.scores):
+            rescaled = {
+                movie_id: score * factor
+                for movie_id, score in self.scores[scope].items()
+                if score * factor >= self.min_score
+            }
+            if rescaled:
+                self.scores[scope] = rescaled
+                self.leaders[scope].rebuild(rescaled)
+            else:
+                del self.scores[scope]
+                del self.leaders[scope]
+
+    def top(self, limit: int = 10, theater_id: Optional[str] = None,
+            time_slot: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Get the top trending movies with their current decayed scores"""
+        with self.lock:
+            leaders = self.leaders.get((theater_id, time_slot))
+            if not leaders:
+                return []
+            decay = math.exp(-self.rate * (self.clock() - self.landmark))
+            return [(movie_id, score * decay) for movie_id, score in leaders.ranked()[:limit]]
+
+    def on_booking_event(self, event: str, booking: Dict):
+        """MockDatabase booking listener"""
+        # Cancellations are applied at the booking's original timestamp so
+        # they remove exactly the contribution the booking added
+        weight = 1.0 if event == "created" else -1.0
+        timestamp = None
+        if booking.get("created_at"):
+            timestamp = datetime.fromisoformat(booking["created_at"]).timestamp()
+        self.record(
+            booking.get("movie_id"),
+            booking.get("theater_id"),
+            get_time_slot(booking["time"]) if booking.get("time") else None,
+            weight,
+            timestamp
+        )
+
+    def replay(self, bookings: Iterable[Dict]) -> int:
+        """Rebuild scores from existing confirmed bookings in creation order"""
+        with self.lock:
+            self.scores.clear()
+            self.leaders.clear()
+        count = 0
+        for booking in sorted(bookings, key=lambda x: x["created_at"]):
+            if booking.get("status") == "confirmed":
+                self.on_booking_event("created", booking)
+                count += 1
+        return count